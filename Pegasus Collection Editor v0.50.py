@@ -2,14 +2,35 @@
 # Copyright (C) 2025 luis0henrique
 # Version 0.50
 
+import time
+STARTED = time.perf_counter()  # Início do programa, para medir quanto demora até a janela ficar pronta
+
 import os
-from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QListWidget, QListWidgetItem,
-                             QFileDialog, QLineEdit, QCheckBox, QMessageBox, QSplitter, QSizePolicy)
-from PyQt5.QtGui import QFont
-from PyQt5.QtCore import Qt
+from array import array
+from itertools import chain, repeat
+from operator import attrgetter
+from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QFileDialog, QLineEdit, QCheckBox, QComboBox, QMessageBox, QSplitter, QSizePolicy, QProgressBar,
+                             QStatusBar, QShortcut, QMenu)
+from PyQt5.QtGui import QFont, QKeySequence
+from PyQt5.QtCore import Qt, QFileSystemWatcher, QThread, QTimer, pyqtSignal, pyqtSlot
+from pegasus_collection import (DEFAULT_HEADER, DuplicateIndex, GameRecord, PendingChanges, normalize_path, resolve_game_path,
+                                save_collection_file)
+from pegasus_cache import ParseCache
+from pegasus_views import GameListView, NORMAL, DUPLICATE, ADDED, REMOVED
+from pegasus_profiling import PROFILER, instrumented
+# Parsing, indexing, query, history and worker modules are imported where they are first used, so the window opens
+# without them; see restore_session for what happens right after it appears
+
+SEARCH_DELAY_MS = 150  # Pausa na digitação antes de buscar
+FUZZY_LIMIT = 100  # Resultados da busca aproximada, do melhor para o pior
+WATCH_DELAY_MS = 500  # Espera o arquivo vigiado parar de mudar antes de relê-lo
 
 class PegasusCustomCollectionEditor(QWidget):
 
+    profile_recorded = pyqtSignal(dict)  # Medições do PEGASUS_EDITOR_PROFILE, também vindas das threads
+    startup_finished = pyqtSignal(float)  # Segundos desde o início do programa até a sessão restaurada estar pronta
+
     def apply_dark_theme(self):
         self.setStyleSheet("""
             QWidget {
@@ -38,18 +59,18 @@ class PegasusCustomCollectionEditor(QWidget):
                 border-radius: 5px;
                 padding: 5px;
             }
-            QListWidget {
+            QListView {
                 background-color: #3a3a3a;
                 color: #f0f0f0;
                 border: 1px solid #555;
                 border-radius: 5px;
             }
-            QListWidget::item {
+            QListView::item {
                 background-color: #3a3a3a;
                 color: #f0f0f0;
                 border-bottom: 1px solid #555;
             }
-            QListWidget::item:hover {
+            QListView::item:hover {
                 background-color: #4a4a4a;
             }
             QLabel {
@@ -58,6 +79,17 @@ class PegasusCustomCollectionEditor(QWidget):
             QCheckBox {
                 color: #f0f0f0;
             }
+            QProgressBar {
+                background-color: #3a3a3a;
+                color: #f0f0f0;
+                border: 1px solid #555;
+                border-radius: 5px;
+                text-align: center;
+            }
+            QProgressBar::chunk {
+                background-color: #62c471;
+                border-radius: 5px;
+            }
             QMessageBox {
                 background-color: #2d2d2d;
                 color: #f0f0f0;
@@ -81,23 +113,60 @@ class PegasusCustomCollectionEditor(QWidget):
         self.initUI()
         self.apply_dark_theme
         self.collection_file = None
+        self.collection_sections = []  # Section de cada coleção do arquivo aberto, quando ele tem várias
+        self.collection_section = None  # Número da coleção aberta em collection_sections (None: o arquivo todo)
         self.source_file = None
         self.absolute_path = ""
         self.games = []
         self.existing_games = set()
-        self.games_to_add = []
-        self.games_to_remove = set()
+        self.duplicate_index = DuplicateIndex()  # Chaves dos arquivos dos jogos já na coleção
+        self.pending = PendingChanges()  # Jogos a adicionar e a remover, por (nome, arquivo, console)
+        self.command_log = None  # Histórico de desfazer/refazer, gravado ao lado da coleção aberta (criado na 1ª edição)
+        self.recorded_names = {"collection": "", "shortname": ""}  # Nomes como estão no histórico
+        self.saved_names = {"collection": "", "shortname": ""}  # Nomes como estão no arquivo da coleção
         self.launch_command = "none"
         self.header = ""
         self.source_collection_name = ""
-        self.source_games = set()  # Stores games from the source file
+        self.source_games = set()  # GameRecords of the source file
+        self.source_records = []  # Parsed game records of the source file
+        self.source_origins = []  # SourceOrigin de cada arquivo fonte aberto (vários quando são mesclados)
+        self.source_origin_ids = {}  # Arquivo fonte -> índice em source_origins
+        self.record_origins = array('H')  # Índice em source_origins de cada registro de source_records
+        self.search_index = None  # Índice de palavras dos registros da fonte (criado ao abrir a fonte)
+        self.column_store = None  # Colunas por campo, para as buscas com consulta
         self.source_loaded = False  # Indicates whether the source file has been loaded.
+        self.parse_cache = ParseCache()  # Parsed files, reused while they don't change on disk
+        self.loaders = {}  # Leitores em segundo plano ativos ("collection" / "source" / "library" / "files")
+        self.loader_stages = {}  # Medições abertas de open_collection / open_source / update_library / check_files
+        self.file_checker = None  # FileChecker, criado na primeira verificação
+        self.file_statuses = {}  # Chave do arquivo -> status, dos jogos reprovados na última verificação
+        self.file_watcher = QFileSystemWatcher(self)  # Coleção e fontes abertas, relidas quando mudam no disco
+        self.file_watcher.fileChanged.connect(self.on_watched_file_changed)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(WATCH_DELAY_MS)
+        self.watch_timer.timeout.connect(self.process_changed_files)
+        self.watched_files = {}  # Arquivo vigiado -> "collection" ou "source"
+        self.file_snapshots = {}  # Arquivo vigiado -> FileSnapshot dos registros em memória
+        self.snapshot_workers = {}  # Arquivo vigiado -> SnapshotWorker em andamento
+        self.changed_files = set()  # Arquivos vigiados que mudaram e ainda não foram relidos
+        self.source_patched = False  # A fonte em memória já recebeu mudanças do disco (seu índice não vai para o cache)
+        self.source_version = None  # ParseCache.version da fonte quando começou a ser lida
+        self.search_worker = None  # Busca em andamento em segundo plano
+        self.search_generation = 0  # Incrementado a cada busca nova; resultados de gerações antigas são ignorados
+        self.last_search = None  # (palavra-chave, campos, nº de registros, ids) da última busca concluída
+        self.fuzzy_indexes = {}  # Índices de trigramas da fonte, por campos pesquisados
+        self.catalog = None  # Catálogo da biblioteca inteira, para buscar em todos os sistemas (aberto no primeiro uso)
+        self.session_path = None  # Arquivo da sessão, quando ela é restaurada ao abrir e salva ao fechar
+        self.session_edits = None  # Mudanças não salvas da sessão restaurada, aplicadas quando a coleção carregar
+        self.startup_pending = False  # A sessão restaurada ainda está carregando
+        self.startup_seconds = None
+        QTimer.singleShot(0, self.enable_library_search)  # Depois que a janela aparece: o catálogo usa o SQLite
         self.setWindowTitle("Pegasus Custom Collection Editor")
 
     def extrair_info_arquivo(self, caminho_arquivo, caminho_base):
         """ Returns the absolute path and file extension. """
-        caminho_absoluto = os.path.join(caminho_base, caminho_arquivo.lstrip("./"))
-        extensao = os.path.splitext(caminho_arquivo)[1]
+        caminho_absoluto, extensao = resolve_game_path(caminho_arquivo, caminho_base)
         placeholder = ""  # Add a placeholder value to return three values
         return caminho_absoluto, extensao, placeholder
 
@@ -105,11 +174,13 @@ class PegasusCustomCollectionEditor(QWidget):
         main_layout = QHBoxLayout()
 
         # List of games in the custom collection
-        self.existing_games_list = QListWidget()
+        self.existing_games_list = GameListView(button_text="x", key=attrgetter("key"))
+        self.existing_games_model = self.existing_games_list.model()
         self.existing_games_list_label = QLabel("Games in the custom collection:")
 
         # List of games in the source collection
-        self.source_games_list = QListWidget()
+        self.source_games_list = GameListView(key=attrgetter("key"))
+        self.source_games_model = self.source_games_list.model()
         self.source_games_list_label = QLabel("Games in the source collection:")
 
         left_layout = QVBoxLayout()
@@ -129,6 +200,12 @@ class PegasusCustomCollectionEditor(QWidget):
         button_font = QFont()
 
         name_layout = QVBoxLayout()
+        # Escolha da coleção, nos arquivos com várias (oculta quando há só uma)
+        self.section_combo = QComboBox()
+        self.section_combo.setToolTip("Collection of the file to edit")
+        self.section_combo.setVisible(False)
+        self.section_combo.currentIndexChanged.connect(self.open_collection_section)
+        name_layout.addWidget(self.section_combo)
         self.collection_name_input = QLineEdit()
         self.collection_name_input.setPlaceholderText("Collection name")
         self.collection_name_input.setToolTip("Name of the custom collection")
@@ -139,6 +216,9 @@ class PegasusCustomCollectionEditor(QWidget):
 
         name_layout.addWidget(self.collection_name_input)
         name_layout.addWidget(self.shortname_input)
+        self.name_inputs = {"collection": self.collection_name_input, "shortname": self.shortname_input}
+        for field, name_input in self.name_inputs.items():
+            name_input.editingFinished.connect(lambda field=field: self.record_rename(field))
 
         top_layout.addWidget(self.create_collection_button)
         top_layout.addWidget(self.open_collection_button)
@@ -150,7 +230,7 @@ class PegasusCustomCollectionEditor(QWidget):
         left_layout.addWidget(self.existing_games_list)
 
         # Main Layout with Splitter
-        splitter = QSplitter(Qt.Horizontal)
+        self.splitter = splitter = QSplitter(Qt.Horizontal)
 
         # Left widget for existing games
         left_widget = QWidget()
@@ -181,9 +261,37 @@ class PegasusCustomCollectionEditor(QWidget):
 
         # Campo de palavra-chave
         self.keyword_input = QLineEdit()
-        self.keyword_input.setPlaceholderText("Enter the keyword...")
+        self.keyword_input.setPlaceholderText("Enter the keyword or a query, e.g. genre:shooter players>=2...")
+        self.keyword_input.setToolTip(
+            "A keyword is searched in the checked fields. A query combines fields:\n"
+            "genre:shooter AND players:2 AND release>=1995 NOT publisher:capcom\n"
+            "field:text contains, field=text equals, field!=text, >, >=, <, <= compare;\n"
+            "OR, NOT (or -term) and parentheses; plain words search the checked fields.")
         self.keyword_input.setEnabled(False)
-        right_layout.addWidget(self.keyword_input)
+
+        # Busca aproximada: tolera erros de digitação e ordena pela semelhança
+        self.fuzzy_checkbox = QCheckBox("Fuzzy")
+        self.fuzzy_checkbox.setToolTip("Ranked search that tolerates typos, e.g. \"stret figter 2\"")
+        self.fuzzy_checkbox.setEnabled(False)
+
+        # Busca no catálogo da biblioteca, em todos os sistemas de uma vez
+        self.library_checkbox = QCheckBox("Library")
+        self.library_checkbox.setToolTip("Search every system of the library catalog instead of the source collection")
+        self.library_checkbox.setEnabled(False)
+        keyword_layout = QHBoxLayout()
+        keyword_layout.addWidget(self.keyword_input, 1)
+        keyword_layout.addWidget(self.fuzzy_checkbox)
+        keyword_layout.addWidget(self.library_checkbox)
+        right_layout.addLayout(keyword_layout)
+
+        # Busca enquanto digita, depois de uma pausa na digitação
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.start_search)
+        self.keyword_input.textChanged.connect(self.schedule_search)
+        self.fuzzy_checkbox.stateChanged.connect(self.schedule_search)
+        self.library_checkbox.stateChanged.connect(self.toggle_library_search)
 
         # Botão para filtrar jogos
         self.filter_button = QPushButton("Search")
@@ -192,15 +300,44 @@ class PegasusCustomCollectionEditor(QWidget):
 
         # Lista de jogos adicionados
         self.selected_games_label = QLabel("Filtered games:")
-        self.selected_games_list = QListWidget()
+        self.selected_games_list = GameListView(button_side="right", key=attrgetter("key"))
+        self.selected_games_model = self.selected_games_list.model()
         right_layout.addWidget(self.selected_games_label)
         right_layout.addWidget(self.selected_games_list)
 
+        # Ações em lote sobre o resultado da busca (ou só as linhas selecionadas), cada uma uma única edição
+        bulk_layout = QHBoxLayout()
+        self.add_filtered_button = QPushButton("Add All")
+        self.add_filtered_button.setToolTip("Mark every filtered game, or the selected ones, to be added")
+        self.remove_matching_button = QPushButton("Remove Matching")
+        self.remove_matching_button.setToolTip("Mark the games of the custom collection found by the search, "
+                                               "or by the selected rows, for removal, and unmark the ones marked to add")
+        self.invert_selection_button = QPushButton("Invert Selection")
+        for button in (self.add_filtered_button, self.remove_matching_button, self.invert_selection_button):
+            bulk_layout.addWidget(button)
+        right_layout.addLayout(bulk_layout)
+        self.add_filtered_button.clicked.connect(self.add_filtered_games)
+        self.remove_matching_button.clicked.connect(self.remove_matching_games)
+        self.invert_selection_button.clicked.connect(self.selected_games_list.invert_selection)
+
         # Botão para limpar a lista de jogos adicionados
         self.clear_list_button = QPushButton("Clear Search")
         right_layout.addWidget(self.clear_list_button)
         self.clear_list_button.clicked.connect(self.clear_game_list)
 
+        # Verificação dos arquivos dos jogos (coleção e fonte) e remoção dos que sumiram
+        files_layout = QHBoxLayout()
+        self.check_files_button = QPushButton("Check Files")
+        self.check_files_button.setToolTip("Check that the files of the games in both lists still exist")
+        self.remove_missing_button = QPushButton("Remove Missing")
+        self.remove_missing_button.setToolTip("Mark every game of the custom collection whose file was not found for removal")
+        self.remove_missing_button.setEnabled(False)
+        files_layout.addWidget(self.check_files_button)
+        files_layout.addWidget(self.remove_missing_button)
+        right_layout.addLayout(files_layout)
+        self.check_files_button.clicked.connect(self.check_files)
+        self.remove_missing_button.clicked.connect(self.remove_missing_games)
+
         # Campo para definir caminho absoluto (oculto na interface)
         self.absolute_path_label = QLabel("Absolute path:")
         self.absolute_path_input = QLineEdit()
@@ -209,11 +346,39 @@ class PegasusCustomCollectionEditor(QWidget):
         right_layout.addWidget(self.absolute_path_label)
         right_layout.addWidget(self.absolute_path_input)
 
+        # Desfazer e refazer marcações e renomeações, também com Ctrl+Z / Ctrl+Y
+        history_layout = QHBoxLayout()
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.setToolTip("Undo the last change to the custom collection (Ctrl+Z)")
+        self.redo_button = QPushButton("Redo")
+        self.redo_button.setToolTip("Redo the last undone change (Ctrl+Y)")
+        for button in (self.undo_button, self.redo_button):
+            button.setEnabled(False)
+            history_layout.addWidget(button)
+        right_layout.addLayout(history_layout)
+        self.undo_button.clicked.connect(self.undo)
+        self.redo_button.clicked.connect(self.redo)
+        QShortcut(QKeySequence.Undo, self, self.undo)
+        QShortcut(QKeySequence.Redo, self, self.redo)
+
         # Botão para salvar
         self.save_button = QPushButton("Save Custom Collection")
         right_layout.addWidget(self.save_button)
         self.save_button.setEnabled(False)
 
+        # Progresso do carregamento em segundo plano (oculto quando não há carregamento)
+        loading_layout = QHBoxLayout()
+        self.loading_bar = QProgressBar()
+        self.loading_bar.setRange(0, 1000)
+        self.cancel_loading_button = QPushButton("Cancel")
+        self.cancel_loading_button.setToolTip("Stop loading; games already loaded stay available")
+        self.cancel_loading_button.clicked.connect(self.cancel_loading)
+        loading_layout.addWidget(self.loading_bar, 1)
+        loading_layout.addWidget(self.cancel_loading_button)
+        right_layout.addLayout(loading_layout)
+        self.loading_bar.setVisible(False)
+        self.cancel_loading_button.setVisible(False)
+
         right_widget.setLayout(right_layout)
 
         # Widget para a lista de jogos da fonte
@@ -226,16 +391,28 @@ class PegasusCustomCollectionEditor(QWidget):
 
         # Criar o botão com o mesmo estilo do "Abrir Custom Collection"
         self.open_source_button = QPushButton("📂")
-        self.open_source_button.setToolTip("Open Source Collection")
+        self.open_source_button.setToolTip("Open Source Collection (select several files to merge them)")
         self.open_source_button.setStyleSheet("QPushButton { font-size: 40px; }")
 
+        # Abre de uma vez todos os arquivos de metadata de uma pasta, lidos em paralelo
+        self.open_source_folder_button = QPushButton("🗂")
+        self.open_source_folder_button.setToolTip("Open Source Folder (every metadata file under it)")
+        self.open_source_folder_button.setStyleSheet("QPushButton { font-size: 40px; }")
+
         # Criar o campo de texto somente leitura para o nome da coleção fonte
         self.source_collection_name_display = QLineEdit()
         self.source_collection_name_display.setReadOnly(True)
         self.source_collection_name_display.setPlaceholderText("Source collection name")
         self.source_collection_name_display.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
 
+        # Atualiza o catálogo com os arquivos de metadata de todas as pastas de sistemas
+        self.library_button = QPushButton("📚")
+        self.library_button.setToolTip("Update Library Catalog (every metadata file under a folder)")
+        self.library_button.setStyleSheet("QPushButton { font-size: 40px; }")
+
         source_header_layout.addWidget(self.open_source_button)
+        source_header_layout.addWidget(self.open_source_folder_button)
+        source_header_layout.addWidget(self.library_button)
         source_header_layout.addWidget(self.source_collection_name_display, 1)
 
         source_games_layout.addLayout(source_header_layout)
@@ -266,131 +443,221 @@ class PegasusCustomCollectionEditor(QWidget):
         self.source_games_list.setMinimumHeight(500)
 
         main_layout.addWidget(splitter)
-        self.setLayout(main_layout)
+
+        # Barra de depuração com as medições, só quando PEGASUS_EDITOR_PROFILE está definido
+        if PROFILER is not None:
+            self.profile_status_bar = QStatusBar()
+            self.profile_status_bar.setSizeGripEnabled(False)
+            window_layout = QVBoxLayout()
+            window_layout.addLayout(main_layout)
+            window_layout.addWidget(self.profile_status_bar)
+            self.setLayout(window_layout)
+            self.profile_recorded.connect(self.show_profile_record)
+            self.profile_listener = self.profile_recorded.emit
+            PROFILER.listeners.append(self.profile_listener)
+        else:
+            self.setLayout(main_layout)
 
         # Conectar botões às funções
         self.open_collection_button.clicked.connect(self.open_collection)
         self.create_collection_button.clicked.connect(self.create_new_collection)
         self.open_source_button.clicked.connect(self.open_source)
+        self.open_source_folder_button.clicked.connect(self.open_source_folder)
+        self.library_button.clicked.connect(self.update_library)
         self.save_button.clicked.connect(self.save_collection)
         self.filter_button.clicked.connect(self.filter_games)
+        self.existing_games_list.button_clicked.connect(self.toggle_game_removal)
+        self.source_games_list.button_clicked.connect(self.toggle_source_game_addition)
+        self.selected_games_list.button_clicked.connect(self.toggle_game_addition)
+        for game_list in (self.existing_games_list, self.source_games_list, self.selected_games_list):
+            game_list.setContextMenuPolicy(Qt.CustomContextMenu)
+            game_list.customContextMenuRequested.connect(
+                lambda position, game_list=game_list: self.show_list_menu(game_list, position))
 
         for checkbox in self.field_checkboxes.values():
             checkbox.stateChanged.connect(self.toggle_keyword_input)
+            checkbox.stateChanged.connect(self.schedule_search)
 
         self.apply_dark_theme()
 
+    def show_profile_record(self, record):
+        text = f"{record['stage']}: {record['seconds'] * 1000:.0f} ms"
+        if "count" in record:
+            text += f", {record['count']} records"
+        if "peak_kb" in record:
+            text += f", peak {record['peak_kb'] / 1024:.1f} MB"
+        self.profile_status_bar.showMessage(text)
+
     def toggle_keyword_input(self):
-        self.keyword_input.setEnabled(any(cb.isChecked() for cb in self.field_checkboxes.values()))
+        self.keyword_input.setEnabled(any(cb.isChecked() and cb.isEnabled() for cb in self.field_checkboxes.values()))
+        # A busca aproximada só existe para a coleção fonte
+        self.fuzzy_checkbox.setEnabled(self.keyword_input.isEnabled() and not self.library_checkbox.isChecked())
         self.filter_button.setEnabled(self.keyword_input.isEnabled())
 
+    def library_catalog(self):
+        if self.catalog is None:
+            from pegasus_catalog import Catalog  # Importado só quando a biblioteca é usada: carrega o SQLite
+
+            self.catalog = Catalog()
+        return self.catalog
+
+    def enable_library_search(self):
+        self.library_checkbox.setEnabled(self.library_catalog().exists())
+
+    def toggle_library_search(self):
+        # Sem fonte aberta, os campos só podem ser escolhidos para buscar na biblioteca
+        enabled = self.library_checkbox.isChecked() or self.source_file is not None
+        for checkbox in self.field_checkboxes.values():
+            checkbox.setEnabled(enabled)
+        self.toggle_keyword_input()
+        self.schedule_search()
+
     def open_collection(self):
+        from pegasus_sections import read_sections
+
         file_name, _ = QFileDialog.getOpenFileName(self, "Open Custom Collection", "", "Pegasus Metadata (*.txt)")
         if file_name:
-            self.collection_file = file_name
-            self.save_button.setEnabled(True)
-            self.load_collection_metadata(file_name)
-            self.collection_path_label.setText(file_name)
-            self.load_existing_games(file_name)
-            self.clear_game_list()
-            self.update_existing_games_list()
-            self.update_source_games_list()  # Atualizar a lista de jogos da coleção fonte
+            try:
+                sections = read_sections(file_name)  # Só procura as linhas "collection:", sem ler os jogos
+            except OSError as error:
+                QMessageBox.warning(self, "Error", f"Could not load {file_name}:\n{error}")
+                return
+            self.collection_sections = sections if len(sections) > 1 else []
+            self.show_sections()
+            self.load_collection(file_name, 0 if self.collection_sections else None)
+
+    def open_collection_section(self, number):
+        """ Abre outra coleção do mesmo arquivo; só a parte dela é lida. """
+        if number < 0 or number == self.collection_section or self.collection_file is None:
+            return
+        names = {field: name_input.text() for field, name_input in self.name_inputs.items()}
+        if self.pending.removals or names != self.saved_names:
+            answer = QMessageBox.question(self, "Unsaved Changes",
+                                          "The changes to this collection were not saved. Open another one anyway?",
+                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                self.show_sections()
+                return
+        self.refresh_sections()  # O arquivo pode ter mudado desde que foi indexado
+        if number < len(self.collection_sections):
+            self.load_collection(self.collection_file, number)
+
+    def show_sections(self):
+        self.section_combo.blockSignals(True)
+        self.section_combo.clear()
+        self.section_combo.addItems([section.label() for section in self.collection_sections])
+        if self.collection_section is not None:
+            self.section_combo.setCurrentIndex(self.collection_section)
+        self.section_combo.blockSignals(False)
+        self.section_combo.setVisible(bool(self.collection_sections))
+
+    def refresh_sections(self):
+        """ Indexa de novo as coleções do arquivo aberto (posições e números de jogos mudam ao salvar). """
+        from pegasus_sections import read_sections
+
+        if self.collection_section is None:
+            return
+        try:
+            self.collection_sections = read_sections(self.collection_file)
+        except OSError:
+            return
+        self.show_sections()
+
+    def section_range(self):
+        """ Bytes (início, fim) da coleção aberta no arquivo, ou None quando ela é o arquivo todo. """
+        if self.collection_section is None:
+            return None
+        return self.collection_sections[self.collection_section].byte_range
+
+    def load_collection(self, file_name, section):
+        from pegasus_history import CommandLog
+
+        self.collection_file = file_name
+        self.collection_section = section
+        self.show_sections()
+        self.save_button.setEnabled(False)  # Só depois que todos os jogos forem carregados
+        self.collection_path_label.setText(file_name)
+        self.clear_game_list()
+        self.existing_games.clear()
+        self.duplicate_index.rebuild(())
+        self.pending.removals.clear()
+        self.existing_games_model.clear()
+        self.unwatch_files("collection")
+        self.set_command_log(CommandLog())
+        self.start_loader("collection", file_name, self.on_collection_header,
+                          self.on_collection_games, self.on_collection_loaded, self.section_range())
+
+    def on_collection_header(self, header):
+        self.apply_collection_header(header)
+
+    def on_collection_games(self, records):
+        self.existing_games_model.append_rows(self.existing_rows(self.add_existing_records(records)))
+
+    def on_collection_loaded(self, completed):
+        if not completed:
+            # Uma coleção parcial não pode ser salva sem perder jogos
+            self.collection_file = None
+            self.collection_path_label.setText("")
+        self.save_button.setEnabled(completed)
+        self.update_existing_games_list()
+        self.update_source_games_list()  # Atualizar a lista de jogos da coleção fonte
+        edits, self.session_edits = self.session_edits, None
+        if completed:
+            self.watch_file(self.collection_file, "collection")
+            if edits is None:
+                self.resume_history(self.collection_file)
+            else:
+                self.restore_session_edits(edits)
 
     def load_existing_games(self, file_name):
         """ Carrega os jogos existentes na custom collection. """
         self.existing_games.clear()
-        self.games_to_remove.clear()
-
-        with open(file_name, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            collecting_games = False
-            current_game = {}
-
-            for line in lines:
-                if not collecting_games and line.startswith("collection:"):
-                    collecting_games = True  # Começamos a coletar os jogos
-
-                if collecting_games:
-                    if line.startswith("# "):
-                        # Adiciona o jogo coletado anteriormente
-                        if current_game and 'game' in current_game and 'file' in current_game:
-                            launch_cmd = current_game.get('launch', 'none')  # Pega o launch original ou define 'none'
-                            abs_path, ext, _ = self.extrair_info_arquivo(current_game['file'], self.absolute_path)  # Ignore the placeholder value
-                            self.existing_games.add((current_game['game'], abs_path, ext, launch_cmd))  # Mantém o comando original
-
-                        # Inicia novo jogo
-                        current_game = {'game': line.strip("# ").strip()}
-                    elif line.strip() == "":
-                        # Finaliza a adição do jogo anterior
-                        if current_game and 'game' in current_game and 'file' in current_game:
-                            launch_cmd = current_game.get('launch', 'none')  # Pega o launch original ou define 'none'
-                            abs_path, ext, _ = self.extrair_info_arquivo(current_game['file'], self.absolute_path)  # Ignore the placeholder value
-                            self.existing_games.add((current_game['game'], abs_path, ext, launch_cmd))  # Mantém o comando original
-
-                        current_game = {}
-                    else:
-                        key, value = line.split(":", 1)
-                        current_game[key.strip()] = value.strip()
+        self.duplicate_index.rebuild(())
+        self.pending.removals.clear()
+        self.add_existing_records(self.parse_cache.parse(file_name).games)
+
+    def add_existing_records(self, records):
+        """ Adds parsed collection records to existing_games; returns the new GameRecords. """
+        return self.add_existing_games(
+            self.existing_game(current_game) for current_game in records
+            if 'game' in current_game and 'file' in current_game
+        )
 
-            # Último jogo
-            if current_game and 'game' in current_game and 'file' in current_game:
-                launch_cmd = current_game.get('launch', 'none')  # Pega o launch original ou define 'none'
-                abs_path, ext, _ = self.extrair_info_arquivo(current_game['file'], self.absolute_path)  # Ignore the placeholder value
-                self.existing_games.add((current_game['game'], abs_path, ext, launch_cmd))  # Mantém o comando original
+    def add_existing_games(self, games):
+        added = []
+        for game in games:
+            if game not in self.existing_games:
+                self.existing_games.add(game)
+                self.duplicate_index.add(game.key)
+                added.append(game)
+        return added
 
+    def existing_game(self, record):
+        """ GameRecord of a parsed collection record; keeps its launch command, or 'none'. """
+        return GameRecord.from_fields(record, self.absolute_path)
+
+    @instrumented("update_existing_games_list", count=lambda self, _: self.existing_games_model.rowCount())
     def update_existing_games_list(self):
-        self.existing_games_list.clear()
-        for game_name, file_path, ext, launch in sorted(self.existing_games):
-            item = QListWidgetItem()
-            item_widget = QWidget()
-            item_layout = QHBoxLayout()
-            item_layout.setContentsMargins(0, 0, 0, 0)
-            item_layout.setSpacing(10)  # Espaçamento entre o botão e o texto
-
-            # Primeiro adiciona o botão
-            button = QPushButton("x")
-            button.setFixedSize(30, 30)
-            button.clicked.connect(lambda _, item=item, game_name=game_name: self.toggle_game_removal(item, game_name))
-            item_layout.addWidget(button)
-
-            # Depois adiciona o label
-            label = QLabel(game_name)
-            item_layout.addWidget(label)
-
-            # Adiciona espaço flexível no final
-            item_layout.addStretch()
-
-            item_widget.setLayout(item_layout)
-            item.setSizeHint(item_widget.sizeHint())
-            self.existing_games_list.addItem(item)
-            self.existing_games_list.setItemWidget(item, item_widget)
-
-    def toggle_game_removal(self, item, game_name):
-        row = self.existing_games_list.row(item)
-        label = self.existing_games_list.itemWidget(item).findChild(QLabel)
-        button = self.existing_games_list.itemWidget(item).findChild(QPushButton)
-
-        if game_name in self.games_to_remove:
-            self.games_to_remove.remove(game_name)
-            font = label.font()
-            font.setStrikeOut(False)
-            label.setFont(font)
-            label.setStyleSheet('color: black')
-            button.setText("x")
-        else:
-            self.games_to_remove.add(game_name)
-            font = label.font()
-            font.setStrikeOut(True)
-            label.setFont(font)
-            label.setStyleSheet('color: gray')
-            button.setText("+")
+        self.existing_games_model.set_rows(self.existing_rows(sorted(self.existing_games, key=GameRecord.sort_key)))
+
+    def existing_rows(self, games):
+        is_removed = self.pending.is_removed
+        return [
+            (game.game, game, REMOVED if is_removed(PendingChanges.key(game)) else NORMAL)
+            for game in games
+        ]
 
     def create_new_collection(self):
+        from pegasus_history import CommandLog, history_path
+
         file_name, _ = QFileDialog.getSaveFileName(self, "Create new custom collection", "metadata.pegasus.txt", "Pegasus Metadata (*.txt)")
         if file_name:
             with open(file_name, 'w', encoding='utf-8') as f:
-                f.write("collection:\nshortname:\ncommand: none\nextensions: none\nlaunch: none\n\n")
+                f.write(DEFAULT_HEADER)
             self.collection_file = file_name
+            self.collection_sections = []
+            self.collection_section = None
+            self.show_sections()
             self.save_button.setEnabled(True)
             self.collection_path_label.setText(file_name)
             self.clear_game_list()
@@ -398,397 +665,1088 @@ class PegasusCustomCollectionEditor(QWidget):
             self.load_existing_games(file_name)  # Carregar jogos existentes da nova coleção
             self.update_existing_games_list()  # Atualizar a lista de jogos existentes
             self.update_source_games_list()  # Atualizar a lista de jogos da coleção fonte
+            self.unwatch_files("collection")
+            self.watch_file(file_name, "collection")
+            self.set_command_log(CommandLog(history_path(file_name)))
+            self.command_log.discard()  # De uma coleção antiga com o mesmo nome
 
     def open_source(self):
-        file_name, _ = QFileDialog.getOpenFileName(self, "Open Source File", "", "Pegasus Metadata (*.txt)")
-        if file_name:
-            self.source_file = file_name
-            self.absolute_path = os.path.dirname(file_name)
-            self.absolute_path_input.setText(self.absolute_path)
-            self.source_loaded = True  # Marca que o arquivo fonte foi carregado
-            self.load_launch_command(file_name)
-            self.load_source_collection_name(file_name)
-            self.load_source_games(file_name)
+        file_names, _ = QFileDialog.getOpenFileNames(self, "Open Source File", "", "Pegasus Metadata (*.txt)")
+        if file_names:
+            self.load_sources(file_names)
+
+    def open_source_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Open Source Folder")
+        if directory:
+            from pegasus_catalog import find_metadata_files
+
+            file_names = find_metadata_files(directory)
+            if not file_names:
+                QMessageBox.warning(self, "Error", f"No metadata files found in {directory}")
+                return
+            self.load_sources(file_names)
+
+    def load_sources(self, file_names):
+        """ Abre um arquivo fonte, ou mescla vários em uma única lista da fonte, lidos em paralelo. """
+        from pegasus_query import ColumnStore
+        from pegasus_search import SearchIndex
+        from pegasus_workers import SourcesLoader
+
+        file_name = file_names[0]
+        self.source_file = file_name
+        self.absolute_path = os.path.dirname(file_name)
+        self.absolute_path_input.setText(self.absolute_path)
+        self.source_loaded = True  # Marca que o arquivo fonte foi carregado
+        self.launch_command = "none"
+        self.source_collection_name = ""
+        self.source_collection_name_display.setText("")
+        self.source_games.clear()
+        self.source_records = []
+        self.source_origins = []
+        self.source_origin_ids = {}
+        self.record_origins = array('H')
+        self.search_index = SearchIndex(self.source_records)
+        self.column_store = ColumnStore(self.source_records)
+        self.last_search = None
+        self.fuzzy_indexes = {}
+        self.source_patched = False
+        # Tomada antes da leitura: um índice construído sobre uma versão antiga não vai para o cache
+        self.source_version = self.parse_cache.version(file_name) if len(file_names) == 1 else None
+        self.unwatch_files("source")
+        self.source_games_model.clear()
+        self.clear_game_list()
+        if len(file_names) == 1:
+            self.start_loader("source", file_name, self.on_source_header,
+                              self.on_source_games, self.on_source_loaded)
+        else:
+            self.stop_loader("source")
+            loader = SourcesLoader(file_names, self.parse_cache, parent=self)
+            loader.header_loaded.connect(self.on_sources_header)
+            loader.games_loaded.connect(self.on_sources_games)
+            self.run_loader("source", loader, lambda completed: self.on_sources_loaded(loader, completed),
+                            "open_sources")
 
-            # Atualizar o display do nome da coleção fonte
-            self.source_collection_name_display.setText(self.source_collection_name)
+    def on_source_header(self, header):
+        from pegasus_metadata import MetadataDocument
 
-            # Habilitar os checkboxes de filtro após carregar o arquivo fonte
-            for checkbox in self.field_checkboxes.values():
-                checkbox.setEnabled(True)
+        source = MetadataDocument(header)
+        self.load_launch_command(source)
+        self.load_source_collection_name(source)
 
-            # Atualizar a lista de jogos da coleção fonte
-            self.update_source_games_list()
+        self.reset_source_origins()
 
-    def update_source_games_list(self):
-        self.source_games_list.clear()
-        for game_name, file_path in sorted(self.source_games):
-            item = QListWidgetItem()
-            item_widget = QWidget()
-            item_layout = QHBoxLayout()
-            item_layout.setContentsMargins(0, 0, 0, 0)
-            item_layout.setSpacing(10)  # Espaçamento entre o texto e o botão
-
-            label = QLabel(game_name)
-            item_layout.addWidget(label)
-
-            abs_path, file_extension, _ = self.extrair_info_arquivo(file_path, self.absolute_path)
-            is_duplicate = any(
-                existing_game[1] == abs_path and existing_game[2] == file_extension
-                for existing_game in self.existing_games
-            )
+        # Atualizar o display do nome da coleção fonte
+        self.source_collection_name_display.setText(self.source_collection_name)
 
-            if is_duplicate:
-                label.setFont(QFont('Arial'))
-                label.setStyleSheet('color: gray')
-                label.setToolTip("Already exists in the custom collection")
-            else:
-                button = QPushButton("+")
-                button.setFixedSize(30, 30)
-                button.clicked.connect(lambda _, item=item, game={"game": game_name, "file": file_path}:
-                                    self.toggle_source_game_addition(item, game))
-                item_layout.addWidget(button)
-
-            item_widget.setLayout(item_layout)
-            item.setSizeHint(item_widget.sizeHint())
-            self.source_games_list.addItem(item)
-            self.source_games_list.setItemWidget(item, item_widget)
-
-    def load_launch_command(self, file_name):
-        with open(file_name, 'r', encoding='utf-8') as file:
-            for line in file:
-                if line.startswith("launch:"):
-                    self.launch_command = line.replace("launch: ", "").strip()
-                    break
-
-    def load_source_collection_name(self, file_name):
-        with open(file_name, 'r', encoding='utf-8') as file:
-            for line in file:
-                if line.startswith("collection:"):
-                    self.source_collection_name = line.replace("collection:", "").strip()
-                    break
-
-    def load_source_games(self, file_name):
-        self.source_games.clear()
-        with open(file_name, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            current_game = {}
-            for line in lines:
-                if line.startswith("# "):
-                    if current_game and 'game' in current_game and 'file' in current_game:
-                        self.source_games.add((current_game['game'], current_game['file']))
-                    current_game = {'game': line.strip("# ").strip()}
-                elif line.strip() == "":
-                    if current_game and 'game' in current_game and 'file' in current_game:
-                        self.source_games.add((current_game['game'], current_game['file']))
-                        current_game = {}
-                else:
-                    if ":" in line:  # Ensure the line contains ':' before splitting
-                        key, value = line.split(":", 1)
-                        current_game[key.strip()] = value.strip()
-            if current_game and 'game' in current_game and 'file' in current_game:
-                self.source_games.add((current_game['game'], current_game['file']))
-
-        # Atualizar a lista de jogos da coleção fonte
+        # Habilitar os checkboxes de filtro; a busca funciona sobre o que já foi carregado
+        for checkbox in self.field_checkboxes.values():
+            checkbox.setEnabled(True)
+
+    def on_source_games(self, records):
+        self.source_games_model.append_rows(self.addition_rows(self.add_source_records(records)))
+
+    def on_sources_header(self, file_name, header):
+        from pegasus_sources import SourceOrigin
+
+        # Cada arquivo mesclado guarda a própria pasta, comando de launch e console
+        self.source_origin_ids[file_name] = len(self.source_origins)
+        self.source_origins.append(SourceOrigin.from_header(file_name, header))
+        consoles = [origin.console or os.path.basename(os.path.dirname(origin.file_name))
+                    for origin in self.source_origins]
+        self.source_collection_name_display.setText(f"{len(consoles)} collections: {', '.join(consoles)}")
+        for checkbox in self.field_checkboxes.values():
+            checkbox.setEnabled(True)
+
+    def on_sources_games(self, file_name, records):
+        origin_id = self.source_origin_ids[file_name]
+        self.source_games_model.append_rows(self.addition_rows(self.add_source_records(records, origin_id)))
+
+    def on_sources_loaded(self, loader, completed):
+        if loader.failed:
+            QMessageBox.warning(self, "Error", "Could not load:\n" + "\n".join(loader.failed[:10]))
+        self.on_source_loaded(completed)
+
+    def on_source_loaded(self, completed):
+        # Ordena a lista uma única vez, no final
         self.update_source_games_list()
+        if self.keyword_input.text():
+            self.schedule_search()  # A busca feita durante o carregamento não viu todos os jogos
+        if completed:
+            self.watch_sources()
+
+    def load_launch_command(self, source):
+        self.launch_command = source.launch_command()
+
+    def load_source_collection_name(self, source):
+        self.source_collection_name = source.collection_name()
+
+    def reset_source_origins(self):
+        """ Torna o arquivo fonte aberto (absolute_path, launch_command, source_collection_name) a única origem. """
+        from pegasus_sources import SourceOrigin
+
+        # No lugar: uma busca começada antes do cabeçalho chegar guarda esta mesma lista
+        self.source_origins[:] = [SourceOrigin(self.source_file, self.absolute_path, self.launch_command,
+                                               self.source_collection_name)]
+        self.source_origin_ids = {self.source_file: 0}
+
+    def load_source_games(self, source):
+        from pegasus_query import ColumnStore
+        from pegasus_search import SearchIndex
+
+        self.source_games.clear()
+        self.source_records = []
+        self.record_origins = array('H')
+        self.reset_source_origins()
+        self.search_index = SearchIndex(self.source_records)
+        self.column_store = ColumnStore(self.source_records)
+        self.last_search = None
+        self.fuzzy_indexes = {}
+        self.source_version = None  # De onde veio o documento não se sabe: o índice não vai para o cache
+        self.add_source_records(source.games)
+
+    def add_source_records(self, records, origin_id=0):
+        """ Adds parsed records of source_origins[origin_id]; returns the GameRecords of the games not listed yet. """
+        origin = self.source_origins[origin_id]
+        self.source_records.extend(records)
+        self.record_origins.extend(repeat(origin_id, len(records)))
+        self.search_index.index_new()
+        added = []
+        for current_game in records:
+            if 'game' in current_game and 'file' in current_game:
+                game = GameRecord.from_fields(current_game, origin.base_dir, origin.launch, origin.console)
+                if game not in self.source_games:
+                    self.source_games.add(game)
+                    added.append(game)
+        return added
+
+    def start_loader(self, kind, file_name, on_header, on_games, on_finished, byte_range=None):
+        """ Loads file_name (or its bytes in byte_range) in a MetadataLoader thread, replacing any running load of the same kind. """
+        from pegasus_workers import MetadataLoader
+
+        self.stop_loader(kind)
+        # A fonte só precisa de game/file até uma busca: é mapeada em memória e lida sob demanda
+        loader = MetadataLoader(file_name, self.parse_cache, lazy=(kind == "source"), byte_range=byte_range, parent=self)
+        loader.header_loaded.connect(on_header)
+        loader.games_loaded.connect(on_games)
+        self.run_loader(kind, loader, on_finished, f"open_{kind}")
+
+    def stop_loader(self, kind):
+        """ Cancels a running load of the given kind; what it still sends is ignored. """
+        previous = self.loaders.pop(kind, None)
+        if previous is not None:
+            previous.cancel()
+            previous.header_loaded.disconnect()
+            previous.games_loaded.disconnect()
+            previous.loading_finished.disconnect()
+            self.loader_stages.pop(kind, None)
+
+    def run_loader(self, kind, loader, on_finished, stage):
+        """ Starts a worker with the loader signals, showing its progress in the loading bar. """
+        loader.progress.connect(self.update_loading_progress)
+        loader.loading_finished.connect(lambda completed: self.finish_loader(kind, loader, on_finished, completed))
+        loader.loading_failed.connect(lambda message: self.fail_loader(kind, loader, message))
+        loader.finished.connect(loader.deleteLater)
+        self.loaders[kind] = loader
+        if PROFILER is not None:
+            self.loader_stages[kind] = PROFILER.start(stage)
+        self.loading_bar.setValue(0)
+        self.loading_bar.setVisible(True)
+        self.cancel_loading_button.setVisible(True)
+        loader.start()
+
+    def update_library(self):
+        """ Atualiza o catálogo da biblioteca; só os arquivos alterados desde a última vez são lidos de novo. """
+        from pegasus_workers import CatalogUpdater
+
+        from pegasus_catalog import CatalogError
+
+        try:
+            roots = self.library_catalog().roots()
+        except CatalogError as error:
+            QMessageBox.warning(self, "Error", str(error))
+            return
+        directory = QFileDialog.getExistingDirectory(self, "Choose the Library Folder", roots[0] if roots else "")
+        if directory:
+            self.library_button.setEnabled(False)  # Uma atualização por vez
+            updater = CatalogUpdater(self.library_catalog(), [directory], parent=self)
+            updater.finished.connect(lambda: self.library_button.setEnabled(True))
+            self.run_loader("library", updater, lambda completed: self.on_library_updated(updater.summary, completed),
+                            "update_library")
+
+    def check_files(self):
+        """ Verifica em segundo plano se os arquivos dos jogos da coleção e da fonte existem. """
+        from pegasus_validation import STATE_FILE, FileChecker
+        from pegasus_workers import FileCheckWorker
+
+        keys = {game.abs_path: game.key for game in chain(self.existing_games, self.source_games)}
+        if not keys or "files" in self.loaders:
+            return
+        self.check_files_button.setEnabled(False)
+        if self.file_checker is None:
+            self.file_checker = FileChecker(os.path.join(self.parse_cache.directory, STATE_FILE))
+        worker = FileCheckWorker(self.file_checker, list(keys), parent=self)
+        worker.finished.connect(lambda: self.check_files_button.setEnabled(True))
+        self.run_loader("files", worker, lambda completed: self.on_files_checked(worker.statuses, keys, completed),
+                        "check_files")
+
+    def on_files_checked(self, statuses, keys, completed):
+        from pegasus_validation import CHANGED, MISSING, OK, UNREADABLE
+
+        if not completed:
+            return
+        self.file_statuses = {keys[path]: status for path, status in statuses.items() if status != OK}
+        for model in (self.existing_games_model, self.source_games_model, self.selected_games_model):
+            model.set_file_statuses(self.file_statuses)
+        counts = {status: 0 for status in (MISSING, CHANGED, UNREADABLE)}
+        for status in self.file_statuses.values():
+            counts[status] += 1
+        self.remove_missing_button.setEnabled(any(
+            self.file_statuses.get(game.key) == MISSING for game in self.existing_games))
+        QMessageBox.information(self, "Files Checked",
+                                f"{len(statuses)} files checked: {counts[MISSING]} missing, {counts[CHANGED]} changed "
+                                f"since the last check, {counts[UNREADABLE]} could not be checked.")
+
+    def remove_missing_games(self):
+        """ Marca de uma vez para remoção todos os jogos da coleção cujo arquivo não foi encontrado. """
+        from pegasus_history import STAGE_REMOVALS
+        from pegasus_validation import MISSING
+
+        self.bulk_edit([(STAGE_REMOVALS, [game for game in self.existing_games
+                                          if self.file_statuses.get(game.key) == MISSING])])
+
+    def on_library_updated(self, summary, completed):
+        self.library_checkbox.setEnabled(True)
+        if not completed:
+            return  # Os arquivos lidos antes de cancelar continuam no catálogo
+        message = (f"{summary['files']} metadata files: {summary['added']} added, {summary['updated']} updated, "
+                   f"{summary['removed']} removed, {summary['games']} games read.")
+        if summary["failed"]:
+            message += "\n\nCould not read:\n" + "\n".join(summary["failed"][:10])
+        QMessageBox.information(self, "Library Updated", message)
+        if self.library_checkbox.isChecked():
+            self.schedule_search()
+
+    def finish_loader(self, kind, loader, on_finished, completed):
+        if self.loaders.get(kind) is loader:
+            del self.loaders[kind]
+            on_finished(completed)
+            self.finish_loader_stage(kind, loader, completed=completed)
+        self.update_loading_progress()
+        self.check_startup()
+
+    def fail_loader(self, kind, loader, message):
+        if self.loaders.get(kind) is loader:
+            del self.loaders[kind]
+            self.finish_loader_stage(kind, loader, error=message)
+            if kind == "collection":
+                self.collection_file = None
+            QMessageBox.warning(self, "Error", f"Could not load {loader.file_name}:\n{message}")
+        self.update_loading_progress()
+        self.check_startup()
+
+    def finish_loader_stage(self, kind, loader, **extra):
+        token = self.loader_stages.pop(kind, None)
+        if token is not None:
+            PROFILER.finish(token, loader.records_loaded, file=loader.file_name, **extra)
+
+    def update_loading_progress(self, *_):
+        done = sum(loader.bytes_done for loader in self.loaders.values())
+        total = sum(loader.total_bytes for loader in self.loaders.values())
+        if not self.loaders:
+            self.loading_bar.setVisible(False)
+            self.cancel_loading_button.setVisible(False)
+        elif total:
+            self.loading_bar.setValue(int(1000 * done / total))
+
+    def cancel_loading(self):
+        for loader in list(self.loaders.values()):
+            loader.cancel()
+
+    def closeEvent(self, event):
+        from pegasus_session import save_session
+
+        if self.session_path is not None:
+            save_session(self.session_state(), self.session_path)
+        if self.command_log is not None and not self.has_unsaved_edits():
+            self.command_log.discard()  # Nada a recuperar na próxima vez
+        self.search_timer.stop()  # Senão uma busca ou um retrato ainda pendente começa uma thread depois daqui
+        self.watch_timer.stop()
+        for worker in self.findChildren(QThread):
+            worker.requestInterruption()
+            worker.wait()
+        if PROFILER is not None and self.profile_listener in PROFILER.listeners:
+            PROFILER.listeners.remove(self.profile_listener)
+        super().closeEvent(event)
+
+    def watch_file(self, file_name, kind, records=None, ids=None):
+        """ Vigia um arquivo aberto; o retrato dos seus registros, para comparar depois, é feito em segundo plano. """
+        self.watched_files[file_name] = kind
+        self.file_snapshots.pop(file_name, None)
+        if file_name not in self.file_watcher.files():
+            self.file_watcher.addPath(file_name)
+        self.start_snapshot(file_name, records=records, ids=ids)
+
+    def watch_sources(self):
+        """ Vigia cada arquivo fonte aberto, com os registros e ids que vieram dele. """
+        from pegasus_metadata import LazyRecord
+
+        groups = [([], []) for _ in self.source_origins]
+        for record_id, (record, origin_id) in enumerate(zip(self.source_records, self.record_origins)):
+            if not isinstance(record, LazyRecord):
+                return  # Só registros mapeados sabem onde estão no arquivo
+            records, ids = groups[origin_id]
+            records.append(record)
+            ids.append(record_id)
+        for origin, (records, ids) in zip(self.source_origins, groups):
+            self.watch_file(origin.file_name, "source", records, ids)
+
+    def unwatch_files(self, kind):
+        for file_name in [file_name for file_name, watched in self.watched_files.items() if watched == kind]:
+            del self.watched_files[file_name]
+            self.file_snapshots.pop(file_name, None)
+            self.changed_files.discard(file_name)
+            worker = self.snapshot_workers.pop(file_name, None)
+            if worker is not None:
+                worker.requestInterruption()
+            self.file_watcher.removePath(file_name)
+
+    def start_snapshot(self, file_name, previous=None, records=None, ids=None):
+        from pegasus_workers import SnapshotWorker
+
+        section = self.collection_section if self.watched_files.get(file_name) == "collection" else None
+        worker = SnapshotWorker(file_name, previous, records, ids, section, parent=self)
+        worker.snapshot_ready.connect(
+            lambda snapshot, diff, records: self.on_snapshot_ready(worker, snapshot, diff, records))
+        worker.finished.connect(worker.deleteLater)
+        previous_worker = self.snapshot_workers.get(file_name)
+        if previous_worker is not None:
+            previous_worker.requestInterruption()
+        self.snapshot_workers[file_name] = worker
+        worker.start()
+
+    def on_watched_file_changed(self, file_name):
+        # Um editor que grava em várias etapas avisa várias vezes: relê uma vez, quando o arquivo sossegar
+        self.changed_files.add(file_name)
+        self.watch_timer.start()
+
+    def process_changed_files(self):
+        for file_name in list(self.changed_files):
+            if file_name not in self.watched_files:
+                self.changed_files.discard(file_name)
+                continue
+            if not os.path.exists(file_name):
+                continue  # Sendo substituído, ou apagado: volta a ser vigiado quando reaparecer
+            # Gravar num temporário e renomear (como save_collection faz) tira o arquivo do watcher
+            if file_name not in self.file_watcher.files():
+                self.file_watcher.addPath(file_name)
+            if file_name in self.snapshot_workers or file_name not in self.file_snapshots:
+                continue  # Relido quando o retrato em andamento terminar
+            self.changed_files.discard(file_name)
+            self.start_snapshot(file_name, previous=self.file_snapshots[file_name])
+        if any(not os.path.exists(file_name) for file_name in self.changed_files):
+            self.watch_timer.start()
+
+    def on_snapshot_ready(self, worker, snapshot, diff, records):
+        file_name = worker.file_name
+        if self.snapshot_workers.get(file_name) is not worker:
+            return
+        del self.snapshot_workers[file_name]
+        kind = self.watched_files.get(file_name)
+        if kind is None:
+            return
+        if snapshot is None:
+            self.changed_files.add(file_name)  # Não deu para ler agora; tenta de novo
+        elif diff:
+            if kind == "collection":
+                self.apply_collection_changes(self.file_snapshots[file_name], snapshot, diff, records)
+                self.refresh_sections()
+            elif not self.apply_source_changes(self.file_snapshots[file_name], snapshot, diff, records):
+                return  # A fonte está sendo relida do zero
+        if snapshot is not None:
+            self.file_snapshots[file_name] = snapshot
+        if file_name in self.changed_files:
+            self.watch_timer.start()
+
+    @instrumented("apply_collection_changes", count=lambda self, _: self.existing_games_model.rowCount())
+    def apply_collection_changes(self, previous, snapshot, diff, records):
+        """ Aplica à coleção em memória só os registros do arquivo que mudaram; marcações pendentes que ainda valem ficam.
+
+        records são os registros lidos para o retrato novo.
+        """
+        if diff.header_changed:
+            self.apply_collection_header(self.read_collection_header())
+        listed = snapshot.pairs()
+        model = self.existing_games_model
+        removed_games = set()
+        for index in diff.removed:
+            game, file_path = previous.games[index], previous.files[index]
+            if game and file_path and (game, file_path) not in listed:
+                key = self.existing_game({"game": game, "file": file_path}).key
+                removed_games.update(model.game(row) for row in model.rows_for(key) if model.game(row).game == game)
+        for game in removed_games:
+            self.existing_games.discard(game)
+            self.duplicate_index.remove(game.key)
+        self.pending.unstage_removals(PendingChanges.key(game) for game in removed_games)
+        inserted_games = self.add_existing_records(records[index].materialize() for index in diff.added)
+        # Jogos marcados para adicionar que agora já estão no arquivo
+        self.pending.unstage_additions([key for key, game in self.pending.additions.items()
+                                        if self.duplicate_index.contains(game.key)])
+
+        model.remove_rows(row for game in removed_games for row in model.rows_for(game.key) if model.game(row) == game)
+        model.insert_sorted(self.existing_rows(inserted_games), sort_key=GameRecord.sort_key)
+        self.update_addition_rows({game.key for game in removed_games.union(inserted_games)})
+
+    @instrumented("apply_source_changes", count=lambda self, _: self.source_games_model.rowCount())
+    def apply_source_changes(self, previous, snapshot, diff, new_records):
+        """ Aplica à fonte em memória só os registros do arquivo que mudaram; False se a fonte precisa ser relida toda.
+
+        new_records são os registros lidos para o retrato novo. Os registros
+        removidos viram registros vazios, para que os ids dos demais continuem
+        valendo nos índices de busca.
+        """
+        origin_id = self.source_origin_ids.get(snapshot.file_name)
+        if diff.header_changed or origin_id is None:
+            # Pasta, launch ou console mudaram para todos os jogos do arquivo
+            self.load_sources([origin.file_name for origin in self.source_origins])
+            return False
+        origin = self.source_origins[origin_id]
+        records = self.source_records
+        ids = [None] * len(snapshot)
+        for old_index, new_index in diff.kept:
+            # Passa a ler da cópia nova do arquivo, para que a antiga seja liberada
+            ids[new_index] = previous.ids[old_index]
+            records[ids[new_index]] = new_records[new_index]
+        removed = []
+        for index in diff.removed:
+            record_id = previous.ids[index]
+            removed.append(records[record_id])
+            records[record_id] = {}
+        first_id = len(records)
+        for offset, index in enumerate(diff.added):
+            ids[index] = first_id + offset
+        snapshot.ids = ids
+        self.source_patched = True
+        self.last_search = None
+        inserted_games = self.add_source_records([new_records[index] for index in diff.added], origin_id)
+
+        listed = snapshot.pairs()
+        removed_games = {
+            GameRecord.from_fields(record, origin.base_dir, origin.launch, origin.console) for record in removed
+            if record.game and record.file and (record.game, record.file) not in listed
+        }
+        self.source_games.difference_update(removed_games)
+        self.pending.unstage_additions(PendingChanges.key(game) for game in removed_games)
+        for model in (self.source_games_model, self.selected_games_model):
+            model.remove_rows(row for game in removed_games for row in model.rows_for(game.key)
+                              if model.game(row) == game)
+        self.source_games_model.insert_sorted(self.addition_rows(inserted_games), sort_key=GameRecord.sort_key)
+        if inserted_games and self.keyword_input.text():
+            self.schedule_search()
+        return True
+
+    def session_state(self):
+        """ O que restore_session reabre: arquivos, layout, busca e mudanças ainda não salvas. """
+        from pegasus_session import encode_games
+
+        source_files = [origin.file_name for origin in self.source_origins]
+        if not source_files and self.source_file:
+            source_files = [self.source_file]
+        return {
+            "collection_file": self.collection_file,
+            "collection_section": self.collection_section,
+            "source_files": source_files,
+            "splitter_sizes": self.splitter.sizes(),
+            "fields": [field for field, checkbox in self.field_checkboxes.items() if checkbox.isChecked()],
+            "keyword": self.keyword_input.text(),
+            "fuzzy": self.fuzzy_checkbox.isChecked(),
+            "library": self.library_checkbox.isChecked(),
+            "names": {field: name_input.text() for field, name_input in self.name_inputs.items()},
+            "additions": encode_games(self.pending.additions.values()),
+            "removals": encode_games(self.pending.removals.values()),
+        }
+
+    def restore_session(self, path=None):
+        """ Reabre a sessão anterior; os arquivos vêm do cache de parse enquanto não mudarem.
+
+        A partir daqui a sessão é salva ao fechar a janela. startup_finished é
+        emitido quando os arquivos reabertos terminam de carregar.
+        """
+        from pegasus_sections import read_sections
+        from pegasus_session import decode_games, default_session_path, load_session
+
+        self.session_path = path or default_session_path()
+        session = load_session(self.session_path)
+        self.startup_pending = True
+        sizes = session.get("splitter_sizes")
+        if sizes and len(sizes) == self.splitter.count():
+            self.splitter.setSizes(sizes)
+        if "fields" in session:
+            for field, checkbox in self.field_checkboxes.items():
+                checkbox.setChecked(field in session["fields"])
+        self.fuzzy_checkbox.setChecked(bool(session.get("fuzzy")))
+        self.enable_library_search()
+        self.library_checkbox.setChecked(bool(session.get("library")) and self.library_checkbox.isEnabled())
+        self.keyword_input.setText(session.get("keyword", ""))
+
+        # As adições marcadas aparecem assim que os jogos da fonte chegam
+        self.pending.stage_additions((PendingChanges.key(game), game)
+                                     for game in decode_games(session.get("additions", [])))
+        source_files = [file_name for file_name in session.get("source_files", []) if os.path.isfile(file_name)]
+        if source_files:
+            self.load_sources(source_files)
+        collection_file = session.get("collection_file")
+        if collection_file and os.path.isfile(collection_file):
+            try:
+                sections = read_sections(collection_file)
+            except OSError:
+                sections = []
+            section = session.get("collection_section")
+            if len(sections) > 1 and not (isinstance(section, int) and 0 <= section < len(sections)):
+                section = 0
+            self.collection_sections = sections if len(sections) > 1 else []
+            self.session_edits = session
+            self.load_collection(collection_file, section if self.collection_sections else None)
+        self.check_startup()
+
+    def restore_session_edits(self, session):
+        """ Marca de novo as remoções e os nomes não salvos da sessão, e retoma o histórico de desfazer. """
+        from pegasus_history import CommandLog, history_path
+        from pegasus_session import decode_games
+
+        self.pending.stage_removals((PendingChanges.key(game), game)
+                                    for game in decode_games(session.get("removals", []))
+                                    if game in self.existing_games)  # Jogos que saíram do arquivo não voltam
+        for field, name in session.get("names", {}).items():
+            if field in self.name_inputs:
+                self.name_inputs[field].setText(name)
+                self.recorded_names[field] = name
+        self.set_command_log(CommandLog.replay(history_path(self.collection_file, self.collection_section))[0])
+        self.update_existing_games_list()
+
+    def check_startup(self):
+        """ Mede o tempo até a sessão restaurada estar pronta para uso, quando os arquivos reabertos terminam. """
+        if not self.startup_pending or "source" in self.loaders or "collection" in self.loaders:
+            return
+        self.startup_pending = False
+        self.startup_seconds = time.perf_counter() - STARTED
+        if PROFILER is not None:
+            PROFILER.finish(PROFILER.start("startup", STARTED), len(self.source_records) + len(self.existing_games))
+        self.startup_finished.emit(self.startup_seconds)
+
+    def set_command_log(self, command_log):
+        self.command_log = command_log
+        self.update_history_buttons()
+
+    def resume_history(self, collection_file):
+        """ Começa o histórico da coleção aberta, oferecendo reaplicar as edições não salvas de uma sessão anterior. """
+        from pegasus_history import CommandLog, history_path
+
+        command_log, operations = CommandLog.replay(history_path(collection_file, self.collection_section))
+        if operations:
+            answer = QMessageBox.question(
+                self, "Unsaved Changes",
+                f"{len(operations)} changes to this collection were not saved in a previous session. Restore them?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if answer == QMessageBox.Yes:
+                self.apply_operations(operations)
+            else:
+                command_log = CommandLog(command_log.path)
+                command_log.discard()
+        self.set_command_log(command_log)
+
+    def has_unsaved_edits(self):
+        names = {field: name_input.text() for field, name_input in self.name_inputs.items()}
+        return bool(self.pending) or names != self.saved_names
+
+    def record_edit(self, operations):
+        """ Guarda no histórico uma edição que acabou de ser feita. """
+        if self.command_log is None:
+            from pegasus_history import CommandLog
+
+            self.set_command_log(CommandLog())  # Edições antes de abrir uma coleção ficam só na memória
+        self.command_log.record(operations)
+        self.update_history_buttons()
+
+    def record_rename(self, field):
+        from pegasus_history import RENAME
+
+        new = self.name_inputs[field].text()
+        old = self.recorded_names[field]
+        if new != old:
+            self.recorded_names[field] = new
+            self.record_edit([(RENAME, (field, old, new))])
+
+    def undo(self):
+        if self.command_log is None:
+            return
+        operations = self.command_log.undo()
+        if operations is not None:
+            self.apply_operations(operations)
+        self.update_history_buttons()
+
+    def redo(self):
+        if self.command_log is None:
+            return
+        operations = self.command_log.redo()
+        if operations is not None:
+            self.apply_operations(operations)
+        self.update_history_buttons()
+
+    def update_history_buttons(self):
+        self.undo_button.setEnabled(self.command_log is not None and self.command_log.can_undo())
+        self.redo_button.setEnabled(self.command_log is not None and self.command_log.can_redo())
+
+    def apply_operations(self, operations):
+        """ Aplica operações do histórico, atualizando só as linhas dos jogos envolvidos. """
+        from pegasus_history import RENAME, STAGE_ADDITIONS, STAGE_REMOVALS, UNSTAGE_ADDITIONS, UNSTAGE_REMOVALS
+
+        addition_keys = set()
+        removal_keys = set()
+        for kind, payload in operations:
+            if kind == RENAME:
+                field, _, new = payload
+                self.name_inputs[field].setText(new)
+                self.recorded_names[field] = new
+            elif kind == STAGE_ADDITIONS:
+                self.pending.stage_additions((PendingChanges.key(game), game) for game in payload)
+            elif kind == UNSTAGE_ADDITIONS:
+                self.pending.unstage_additions(PendingChanges.key(game) for game in payload)
+            elif kind == STAGE_REMOVALS:
+                self.pending.stage_removals((PendingChanges.key(game), game) for game in payload)
+            elif kind == UNSTAGE_REMOVALS:
+                self.pending.unstage_removals(PendingChanges.key(game) for game in payload)
+            if kind in (STAGE_ADDITIONS, UNSTAGE_ADDITIONS):
+                addition_keys.update(game.key for game in payload)
+            elif kind in (STAGE_REMOVALS, UNSTAGE_REMOVALS):
+                removal_keys.update(game.key for game in payload)
+        self.update_addition_rows(addition_keys)
+        self.update_removal_rows(removal_keys)
 
     def load_collection_metadata(self, file_name):
-        with open(file_name, 'r', encoding='utf-8') as file:
-            collection_name = ""
-            shortname = ""
-            header_lines = []
-            for line in file:
-                header_lines.append(line)
-                if line.startswith("collection:"):
-                    collection_name = line.replace("collection:", "").strip()
-                elif line.startswith("shortname:"):
-                    shortname = line.replace("shortname:", "").strip()
-                if line.strip() == "":
-                    header_lines.append("\n")
-                    break
-            self.collection_name_input.setText(collection_name)
-            self.shortname_input.setText(shortname)
-            self.header = "".join(header_lines)
-            self.clear_game_list()  # Limpar a lista de jogos ao carregar a metadata
+        from pegasus_metadata import read_header
+
+        self.apply_collection_header(read_header(file_name))
 
+    def read_collection_header(self):
+        from pegasus_metadata import read_header
+        from pegasus_sections import section_header
+
+        if self.collection_section is None:
+            return read_header(self.collection_file)
+        self.refresh_sections()
+        return section_header(self.collection_file, self.collection_sections[self.collection_section])
+
+    def apply_collection_header(self, header):
+        self.collection_name_input.setText(header.get("collection", ""))
+        self.shortname_input.setText(header.get("shortname", ""))
+        self.saved_names = {field: name_input.text() for field, name_input in self.name_inputs.items()}
+        self.recorded_names = dict(self.saved_names)
+        self.header = "".join(f"{key}: {value}\n" for key, value in header.items()) + "\n"
+
+    @pyqtSlot()
+    @instrumented("filter_games", count=lambda self, _: self.selected_games_model.rowCount())
     def filter_games(self):
-        """ Filtra os jogos da coleção fonte e destaca duplicatas. """
-        if not self.source_file or not self.keyword_input.text():
+        """ Filtra os jogos da coleção fonte e destaca duplicatas (busca imediata, botão "Search"). """
+        from pegasus_query import QueryError
+
+        self.search_timer.stop()
+        self.cancel_search()
+        query = self.search_query()
+        if query is None:
             return
 
-        selected_fields = [field for field, checkbox in self.field_checkboxes.items() if checkbox.isChecked()]
-        keyword = self.keyword_input.text().lower()
-        new_games = []
-
-        with open(self.source_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        current_game = {}
-        description_lines = []
-        description_active = False
-
-        for line in lines:
-            line = line.strip()
-
-            if line.startswith("game:"):
-                if current_game:
-                    if any(keyword in current_game.get(field, "").lower() for field in selected_fields):
-                        new_games.append(current_game)
-                current_game = {"game": line[5:].strip(), "launch": self.launch_command, "file": None, "genre": ""}
-                description_lines = []
-                description_active = False
-            elif line.startswith("description:"):
-                description_active = True
-                description_lines.append(line.replace("description:", "").strip())
-                current_game["description"] = " ".join(description_lines)
-            elif line.startswith("developer:"):
-                current_game["developer"] = line.replace("developer:", "").strip()
-            elif line.startswith("publisher:"):
-                current_game["publisher"] = line.replace("publisher:", "").strip()
-            elif line.startswith("file:"):
-                current_game["file"] = line.replace("file:", "").strip()
-            elif line.startswith("genre:"):
-                current_game["genre"] = line.replace("genre:", "").strip().lower()  # Captura o campo "genre"
-            elif description_active and (line.startswith("publisher:") or line.startswith("genre:") or line.startswith("release:") or line.startswith("players:") or line.startswith("rating:") or line.startswith("assets.") or line.startswith("x-")):
-                description_active = False
-            elif description_active:
-                description_lines.append(line)
-                current_game["description"] = " ".join(description_lines)
-            elif line and ":" in line:
-                key, value = line.split(":", 1)
-                current_game[key.strip()] = value.strip()
-
-        if current_game and any(keyword in current_game.get(field, "").lower() for field in selected_fields):
-            new_games.append(current_game)
+        keyword, fields = query
+        record_count = len(self.source_records)
+        ranked = self.fuzzy_checkbox.isChecked()
+        library = self.library_checkbox.isChecked()
+        try:
+            search, build = self.search_plan(keyword, fields, ranked, library)
+        except QueryError as error:
+            self.show_query_error(error)
+            return
+        ids = search(lambda: False)
+        new_games = [build(record_id) for record_id in ids]
+        self.show_search_results(keyword, fields, record_count, ids, [game for game in new_games if game],
+                                 refinable=not (ranked or library))
+
+    def schedule_search(self, *_):
+        self.search_timer.start()
+
+    def start_search(self):
+        """ Busca em uma thread; uma busca nova cancela a anterior. """
+        from pegasus_query import QueryError
+        from pegasus_workers import SearchWorker
+
+        self.cancel_search()
+        query = self.search_query()
+        if query is None:
+            self.clear_game_list()
+            return
 
+        keyword, fields = query
+        record_count = len(self.source_records)
+        ranked = self.fuzzy_checkbox.isChecked()
+        library = self.library_checkbox.isChecked()
+        try:
+            search, build = self.search_plan(keyword, fields, ranked, library)
+        except QueryError as error:
+            self.show_query_error(error)
+            return
+        refinable = not (ranked or library)
+        worker = SearchWorker(search, self.search_generation, build=build, parent=self)
+        worker.results_ready.connect(
+            lambda generation, ids, games: self.on_search_results(generation, keyword, fields, record_count, ids, games,
+                                                                  refinable))
+        worker.finished.connect(worker.deleteLater)
+        self.search_worker = worker
+        worker.start()
+
+    def on_search_results(self, generation, keyword, fields, record_count, ids, games, refinable):
+        if generation != self.search_generation:
+            return  # Uma busca mais nova já foi iniciada
+        self.search_worker = None
+        self.show_search_results(keyword, fields, record_count, ids, games, refinable)
+
+    def cancel_search(self):
+        self.search_generation += 1
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            self.search_worker = None
+
+    def search_query(self):
+        """ (keyword, selected fields), or None when there is nothing to search. """
+        keyword = self.keyword_input.text()
+        fields = [field for field, checkbox in self.field_checkboxes.items() if checkbox.isChecked()]
+        if not (self.source_file or self.library_checkbox.isChecked()) or not keyword or not fields:
+            return None
+        return keyword, fields
+
+    def search_plan(self, keyword, fields, ranked, library):
+        """ (search, build): search(cancelled) gives result ids, build(id) their GameRecords (or None).
+
+        Raises QueryError when the keyword is a query that does not compile.
+        """
+        if library:
+            return self.library_search_plan(keyword, fields)
+        records, record_origins, origins = self.source_records, self.record_origins, self.source_origins
+
+        def build(record_id):
+            # Cada jogo com a pasta, o launch e o console do seu próprio arquivo fonte
+            origin = origins[record_origins[record_id]]
+            return self.filtered_game(records[record_id], origin.base_dir, origin.launch, origin.console)
+        return self.search_function(keyword, fields, ranked), build
+
+    def library_search_plan(self, keyword, fields):
+        from pegasus_catalog import CatalogError
+        from pegasus_query import QueryError, looks_like_query
+
+        # Só a sintaxe de consulta (campo:texto, AND/OR/NOT em maiúsculas) é recusada; "and" num título é palavra
+        if looks_like_query(keyword):
+            raise QueryError("the library is searched by keywords, not queries")
+
+        catalog = self.library_catalog()
+        found = []  # GameRecords com o launch e o console do sistema de cada jogo
+
+        def search(cancelled):
+            try:
+                found.extend(catalog.search(keyword, fields))
+            except CatalogError:
+                return []  # Catálogo inacessível: nenhum resultado
+            return None if cancelled() else range(len(found))
+        return search, found.__getitem__
+
+    def search_function(self, keyword, fields, ranked):
+        """ search(cancelled) -> ids, for a SearchWorker or for an immediate search.
+
+        Raises QueryError when the keyword is a query that does not compile.
+        """
+        from pegasus_query import compile_query, looks_like_query
+
+        if ranked:
+            index = self.fuzzy_index(fields)
+            source_file = self.source_file
+            source_version = self.source_version
+            # Só o índice de um único arquivo fonte, já todo carregado, vai para o cache
+            complete = ("source" not in self.loaders and len(self.source_origins) <= 1 and not self.source_patched
+                        and source_version is not None)
+
+            def search(cancelled):
+                self.prepare_fuzzy_index(index, source_file, source_version, complete)
+                return None if cancelled() else [record_id for record_id, _ in index.search(keyword, FUZZY_LIMIT)]
+            return search
+
+        if looks_like_query(keyword):
+            # Compilada aqui, na thread da interface, para que um erro apareça antes de iniciar a busca
+            query = compile_query(keyword, fields)
+            store = self.column_store
+            return lambda cancelled: query.ids(store)
+
+        index = self.search_index
+        within = self.refinable_ids(keyword, fields)
+        return lambda cancelled: index.search_ids(keyword, fields, within, cancelled)
+
+    def fuzzy_index(self, fields):
+        from pegasus_search import TrigramIndex
+
+        key = tuple(sorted(fields))
+        if key not in self.fuzzy_indexes:
+            self.fuzzy_indexes[key] = TrigramIndex(self.source_records, key)  # Construído na primeira busca
+        return self.fuzzy_indexes[key]
+
+    def prepare_fuzzy_index(self, index, file_name, version, complete):
+        """ Brings a trigram index up to date, from the parse cache when possible (runs in the search thread). """
+        with index.lock:
+            if index.indexed == 0 and complete:
+                cached = self.parse_cache.load_extra(file_name, index.cache_name())
+                if cached is not None and cached.indexed == len(index.records):
+                    index.restore(cached)
+            # Só um índice da fonte inteira vai para o cache
+            if index.update() and complete:
+                self.parse_cache.store_extra(file_name, version, index.cache_name(), index)
+
+    def refinable_ids(self, keyword, fields):
+        """ Ids of the last search when keyword contains its keyword, so only those need checking. """
+        if self.last_search is None:
+            return None
+        last_keyword, last_fields, record_count, ids = self.last_search
+        if last_fields == fields and record_count == len(self.source_records) and last_keyword in keyword.casefold():
+            return ids
+        return None
+
+    @staticmethod
+    def filtered_game(record, base_dir, launch_command, console):
+        from pegasus_metadata import record_fields
+
+        if 'game' not in record or 'file' not in record:
+            return None
+        # Todos os campos, para usar o launch do próprio jogo quando houver
+        return GameRecord.from_fields(record_fields(record), base_dir, launch_command, console)
+
+    def show_search_results(self, keyword, fields, record_count, ids, games, refinable=True):
+        from pegasus_query import looks_like_query
+
+        # Resultados aproximados (os melhores K), da biblioteca e de consultas não servem de base para refinar uma busca
+        refinable = refinable and not looks_like_query(keyword)
+        self.last_search = (keyword.casefold(), fields, record_count, ids) if refinable else None
+        self.selected_games_label.setText("Filtered games:")
         # Atualiza a lista de jogos filtrados na interface
-        self.selected_games_list.clear()
-
-        for game in new_games:
-            game_name = game["game"]
-            item = QListWidgetItem()
-            item_widget = QWidget()
-            item_layout = QHBoxLayout()
-            item_layout.setContentsMargins(0, 0, 0, 0)
-            item_layout.setSpacing(10)  # Espaçamento entre o texto e o botão
-
-            # Primeiro adiciona o label
-            label = QLabel(game_name)
-            item_layout.addWidget(label)
-
-            # Verificar duplicação
-            if game["file"]:
-                abs_path, file_extension, _ = self.extrair_info_arquivo(game["file"], self.absolute_path)
-                is_duplicate = any(
-                    existing_game[1] == abs_path and existing_game[2] == file_extension
-                    for existing_game in self.existing_games
-                )
+        self.selected_games_model.set_rows(self.addition_rows(games))
+
+    def show_query_error(self, error):
+        self.last_search = None
+        self.selected_games_model.clear()
+        self.selected_games_label.setText(f"Filtered games: {error}")
+
+    @instrumented("duplicate_check", count=lambda self, rows: len(rows))
+    def addition_rows(self, games):
+        """ Builds (name, game, state) rows for GameRecords that can be added from the source. """
+        games = list(games)
+        duplicates = self.duplicate_index.which_are_duplicates(game.key for game in games)
+        staged = bool(self.pending.additions)
+        rows = []
+        for game, is_duplicate in zip(games, duplicates):
+            if is_duplicate:
+                state = DUPLICATE
+            elif staged and self.pending.is_added(PendingChanges.key(game)):
+                state = ADDED
             else:
-                is_duplicate = False
-
-            # Adiciona espaço flexível antes do botão
-            item_layout.addStretch()
-
-            # Adiciona o botão ou espaçador no final
-            if not is_duplicate:
-                button = QPushButton("+")
-                button.setFixedSize(30, 30)
-                button.clicked.connect(lambda _, item=item, game=game: self.toggle_game_addition(item, game))
-                item_layout.addWidget(button)
-            elif is_duplicate:
-                label.setFont(QFont('Arial'))
-                label.setStyleSheet('color: gray')
-                label.setToolTip("Already exists in the custom collection")
-
-            item_widget.setLayout(item_layout)
-            item.setSizeHint(item_widget.sizeHint())
-            self.selected_games_list.addItem(item)
-            self.selected_games_list.setItemWidget(item, item_widget)
-
-    def toggle_game_addition(self, item, game):
-        row = self.selected_games_list.row(item)
-        label = self.selected_games_list.itemWidget(item).findChild(QLabel)
-        button = self.selected_games_list.itemWidget(item).findChild(QPushButton)
-
-        game_name = game["game"]
-        abs_path = os.path.join(self.absolute_path, game["file"].lstrip("./"))
-
-        if (game_name, abs_path, self.source_collection_name) in [(g['game'], g['file'], g['console']) for g in self.games_to_add]:
-            self.games_to_add = [g for g in self.games_to_add if (g['game'], g['file'], g['console']) != (game_name, abs_path, self.source_collection_name)]
-            label.setFont(QFont('Arial', italic=False))
-            label.setStyleSheet('color: #f0f0f0')
-            button.setText("+")
+                state = NORMAL
+            rows.append((game.game, game, state))
+        return rows
+
+    def update_rows_for(self, key):
+        """ Recalcula o estado só das linhas (fonte e filtro) que mostram o arquivo com a chave indicada. """
+        self.update_addition_rows((key,))
+
+    def update_addition_rows(self, keys):
+        """ update_rows_for de muitas chaves, com uma única atualização de cada lista. """
+        for model in (self.source_games_model, self.selected_games_model):
+            states = {}
+            for key in keys:
+                duplicate = self.duplicate_index.contains(key)
+                for row in model.rows_for(key):
+                    if duplicate:
+                        states[row] = DUPLICATE
+                    else:
+                        states[row] = ADDED if self.pending.is_added(PendingChanges.key(model.game(row))) else NORMAL
+            model.set_states(states)
+
+    def update_removal_rows(self, keys):
+        """ Recalcula as linhas da custom collection que mostram as chaves indicadas, de uma vez. """
+        model = self.existing_games_model
+        states = {}
+        for key in keys:
+            for row in model.rows_for(key):
+                states[row] = REMOVED if self.pending.is_removed(PendingChanges.key(model.game(row))) else NORMAL
+        model.set_states(states)
+
+    @instrumented("bulk_edit", count=lambda self, operations: sum(len(games) for _, games in operations))
+    def bulk_edit(self, operations):
+        """ Aplica marcações de muitos jogos como uma única edição, com uma atualização das listas no final.
+
+        Só entram no histórico os jogos cujo estado muda; devolve as operações aplicadas.
+        """
+        from pegasus_history import STAGE_ADDITIONS, STAGE_REMOVALS, UNSTAGE_ADDITIONS, UNSTAGE_REMOVALS
+
+        pending = self.pending
+        applied = []
+        for kind, games in operations:
+            games = {PendingChanges.key(game): game for game in games}
+            if kind == STAGE_ADDITIONS:
+                games = [game for key, game in games.items()
+                         if not pending.is_added(key) and not self.duplicate_index.contains(game.key)]
+            elif kind == UNSTAGE_ADDITIONS:
+                games = [pending.additions[key] for key in games if pending.is_added(key)]
+            elif kind == STAGE_REMOVALS:
+                games = [game for key, game in games.items() if not pending.is_removed(key)]
+            elif kind == UNSTAGE_REMOVALS:
+                games = [pending.removals[key] for key in games if pending.is_removed(key)]
+            if games:
+                applied.append((kind, games))
+        self.apply_operations(applied)
+        self.record_edit(applied)
+        return applied
+
+    def list_games(self, game_list, selected_only=False):
+        """ Jogos das linhas selecionadas de uma lista; de todas, quando nada está selecionado e selected_only é falso. """
+        model = game_list.model()
+        rows = game_list.selected_rows()
+        if not rows and not selected_only:
+            rows = range(model.rowCount())
+        return [model.game(row) for row in rows if model.state(row) != DUPLICATE]
+
+    def add_filtered_games(self):
+        from pegasus_history import STAGE_ADDITIONS
+
+        self.bulk_edit([(STAGE_ADDITIONS, self.list_games(self.selected_games_list))])
+
+    def remove_matching_games(self):
+        """ Desmarca os jogos da busca marcados para adicionar e marca para remoção os da coleção que ela encontrou. """
+        from pegasus_history import STAGE_REMOVALS, UNSTAGE_ADDITIONS
+
+        model = self.selected_games_model
+        rows = self.selected_games_list.selected_rows() or range(model.rowCount())
+        found = [model.game(row) for row in rows]
+        keys = {game.key for game in found}
+        self.bulk_edit([(UNSTAGE_ADDITIONS, found),
+                        (STAGE_REMOVALS, [game for game in self.existing_games if game.key in keys])])
+
+    def show_list_menu(self, game_list, position):
+        from pegasus_history import STAGE_ADDITIONS, STAGE_REMOVALS, UNSTAGE_ADDITIONS, UNSTAGE_REMOVALS
+
+        menu = QMenu(self)
+        if game_list is self.existing_games_list:
+            menu.addAction("Remove Selected", lambda: self.bulk_edit(
+                [(STAGE_REMOVALS, self.list_games(game_list, selected_only=True))]))
+            menu.addAction("Keep Selected", lambda: self.bulk_edit(
+                [(UNSTAGE_REMOVALS, self.list_games(game_list, selected_only=True))]))
         else:
-            game["console"] = self.source_collection_name
-            game["file"] = abs_path
-            if 'launch' not in game:
-                game['launch'] = self.launch_command  # Define um valor padrão para 'launch'
-            self.games_to_add.append(game)
-            label.setFont(QFont('Arial', italic=False))
-            label.setStyleSheet('color: #62c471') # light green
-            button.setText("-")
+            menu.addAction("Add Selected", lambda: self.bulk_edit(
+                [(STAGE_ADDITIONS, self.list_games(game_list, selected_only=True))]))
+            menu.addAction("Unmark Selected", lambda: self.bulk_edit(
+                [(UNSTAGE_ADDITIONS, self.list_games(game_list, selected_only=True))]))
+        menu.addSeparator()
+        menu.addAction("Select All", game_list.selectAll)
+        menu.addAction("Invert Selection", game_list.invert_selection)
+        menu.exec_(game_list.viewport().mapToGlobal(position))
 
-        self.update_source_games_list()
+    def toggle_addition(self, model, row):
+        """ Adiciona ou retira da lista de jogos a adicionar o jogo da linha indicada. """
+        from pegasus_history import STAGE_ADDITIONS, UNSTAGE_ADDITIONS
 
-    def toggle_source_game_addition(self, item, game):
-        row = self.source_games_list.row(item)
-        label = self.source_games_list.itemWidget(item).findChild(QLabel)
-        button = self.source_games_list.itemWidget(item).findChild(QPushButton)
+        game = model.game(row)  # Já traz o launch e o console da fonte
+        staged = self.pending.toggle_addition(PendingChanges.key(game), game)
+        self.record_edit([(STAGE_ADDITIONS if staged else UNSTAGE_ADDITIONS, [game])])
 
-        game_name = game["game"]
-        abs_path = os.path.join(self.absolute_path, game["file"].lstrip("./"))
+        # O mesmo jogo pode estar na lista filtrada e na lista da fonte
+        self.update_rows_for(game.key)
 
-        if (game_name, abs_path, self.source_collection_name) in [(g['game'], g['file'], g['console']) for g in self.games_to_add]:
-            self.games_to_add = [g for g in self.games_to_add if (g['game'], g['file'], g['console']) != (game_name, abs_path, self.source_collection_name)]
-            label.setFont(QFont('Arial', italic=False))
-            label.setStyleSheet('color: #f0f0f0')
-            button.setText("+")
-        else:
-            game["console"] = self.source_collection_name
-            game["file"] = abs_path
-            if 'launch' not in game:
-                game['launch'] = self.launch_command  # Define um valor padrão para 'launch'
-            self.games_to_add.append(game)
-            label.setFont(QFont('Arial', italic=False))
-            label.setStyleSheet('color: #62c471') # light green
-            button.setText("-")
-
-    def add_game_to_list(self, game_name):
-        item = QListWidgetItem()
-        item_widget = QWidget()
-        item_layout = QHBoxLayout()
-        item_layout.setContentsMargins(0, 0, 0, 0)
-
-        label = QLabel(game_name)
-        button = QPushButton("+")
-        button.setFixedSize(30, 30)
-        button.clicked.connect(lambda: self.toggle_game_addition(item, game_name))
-
-        item_layout.addWidget(label)
-        item_layout.addWidget(button)
-        item_widget.setLayout(item_layout)
-
-        item.setSizeHint(item_widget.sizeHint())
-        self.selected_games_list.addItem(item)
-        self.selected_games_list.setItemWidget(item, item_widget)
-
-    def remove_game_from_list(self, item, game_name):
-        row = self.selected_games_list.row(item)
-        self.selected_games_list.takeItem(row)
-        self.games = [game for game in self.games if not game.startswith(f"# {game_name}")]
+    def toggle_game_addition(self, row):
+        self.toggle_addition(self.selected_games_model, row)
+
+    def toggle_source_game_addition(self, row):
+        self.toggle_addition(self.source_games_model, row)
 
     def clear_game_list(self):
+        self.cancel_search()
         self.games = []
-        self.selected_games_list.clear()
+        self.selected_games_model.clear()
 
+    @instrumented("update_source_games_list", count=lambda self, _: self.source_games_model.rowCount())
     def update_source_games_list(self):
-        self.source_games_list.clear()
-        for game_name, file_path in sorted(self.source_games):
-            item = QListWidgetItem()
-            item_widget = QWidget()
-            item_layout = QHBoxLayout()
-            item_layout.setContentsMargins(0, 0, 0, 0)
-            item_layout.setSpacing(10)  # Espaçamento entre o botão e o texto
-
-            abs_path, file_extension, _ = self.extrair_info_arquivo(file_path, self.absolute_path)
-            is_duplicate = any(
-                existing_game[1] == abs_path and existing_game[2] == file_extension
-                for existing_game in self.existing_games
-            )
+        self.source_games_model.set_rows(self.addition_rows(sorted(self.source_games, key=GameRecord.sort_key)))
 
-            # Primeiro adiciona o botão ou espaçador
-            if not is_duplicate:
-                button = QPushButton("+")
-                button.setFixedSize(30, 30)
-                button.clicked.connect(lambda _, item=item, game={"game": game_name, "file": file_path}:
-                                    self.toggle_source_game_addition(item, game))
-                item_layout.addWidget(button)
-            else:
-                # Adiciona um espaçador do tamanho do botão para manter o alinhamento
-                spacer = QWidget()
-                spacer.setFixedSize(20, 20)
-                item_layout.addWidget(spacer)
+    def toggle_game_removal(self, row):
+        from pegasus_history import STAGE_REMOVALS, UNSTAGE_REMOVALS
 
-            # Depois adiciona o label
-            label = QLabel(game_name)
-            if is_duplicate:
-                label.setFont(QFont('Arial'))
-                label.setStyleSheet('color: gray')
-                label.setToolTip("Already exists in the custom collection")
-            item_layout.addWidget(label)
-
-            # Adiciona espaço flexível no final
-            item_layout.addStretch()
-
-            item_widget.setLayout(item_layout)
-            item.setSizeHint(item_widget.sizeHint())
-            self.source_games_list.addItem(item)
-            self.source_games_list.setItemWidget(item, item_widget)
-
-    def toggle_game_removal(self, item, game_name):
-        row = self.existing_games_list.row(item)
-        label = self.existing_games_list.itemWidget(item).findChild(QLabel)
-        button = self.existing_games_list.itemWidget(item).findChild(QPushButton)
-
-        if game_name in self.games_to_remove:
-            self.games_to_remove.remove(game_name)
-            font = label.font()
-            font.setStrikeOut(False)
-            label.setFont(font)
-            label.setStyleSheet('color: #f0f0f0')
-            button.setText("x")
+        game = self.existing_games_model.game(row)
+
+        if self.pending.toggle_removal(PendingChanges.key(game), game):
+            self.existing_games_model.set_state(row, REMOVED)
+            self.record_edit([(STAGE_REMOVALS, [game])])
         else:
-            self.games_to_remove.add(game_name)
-            font = label.font()
-            font.setStrikeOut(True)
-            label.setFont(font)
-            label.setStyleSheet('color: gray')
-            button.setText("+")
+            self.existing_games_model.set_state(row, NORMAL)
+            self.record_edit([(UNSTAGE_REMOVALS, [game])])
 
+    @pyqtSlot()
+    @instrumented("save_collection", count=lambda self, _: len(self.existing_games))
     def save_collection(self):
         if not self.collection_file:
             return
 
-        # Criar cabeçalho atualizado
         collection_name = self.collection_name_input.text().strip()
         shortname = self.shortname_input.text().strip()
-
-        updated_header = f"collection: {collection_name}\nshortname: {shortname}\n"
-        updated_header += "command: none\nextensions: none\nlaunch: none\n\n"
-
-        # Atualizar a lista de jogos existentes com base nos jogos a serem removidos
-        self.existing_games = {
-            (game_name, file_path, ext, game_launch)
-            for game_name, file_path, ext, game_launch in self.existing_games
-            if game_name not in self.games_to_remove
-        }
-
-        # Combinar jogos existentes com novos jogos a serem adicionados
-        all_games = sorted(
-            self.existing_games.union(
-                {(game['game'], game['file'], game.get('ext', ''), game['launch']) for game in self.games_to_add}
-            ),
-            key=lambda x: x[0].lower()  # Ordenação case insensitive pelo nome do jogo
-        )
-
-        # Escrever no arquivo
-        with open(self.collection_file, 'w', encoding='utf-8') as file:
-            file.write(updated_header)
-            for game_name, file_path, ext, game_launch in all_games:
-                file.write(f"# {game_name}\nfile: {file_path}\nlaunch: {game_launch}\n\n")
+        staged_keys = {game.key for game in self.pending.additions.values()}
+        removal_keys = {(game.game, normalize_path(game.abs_path)) for game in self.pending.removals.values()}
+
+        # Grava em um arquivo temporário, copiando os registros inalterados, e o renomeia por cima do original;
+        # num arquivo com várias coleções, as outras são copiadas sem serem lidas
+        try:
+            self.refresh_sections()
+            result = save_collection_file(
+                self.collection_file, collection_name, shortname, self.pending.additions.values(), removal_keys,
+                lambda file_path: self.extrair_info_arquivo(file_path, self.absolute_path)[0], self.section_range()
+            )
+        except (OSError, UnicodeDecodeError) as error:
+            QMessageBox.critical(self, "Error", f"Could not save the custom collection:\n{error}")
+            return
 
         QMessageBox.information(self, "Saved", "Custom Collection saved successfully!")
 
-        # Recarregar o arquivo salvo para atualizar a interface
-        self.load_existing_games(self.collection_file)
-        self.update_existing_games_list()
-        self.games_to_add = []  # Limpar a lista de jogos a serem adicionados após salvar
-        self.filter_games()
-        self.update_source_games_list()  # Atualizar a lista de jogos da coleção fonte
+        # Atualiza o estado em memória com as mudanças aplicadas, sem reler o arquivo
+        removed_games = set()
+        for record in result.removed:
+            game = self.existing_game(record)
+            if game in self.existing_games:
+                self.existing_games.discard(game)
+                self.duplicate_index.remove(game.key)
+                removed_games.add(game)
+        # Na coleção, os jogos adicionados não têm mais console
+        inserted_games = self.add_existing_games(GameRecord(game.game, game.abs_path, game.launch) for game in result.added)
+        self.pending.clear()  # Limpar os jogos a adicionar e remover após salvar
+        # Salvar é uma barreira: o histórico recomeça, e desfazer não marca de novo o que já está no arquivo
+        if self.command_log is not None:
+            self.command_log.mark_saved()
+        self.update_history_buttons()
+        self.refresh_sections()
+        self.saved_names = {field: name_input.text() for field, name_input in self.name_inputs.items()}
+
+        # Atualiza apenas as linhas cujo estado mudou
+        model = self.existing_games_model
+        model.remove_rows(
+            row for game in removed_games
+            for row in model.rows_for(game.key) if model.game(row) == game
+        )
+        model.insert_sorted(self.existing_rows(inserted_games), sort_key=GameRecord.sort_key)
+        self.update_addition_rows(staged_keys | {game.key for game in removed_games | set(inserted_games)})
+        if self.collection_file in self.watched_files:
+            # Novo retrato do arquivo salvo, para que a própria gravação não conte como mudança
+            self.start_snapshot(self.collection_file)
 
 if __name__ == '__main__':
     import sys
     app = QApplication(sys.argv)
     window = PegasusCustomCollectionEditor()
     window.show()
+    QTimer.singleShot(0, window.restore_session)  # Com a janela já na tela
     sys.exit(app.exec_())
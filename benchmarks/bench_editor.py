@@ -0,0 +1,285 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Times the editor's main operations on synthetic sources of increasing size.
+
+Runs headless (Qt offscreen platform) and writes the timings as JSON, so runs
+from different versions can be compared:
+
+    python benchmarks/bench_editor.py --sizes 1000 10000 100000 --output before.json
+    python benchmarks/bench_editor.py --sizes 1000 10000 100000 --output after.json --compare before.json
+
+Memory is measured with tracemalloc after loading each size, in bytes per game:
+the parse records of the source (LazyRecords, which keep only game and file),
+the editor's own source state (its GameRecords, search index and list rows) and
+the games of the collection with their list rows. Startup is timed in a fresh interpreter per run, restoring a session that
+reopens the generated source and collection: first with an empty parse cache,
+then from the cache.
+"""
+
+import argparse
+import datetime
+import glob
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_metadata import write_collection, write_source  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+TOGGLES = 100
+
+
+def load_editor_module():
+    """ Imports the editor script (its file name has spaces and a version number). """
+    script = sorted(glob.glob(os.path.join(ROOT, "Pegasus Collection Editor*.py")))[-1]
+    spec = importlib.util.spec_from_file_location("pegasus_collection_editor", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module, os.path.basename(script)
+
+
+class Timer:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, size, operation, function, repeat=None, count=None):
+        """ Best wall time of function() over repeat runs; returns the last result. """
+        best = None
+        value = None
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            value = function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        entry = {"size": size, "operation": operation, "seconds": round(best, 6)}
+        if count is not None:
+            entry["count"] = count
+        self.results.append(entry)
+        print(f"{size:>8} {operation:<32} {best * 1000:10.1f} ms", flush=True)
+        return value
+
+    def record_memory(self, size, operation, byte_count, games):
+        per_game = byte_count / games if games else 0
+        self.results.append({"size": size, "operation": operation, "bytes_per_game": round(per_game, 1)})
+        print(f"{size:>8} {operation:<32} {per_game:10.1f} B/game", flush=True)
+
+    def record(self, size, operation, seconds):
+        self.results.append({"size": size, "operation": operation, "seconds": round(seconds, 6)})
+        print(f"{size:>8} {operation:<32} {seconds * 1000:10.1f} ms", flush=True)
+
+
+def startup_probe():
+    """ Run in a subprocess: prints the seconds from the start of the interpreter's work to a restored session. """
+    started = time.perf_counter()
+    from PyQt5.QtCore import QEventLoop
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication(sys.argv)
+    module, _ = load_editor_module()
+    window = module.PegasusCustomCollectionEditor()
+    window.show()
+    loop = QEventLoop()
+    window.startup_finished.connect(lambda seconds: loop.quit())
+    window.restore_session()
+    if window.startup_seconds is None:
+        loop.exec_()
+    print(time.perf_counter() - started)
+    window.session_path = None  # The session under test stays as it is
+    window.close()
+    app.processEvents()
+
+
+def bench_memory(module, size, source_file, collection_file, timer):
+    import tracemalloc
+
+    from pegasus_metadata import map_metadata
+
+    window = module.PegasusCustomCollectionEditor()
+    window.source_file = source_file
+    window.absolute_path = os.path.dirname(source_file)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        document = map_metadata(source_file)
+        parsed = tracemalloc.get_traced_memory()[0]
+        window.load_launch_command(document)
+        window.load_source_collection_name(document)
+        window.load_source_games(document)
+        window.update_source_games_list()
+        loaded = tracemalloc.get_traced_memory()[0]
+        window.load_existing_games(collection_file)
+        window.update_existing_games_list()
+        collection = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    timer.record_memory(size, "memory: source records", parsed - start, len(document.games))
+    timer.record_memory(size, "memory: source games", loaded - parsed, len(window.source_games))
+    timer.record_memory(size, "memory: collection games", collection - loaded, len(window.existing_games))
+    window.close()
+    window.deleteLater()
+
+
+def bench_startup(size, source_file, collection_file, work_dir, timer):
+    from pegasus_session import SESSION_ENV, save_session
+
+    session_file = os.path.join(work_dir, f"session-{size}.json")
+    save_session({"source_files": [source_file], "collection_file": collection_file,
+                  "fields": ["game"], "keyword": "fighter"}, session_file)
+    environment = dict(os.environ, **{SESSION_ENV: session_file,
+                                      "PEGASUS_EDITOR_CACHE_DIR": os.path.join(work_dir, f"startup-cache-{size}")})
+
+    def run_probe():
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--startup-probe"], env=environment,
+                                capture_output=True, text=True, check=True).stdout
+        return float(output.split()[-1])
+
+    timer.record(size, "startup (first)", run_probe())
+    timer.record(size, "startup (cached)", min(run_probe() for _ in range(timer.repeat)))
+
+
+def bench_size(module, size, work_dir, timer):
+    from pegasus_metadata import parse_metadata
+
+    source_dir = os.path.join(work_dir, f"source-{size}")
+    source_file = os.path.join(source_dir, "metadata.pegasus.txt")
+    games = write_source(source_file, size)
+    collection_template = os.path.join(work_dir, f"collection-{size}.txt")
+    write_collection(collection_template, source_file, games)
+    collection_file = os.path.join(work_dir, f"collection-{size}-saved.txt")
+    shutil.copy(collection_template, collection_file)
+
+    window = module.PegasusCustomCollectionEditor()
+    window.parse_cache.clear()
+    window.source_file = source_file
+    window.absolute_path = source_dir
+    window.collection_file = collection_file
+
+    version = window.parse_cache.version(source_file)
+    document = timer.run(size, "parse_metadata", lambda: parse_metadata(source_file))
+    timer.run(size, "parse_cache_store", lambda: window.parse_cache.store(source_file, version, document), repeat=1)
+    timer.run(size, "parse_cache_load", lambda: window.parse_cache.load(source_file))
+
+    def load_source():
+        window.load_launch_command(document)
+        window.load_source_collection_name(document)
+        window.load_source_games(document)
+    timer.run(size, "load_source_games", load_source, repeat=1)
+
+    window.parse_cache.clear()
+    timer.run(size, "load_existing_games (cold)", lambda: window.load_existing_games(collection_file), repeat=1)
+    timer.run(size, "load_existing_games (cached)", lambda: window.load_existing_games(collection_file))
+
+    timer.run(size, "update_existing_games_list", window.update_existing_games_list)
+    timer.run(size, "update_source_games_list", window.update_source_games_list)
+
+    for field in ("game", "description"):
+        window.field_checkboxes[field].setChecked(True)
+    for label, keyword in (("broad", "fighter"), ("selective", f"#{size // 2}"),
+                           ("query", "genre:shooter AND players:2 AND release>=1995 NOT publisher:capcom")):
+        window.keyword_input.setText(keyword)
+        timer.run(size, f"filter_games ({label})", window.filter_games)
+        timer.results[-1]["count"] = window.selected_games_model.rowCount()
+
+    window.fuzzy_checkbox.setChecked(True)
+    window.keyword_input.setText("stret figter 2")
+    timer.run(size, "filter_games (fuzzy, first)", window.filter_games, repeat=1)
+    timer.run(size, "filter_games (fuzzy)", window.filter_games)
+    window.fuzzy_checkbox.setChecked(False)
+
+    model = window.source_games_model
+    rows = [row for row in range(model.rowCount()) if model.state(row) == module.NORMAL][:TOGGLES]
+
+    def toggle_rows():
+        for row in rows:
+            window.toggle_source_game_addition(row)
+    timer.run(size, f"toggle_source_game_addition x{len(rows)}", toggle_rows, repeat=1, count=len(rows))
+
+    timer.run(size, "save_collection", window.save_collection, repeat=1)
+
+    window.close()
+    window.deleteLater()
+
+    bench_memory(module, size, source_file, collection_template, timer)
+    bench_startup(size, source_file, collection_template, work_dir, timer)
+
+
+def compare(results, previous_file):
+    with open(previous_file, 'r', encoding='utf-8') as file:
+        previous = {(entry["size"], entry["operation"]): entry for entry in json.load(file)["results"]}
+    print(f"\nCompared with {previous_file} (new / old):")
+    for entry in results:
+        old = previous.get((entry["size"], entry["operation"]), {})
+        for measure in ("seconds", "bytes_per_game"):
+            if old.get(measure) and measure in entry:
+                print(f"{entry['size']:>8} {entry['operation']:<32} {entry[measure] / old[measure]:8.2f}x")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Pegasus Collection Editor.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="games per source (e.g. 500000)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operation (best time is kept)")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file for the results")
+    parser.add_argument("--compare", help="previous results file to compare with")
+    parser.add_argument("--keep", action="store_true", help="keep the generated files")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.startup_probe:
+        startup_probe()
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="pegasus-bench-")
+    os.environ["PEGASUS_EDITOR_CACHE_DIR"] = os.path.join(work_dir, "cache")
+
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    app = QApplication.instance() or QApplication(sys.argv)
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)  # No modal dialogs headless
+    module, script = load_editor_module()
+
+    timer = Timer(args.repeat)
+    try:
+        for size in args.sizes:
+            bench_size(module, size, work_dir, timer)
+            app.processEvents()
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "editor": script,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": timer.results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(timer.results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
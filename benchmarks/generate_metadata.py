@@ -0,0 +1,99 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Generates realistic synthetic metadata.pegasus.txt files for benchmarking.
+
+    python benchmarks/generate_metadata.py 100000 out/metadata.pegasus.txt
+"""
+
+import argparse
+import os
+import random
+
+_TITLE_WORDS = [
+    "Street", "Fighter", "Super", "Mario", "Metal", "Slug", "King", "of", "Fighters", "Dragon", "Quest",
+    "Final", "Fantasy", "Puyo", "Donkey", "Kong", "Sonic", "Bomberman", "Castlevania", "Gradius", "R-Type",
+    "Pokémon", "Ōkami", "Straße", "Évolution", "Ninja", "Gaiden", "Turbo", "Championship", "Edition",
+    "ストリートファイター", "魔界村", "Jäger", "Aventura", "Légende", "Космос",
+]
+_SUFFIXES = ["", "", "", " II", " III", " '98", " Plus", " Deluxe", " (Japan)", " (USA)", " (Europe)", " Turbo"]
+_GENRES = ["Shooter", "Fighting", "Platform", "Puzzle", "Racing", "Sports", "Beat'em Up", "Role Playing Game", "Maze"]
+_COMPANIES = ["Capcom", "SNK", "Konami", "Namco", "Sega", "Nintendo", "Taito", "Irem", "Data East", "Hudson Soft",
+              "Toaplan", "Cave", "Atlus", "Technōs Japan"]
+_EXTENSIONS = [".zip", ".7z", ".chd", ".sfc", ".md", ".iso"]
+_SENTENCE_WORDS = ("the player must fight through waves of enemies across many stages with power ups bosses "
+                   "secret areas and a two player cooperative mode that made it famous in arcades worldwide").split()
+
+
+def _sentence(rng):
+    words = rng.choices(_SENTENCE_WORDS, k=rng.randint(8, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def game_entry(number, rng):
+    """ (title, file, text) of one game entry, with a multi-line description, assets.* and x-* keys. """
+    title = " ".join(rng.choices(_TITLE_WORDS, k=rng.randint(1, 4))) + rng.choice(_SUFFIXES) + f" #{number}"
+    stem = f"game{number:06d}"
+    file_path = f"./roms/{stem}{rng.choice(_EXTENSIONS)}"
+    lines = [
+        f"game: {title}",
+        f"file: {file_path}",
+        f"developer: {rng.choice(_COMPANIES)}",
+        f"publisher: {rng.choice(_COMPANIES)}",
+        f"genre: {rng.choice(_GENRES)}",
+        f"release: {rng.randint(1978, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        f"players: {rng.randint(1, 4)}",
+        f"rating: {rng.randint(0, 100)}%",
+        "description: " + _sentence(rng),
+    ]
+    for paragraph in range(rng.randint(0, 3)):
+        lines.append("  " + _sentence(rng))
+        if paragraph and rng.random() < 0.3:
+            lines.append("  .")
+    lines += [
+        f"assets.boxFront: ./media/box/{stem}.png",
+        f"assets.screenshot: ./media/screenshots/{stem}.png",
+        f"x-scraper-id: {rng.randint(1, 10 ** 6)}",
+        f"x-crc32: {rng.getrandbits(32):08x}",
+    ]
+    return title, file_path, "\n".join(lines) + "\n\n"
+
+
+def write_source(file_name, count, seed=0, collection="Synthetic Arcade"):
+    """ Writes a source metadata file with count games; returns their (title, file) pairs. """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write(f"collection: {collection}\nshortname: synth\nextensions: zip, 7z, chd\n"
+                   "launch: mame -rompath \"{file.dir}\"\n  {file.basename}\n\n")
+        games = []
+        for number in range(count):
+            title, file_path, text = game_entry(number, rng)
+            file.write(text)
+            games.append((title, file_path))
+    return games
+
+
+def write_collection(file_name, source_file, games, fraction=0.1, seed=1, launch="mame"):
+    """ Writes a custom collection holding a random fraction of the (title, file) games of source_file. """
+    rng = random.Random(seed)
+    base_dir = os.path.dirname(os.path.abspath(source_file))
+    with open(file_name, 'w', encoding='utf-8') as file:
+        file.write("collection: Favourites\nshortname: fav\ncommand: none\nextensions: none\nlaunch: none\n\n")
+        for title, file_path in games:
+            if rng.random() < fraction:
+                path = os.path.join(base_dir, file_path.lstrip("./"))
+                file.write(f"# {title}\nfile: {path}\nlaunch: {launch}\n\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic metadata.pegasus.txt")
+    parser.add_argument("count", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_source(args.output, args.count, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" On-disk cache of parsed metadata files, keyed by path, size and modification time. """
+
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+
+CACHE_DIR_ENV = "PEGASUS_EDITOR_CACHE_DIR"
+CACHE_SIZE_ENV = "PEGASUS_EDITOR_CACHE_MB"
+DEFAULT_CACHE_MB = 256
+
+_MAGIC = b"PCEC3\n"  # Bumped whenever the stored layout changes
+_SUFFIX = ".cache"
+
+
+def default_cache_dir():
+    if os.environ.get(CACHE_DIR_ENV):
+        return os.environ[CACHE_DIR_ENV]
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pegasus-collection-editor")
+
+
+def file_fingerprint(file_name):
+    """ (absolute path, size, mtime in ns) of a file. """
+    stat = os.stat(file_name)
+    return os.path.abspath(file_name), stat.st_size, stat.st_mtime_ns
+
+
+def content_hash(file_name):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_name, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """ Stores parsed MetadataDocuments as compressed pickles, evicting the least recently used above max_bytes.
+
+    With verify_content=True a cached entry is only used when the file's content
+    hash still matches, which also catches edits that keep the size and mtime.
+    Lazy documents (map_metadata) are cached apart from fully parsed ones; their
+    entries hold only game, file and byte offsets, and map the file again on load.
+    store_extra/load_extra keep other data derived from a file under the same rules.
+    Writers pass the version() of the file taken before they read it, so what
+    was parsed from a file that changed meanwhile is never cached.
+    """
+
+    def __init__(self, directory=None, max_bytes=None, verify_content=False):
+        self.directory = directory or default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.verify_content = verify_content
+
+    def entry_path(self, file_name, variant=""):
+        """ Path of the cache entry of file_name; variant tells apart what is stored for the same file. """
+        path = os.path.normcase(os.path.abspath(file_name)) + ("\0" + variant if variant else "")
+        key = hashlib.sha1(path.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def version(self, file_name):
+        """ What identifies the current content of file_name for the cache; None if it cannot be read. """
+        try:
+            return file_fingerprint(file_name), content_hash(file_name) if self.verify_content else None
+        except OSError:
+            return None
+
+    def load(self, file_name, lazy=False):
+        """ Returns the cached MetadataDocument for file_name, or None if missing or stale. """
+        stored = self._read(file_name, "lazy" if lazy else "")
+        if stored is None:
+            return None
+        from pegasus_metadata import MetadataDocument  # Imported on first use, so default_cache_dir stays cheap to import
+
+        return MetadataDocument(stored["header"], stored["games"])
+
+    def store(self, file_name, version, document, lazy=False):
+        """ Writes document, parsed from the given version of file_name, to the cache.
+
+        Failures are ignored, the cache is only an optimization.
+        """
+        self._write(file_name, version, "lazy" if lazy else "", {"header": document.header, "games": document.games})
+
+    def load_extra(self, file_name, name):
+        """ Returns what store_extra saved under name for the current version of file_name, or None. """
+        stored = self._read(file_name, "extra:" + name)
+        return None if stored is None else stored["value"]
+
+    def store_extra(self, file_name, version, name, value):
+        """ Caches a picklable value derived from a version of file_name (e.g. a search index) until the file changes. """
+        self._write(file_name, version, "extra:" + name, {"value": value})
+
+    def _read(self, file_name, variant):
+        entry_path = self.entry_path(file_name, variant)
+        try:
+            fingerprint = file_fingerprint(file_name)
+            with open(entry_path, 'rb') as entry:
+                if entry.read(len(_MAGIC)) != _MAGIC:
+                    return None
+                stored = pickle.loads(zlib.decompress(entry.read()))
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+            return None
+
+        if stored.get("fingerprint") != fingerprint:
+            return None
+        if self.verify_content and stored.get("content_hash") != content_hash(file_name):
+            return None
+
+        try:
+            os.utime(entry_path)  # Marks the entry as recently used
+        except OSError:
+            pass
+        return stored
+
+    def _write(self, file_name, version, variant, stored):
+        # The file changed while it was read: what was parsed matches neither version
+        if version is None or self.version(file_name) != version:
+            return
+        stored["fingerprint"], stored["content_hash"] = version
+        temp_path = None
+        try:
+            payload = zlib.compress(pickle.dumps(stored, protocol=pickle.HIGHEST_PROTOCOL), 1)
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(descriptor, 'wb') as entry:
+                entry.write(_MAGIC)
+                entry.write(payload)
+            os.replace(temp_path, self.entry_path(file_name, variant))
+            temp_path = None
+        except (OSError, pickle.PickleError, zlib.error, TypeError, AttributeError):
+            return  # Unpicklable objects raise TypeError or AttributeError, not only PickleError
+        finally:
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+        self.evict()
+
+    def parse(self, file_name, lazy=False):
+        """ Cached equivalent of parse_metadata, or of map_metadata when lazy. """
+        document = self.load(file_name, lazy)
+        if document is None:
+            from pegasus_metadata import map_metadata, parse_metadata
+
+            version = self.version(file_name)
+            document = map_metadata(file_name) if lazy else parse_metadata(file_name)
+            self.store(file_name, version, document, lazy)
+        return document
+
+    def evict(self):
+        """ Deletes least recently used entries until the cache fits in max_bytes. """
+        try:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(_SUFFIX):
+                    path = os.path.join(self.directory, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if name.endswith(_SUFFIX):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,216 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Optional library catalog: every source metadata file under the library folders, in one SQLite database.
+
+Games are stored with the launch command, collection name and folder of their
+source, and indexed in an FTS5 table, so a keyword search covers all systems
+at once. update() only re-reads the files whose size or modification time
+changed since the last run.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from pegasus_cache import default_cache_dir
+from pegasus_collection import GameRecord
+from pegasus_metadata import parse_metadata
+from pegasus_search import SEARCH_FIELDS, tokenize
+
+CATALOG_ENV = "PEGASUS_EDITOR_CATALOG"
+METADATA_NAMES = ("metadata.pegasus.txt", "metadata.txt")
+SEARCH_LIMIT = 5000
+SCHEMA_VERSION = 1
+
+_COLUMNS = ", ".join(SEARCH_FIELDS)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    base_dir TEXT,
+    collection TEXT,
+    launch TEXT
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    launch TEXT,
+    {", ".join(f"{field} TEXT" for field in SEARCH_FIELDS)}
+);
+CREATE INDEX IF NOT EXISTS games_source ON games(source_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS games_fts USING fts5(
+    {_COLUMNS}, content='games', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+"""
+
+
+class CatalogError(Exception):
+    """ The catalog database cannot be used (e.g. SQLite was built without FTS5). """
+
+
+def default_catalog_path():
+    return os.environ.get(CATALOG_ENV) or os.path.join(default_cache_dir(), "catalog.sqlite3")
+
+
+def find_metadata_files(root):
+    """ Paths of the source metadata files under root, in a stable order. """
+    found = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        names = [name for name in METADATA_NAMES if name in files]
+        if names:
+            found.append(os.path.join(directory, names[0]))  # Pegasus reads one file per folder
+    return found
+
+
+class Catalog:
+    """ The catalog database at path, opened with a short-lived connection per operation.
+
+    Connections are not shared, so searches may run in worker threads while an
+    update is writing (the database uses write-ahead logging).
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_catalog_path()
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def connect(self):
+        """ A new connection, creating the schema on first use. """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")  # Enough with WAL: the catalog can always be rebuilt
+        try:
+            with self._lock:
+                if not self._ready:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    version = connection.execute("PRAGMA user_version").fetchone()[0]
+                    if version not in (0, SCHEMA_VERSION):
+                        raise CatalogError(f"{self.path} was made by another version of the editor")
+                    connection.executescript(_SCHEMA)
+                    connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                    self._ready = True
+        except sqlite3.OperationalError as error:
+            connection.close()
+            raise CatalogError(f"Cannot use {self.path}: {error}") from error
+        except CatalogError:
+            connection.close()
+            raise
+        return connection
+
+    def roots(self):
+        """ The library folders of the last update. """
+        connection = self.connect()
+        try:
+            row = connection.execute("SELECT value FROM settings WHERE key = 'roots'").fetchone()
+        finally:
+            connection.close()
+        return json.loads(row[0]) if row else []
+
+    def update(self, roots, progress=None, cancelled=None):
+        """ Makes the catalog hold exactly the metadata files under roots; returns a summary dict, or None if cancelled.
+
+        Files whose size and modification time are unchanged are skipped.
+        progress(done, total) is called after every file; each file is
+        committed on its own, so a cancelled update keeps the work done.
+        """
+        files = sorted({os.path.abspath(path) for root in roots for path in find_metadata_files(root)})
+        summary = {"files": len(files), "added": 0, "updated": 0, "removed": 0, "games": 0, "failed": []}
+        connection = self.connect()
+        try:
+            known = {path: (source_id, size, mtime_ns) for source_id, path, size, mtime_ns
+                     in connection.execute("SELECT id, path, size, mtime_ns FROM sources")}
+            with connection:
+                for path in set(known) - set(files):
+                    self._remove_source(connection, known[path][0])
+                    summary["removed"] += 1
+                connection.execute("INSERT OR REPLACE INTO settings VALUES ('roots', ?)",
+                                   (json.dumps([os.path.abspath(root) for root in roots]),))
+
+            for number, path in enumerate(files, 1):
+                if cancelled is not None and cancelled():
+                    return None
+                try:
+                    stat = os.stat(path)
+                    previous = known.get(path)
+                    if previous is None or previous[1:] != (stat.st_size, stat.st_mtime_ns):
+                        summary["games"] += self._ingest(connection, path, stat, previous and previous[0])
+                        summary["updated" if previous else "added"] += 1
+                except (OSError, UnicodeDecodeError) as error:
+                    summary["failed"].append(f"{path}: {error}")
+                if progress is not None:
+                    progress(number, len(files))
+        finally:
+            connection.close()
+        return summary
+
+    def _ingest(self, connection, path, stat, source_id):
+        document = parse_metadata(path)
+        with connection:
+            if source_id is not None:
+                self._remove_source(connection, source_id)
+            cursor = connection.execute(
+                "INSERT INTO sources (path, size, mtime_ns, base_dir, collection, launch) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, os.path.dirname(path),
+                 document.collection_name(), document.launch_command()))
+            source_id = cursor.lastrowid
+            rows = [(source_id, record.get('launch'), *(record.get(field) for field in SEARCH_FIELDS))
+                    for record in document.games if record.get('game') and record.get('file')]
+            connection.executemany(
+                f"INSERT INTO games (source_id, launch, {_COLUMNS}) VALUES (?, ?, {', '.join('?' * len(SEARCH_FIELDS))})",
+                rows)
+            # The full-text index is fed a whole file at once, several times faster than a trigger per game
+            connection.execute(f"INSERT INTO games_fts (rowid, {_COLUMNS}) SELECT id, {_COLUMNS} FROM games "
+                               "WHERE source_id = ?", (source_id,))
+        return len(rows)
+
+    @staticmethod
+    def _remove_source(connection, source_id):
+        connection.execute(f"INSERT INTO games_fts (games_fts, rowid, {_COLUMNS}) SELECT 'delete', id, {_COLUMNS} "
+                           "FROM games WHERE source_id = ?", (source_id,))
+        connection.execute("DELETE FROM games WHERE source_id = ?", (source_id,))
+        connection.execute("DELETE FROM sources WHERE id = ?", (source_id,))
+
+    def search(self, keyword, fields=SEARCH_FIELDS, limit=SEARCH_LIMIT):
+        """ GameRecords of the first games by name, up to limit, with words starting with every word of keyword in fields.
+
+        Each record has the launch command and console of its own source.
+        """
+        tokens = tokenize(keyword)
+        fields = [field for field in fields if field in SEARCH_FIELDS]
+        if not tokens or not fields:
+            return []
+        terms = " AND ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        query = f"{{{' '.join(fields)}}} : ({terms})"
+        connection = self.connect()
+        try:
+            rows = connection.execute(
+                "SELECT games.game, games.file, games.launch, sources.base_dir, sources.launch, sources.collection "
+                "FROM games_fts JOIN games ON games.id = games_fts.rowid JOIN sources ON sources.id = games.source_id "
+                "WHERE games_fts MATCH ? ORDER BY games.game LIMIT ?", (query, limit)).fetchall()
+        finally:
+            connection.close()
+        games = []
+        for game, file_path, launch, base_dir, source_launch, collection in rows:
+            record = {"game": game, "file": file_path}
+            if launch is not None:
+                record["launch"] = launch
+            games.append(GameRecord.from_fields(record, base_dir, source_launch, collection))
+        games.sort(key=GameRecord.sort_key)
+        return games
+
+    def __len__(self):
+        connection = self.connect()
+        try:
+            return connection.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+        finally:
+            connection.close()
@@ -0,0 +1,177 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Command-line builder for custom collections, without the PyQt5 interface.
+
+Examples:
+
+    python pegasus_cli.py -s arcade/metadata.pegasus.txt -q genre:shooter -q players:2 -o shmups/metadata.pegasus.txt
+    python pegasus_cli.py -s arcade/metadata.pegasus.txt -w "genre:shooter release>=1995 NOT publisher:capcom" -o ...
+    python pegasus_cli.py --jobs nightly.json --workers 8
+
+A jobs file is a JSON list of objects with the same options:
+{"sources": [...], "queries": ["genre:shooter"], "where": "...", "output": "...", "name": "...", "shortname": "..."}
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from pegasus_cache import ParseCache
+from pegasus_collection import DuplicateIndex, GameRecord, PendingChanges, resolve_game_path, save_collection_file
+from pegasus_metadata import parse_metadata
+from pegasus_query import ColumnStore, QueryError, compile_query, is_known_field
+from pegasus_search import SearchIndex
+
+
+def parse_query(text):
+    """ "field[,field...]:keyword" -> (fields, keyword). Without fields, the game name is searched.
+
+    The text before the first colon is a field list only when it names known
+    fields, so "Zelda: Link's Awakening" searches game names for the whole text.
+    """
+    fields, separator, keyword = text.partition(":")
+    if not separator:
+        return ["game"], text
+    fields = [field.strip().lower() for field in fields.split(",") if field.strip()]
+    if not all(is_known_field(field) for field in fields):
+        return ["game"], text.strip()
+    return fields or ["game"], keyword.strip()
+
+
+def select_records(document, queries, where=None):
+    """ Records of document matching every (fields, keyword) query and the compiled query where. """
+    if not queries and where is None:
+        return document.games
+    selected = None
+    if queries:
+        index = SearchIndex(document.games, fields=sorted({field for fields, _ in queries for field in fields}))
+        for fields, keyword in queries:
+            ids = set(index.search_ids(keyword, fields))
+            selected = ids if selected is None else selected & ids
+    if where is not None:
+        ids = set(where.ids(ColumnStore(document.games)))
+        selected = ids if selected is None else selected & ids
+    return [document.games[record_id] for record_id in sorted(selected)]
+
+
+def run_job(job):
+    """ Creates/updates one collection: load, filter, dedupe and save. Returns a summary dict. """
+    output = job["output"]
+    queries = [parse_query(query) if isinstance(query, str) else tuple(query) for query in job.get("queries", [])]
+    where = compile_query(job["where"]) if job.get("where") else None
+    cache = ParseCache() if job.get("cache", True) else None
+    parse = cache.parse if cache else parse_metadata
+    output_dir = os.path.dirname(os.path.abspath(output))
+
+    # Games already in the output collection are never added twice
+    duplicates = DuplicateIndex()
+    header = {}
+    if os.path.exists(output):
+        collection = parse(output)
+        header = collection.header
+        for record in collection.games:
+            if record.get('file'):
+                duplicates.add(DuplicateIndex.key(resolve_game_path(record['file'], output_dir)[0]))
+
+    pending = PendingChanges()
+    matched = skipped = 0
+    for source_file in job["sources"]:
+        source = parse(source_file)
+        base_dir = os.path.dirname(os.path.abspath(source_file))
+        console = source.collection_name()
+        launch = source.launch_command()
+        for record in select_records(source, queries, where):
+            if not record.get('game') or not record.get('file'):
+                continue
+            matched += 1
+            game = GameRecord.from_fields(record, base_dir, launch, console)
+            if duplicates.contains(game.key):
+                skipped += 1
+                continue
+            duplicates.add(game.key)
+            pending.stage_additions([(PendingChanges.key(game), game)])
+
+    summary = {"output": output, "matched": matched, "added": len(pending.additions), "duplicates": skipped}
+    if job.get("dry_run"):
+        return summary
+
+    os.makedirs(output_dir, exist_ok=True)
+    name = job.get("name") or header.get("collection") or os.path.basename(output_dir)
+    shortname = job.get("shortname") if job.get("shortname") is not None else header.get("shortname", "")
+    save_collection_file(output, name, shortname, pending.additions.values(), set(),
+                         lambda file_path: resolve_game_path(file_path, output_dir)[0])
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Build Pegasus custom collections from source metadata files.")
+    parser.add_argument("-s", "--source", action="append", default=[], help="source metadata.pegasus.txt (repeatable)")
+    parser.add_argument("-q", "--query", action="append", default=[],
+                        help='"field[,field]:keyword"; all queries must match (repeatable)')
+    parser.add_argument("-w", "--where", help='query such as "genre:shooter AND release>=1995 NOT publisher:capcom"')
+    parser.add_argument("-o", "--output", help="custom collection to create or update")
+    parser.add_argument("--name", help="collection name (default: kept from the output file)")
+    parser.add_argument("--shortname", help="collection shortname")
+    parser.add_argument("--jobs", help="JSON file with a list of jobs")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="parallel processes for --jobs")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the parse cache")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be added without saving")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    jobs = []
+    if args.jobs:
+        with open(args.jobs, 'r', encoding='utf-8') as file:
+            jobs.extend(json.load(file))
+    if args.output:
+        if not args.source:
+            parser.error("--output needs at least one --source")
+        if args.where:
+            try:
+                compile_query(args.where)
+            except QueryError as error:
+                parser.error(f"--where: {error}")
+        jobs.append({"sources": args.source, "queries": args.query, "where": args.where, "output": args.output,
+                     "name": args.name, "shortname": args.shortname})
+    if not jobs:
+        parser.error("nothing to do: give --output with --source, or --jobs")
+    for job in jobs:
+        job.setdefault("cache", not args.no_cache)
+        job.setdefault("dry_run", args.dry_run)
+
+    failures = 0
+    if len(jobs) == 1 or args.workers <= 1:
+        for summary in map(_run_safely, jobs):
+            failures += _report(summary)
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs))) as executor:
+            for summary in executor.map(_run_safely, jobs):
+                failures += _report(summary)
+    return 1 if failures else 0
+
+
+def _run_safely(job):
+    try:
+        return run_job(job)
+    except (OSError, UnicodeDecodeError, KeyError, QueryError) as error:
+        return {"output": job.get("output"), "error": str(error)}
+
+
+def _report(summary):
+    if "error" in summary:
+        print(f"{summary['output']}: error: {summary['error']}", file=sys.stderr)
+        return 1
+    print(f"{summary['output']}: {summary['added']} added, {summary['duplicates']} already present "
+          f"({summary['matched']} matched)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
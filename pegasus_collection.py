@@ -0,0 +1,441 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" In-memory state of a custom collection, independent of the interface. """
+
+import functools
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+
+DEFAULT_HEADER = "collection:\nshortname:\ncommand: none\nextensions: none\nlaunch: none\n\n"
+
+
+def normalize_path(path):
+    """ Normalizes a path so that equal files compare equal (separators, "..", case on Windows). """
+    return os.path.normcase(os.path.normpath(path))
+
+
+def resolve_game_path(file_path, base_dir):
+    """ Returns the absolute path and file extension of a game's file entry. """
+    if os.path.isabs(file_path):
+        abs_path = file_path  # Custom collections already store absolute paths
+    else:
+        abs_path = os.path.join(base_dir, file_path.lstrip("./"))
+    return abs_path, os.path.splitext(file_path)[1]
+
+
+def intern_value(value):
+    """ The shared copy of a value that repeats across records (launch command, console name). """
+    return sys.intern(value) if type(value) is str else value
+
+
+class DirectoryTable:
+    """ Directory paths interned as small integer ids, so games in one folder share its path string. """
+
+    def __init__(self):
+        self._ids = {}
+        self._paths = []
+        self._lock = threading.Lock()  # Records are also built in loader and search threads
+
+    def id(self, directory):
+        directory_id = self._ids.get(directory)
+        if directory_id is None:
+            with self._lock:
+                directory_id = self._ids.get(directory)
+                if directory_id is None:
+                    directory_id = len(self._paths)
+                    self._paths.append(directory)
+                    self._ids[directory] = directory_id
+        return directory_id
+
+    def path(self, directory_id):
+        return self._paths[directory_id]
+
+    def __len__(self):
+        return len(self._paths)
+
+
+DIRECTORIES = DirectoryTable()
+
+_CASE_SENSITIVE = os.path.normcase("A") == "A"
+
+
+def file_key(directory_id, file_name):
+    """ Identity of a file for duplicate checks: equal for every spelling of the same path. """
+    if _CASE_SENSITIVE:
+        return directory_id, file_name
+    return DIRECTORIES.id(os.path.normcase(DIRECTORIES.path(directory_id))), os.path.normcase(file_name)
+
+
+class GameRecord:
+    """ A game as the editor lists, stages and saves it.
+
+    The file is kept as the id of its (normalized) directory in DIRECTORIES
+    plus its name inside it, instead of a full absolute path. launch and
+    console are interned, since whole sources share them. Records compare
+    equal when all their fields do.
+    """
+
+    __slots__ = ("game", "directory", "file_name", "launch", "console")
+
+    def __init__(self, game, abs_path, launch="none", console=None):
+        directory, file_name = os.path.split(os.path.normpath(abs_path) if abs_path else "")
+        self.game = game
+        self.directory = DIRECTORIES.id(directory)
+        self.file_name = file_name
+        self.launch = intern_value(launch)
+        self.console = intern_value(console)
+
+    @classmethod
+    def from_fields(cls, fields, base_dir, launch="none", console=None):
+        """ Record of a parsed game that has game and file; a launch of its own wins over the default.
+
+        Only plain dicts are checked for launch: a LazyRecord would decode the
+        whole record to answer.
+        """
+        if isinstance(fields, dict):
+            launch = fields.get('launch', launch)
+        file_path = fields['file']
+        directory, file_name = os.path.split(file_path if os.path.isabs(file_path) else file_path.lstrip("./"))
+        if file_name in ("", ".", ".."):
+            return cls(fields['game'], resolve_game_path(file_path, base_dir)[0], launch, console)
+        # Same result as resolving the path, but each directory is joined and normalized only once
+        record = cls.__new__(cls)
+        record.game = fields['game']
+        record.directory = _directory_id(base_dir, directory)
+        record.file_name = file_name
+        record.launch = intern_value(launch)
+        record.console = intern_value(console)
+        return record
+
+    @property
+    def abs_path(self):
+        return os.path.join(DIRECTORIES.path(self.directory), self.file_name)
+
+    @property
+    def ext(self):
+        return os.path.splitext(self.file_name)[1]
+
+    @property
+    def key(self):
+        """ Duplicate key of the file (see DuplicateIndex). """
+        return file_key(self.directory, self.file_name)
+
+    def sort_key(self):
+        return self.game, DIRECTORIES.path(self.directory), self.file_name, self.launch or ""
+
+    def _fields(self):
+        return self.game, self.directory, self.file_name, self.launch, self.console
+
+    def __eq__(self, other):
+        return isinstance(other, GameRecord) and self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def __reduce__(self):
+        # Directory ids only mean something in this process
+        return GameRecord, (self.game, self.abs_path, self.launch, self.console)
+
+    def __repr__(self):
+        return f"GameRecord({self.game!r}, {self.abs_path!r}, {self.launch!r}, {self.console!r})"
+
+
+@functools.lru_cache(maxsize=4096)
+def _directory_id(base_dir, relative_dir):
+    return DIRECTORIES.id(os.path.normpath(os.path.join(base_dir, relative_dir)) if base_dir or relative_dir else "")
+
+
+class DuplicateIndex:
+    """ Counts of the file keys (see file_key) of the games already present in the custom collection.
+
+    Kept as directory id -> {file name: count}, so no key tuple is stored per game.
+    """
+
+    def __init__(self, games=()):
+        self._counts = {}
+        self.rebuild(games)
+
+    @staticmethod
+    def key(abs_path):
+        directory, file_name = os.path.split(os.path.normpath(abs_path))
+        return file_key(DIRECTORIES.id(directory), file_name)
+
+    def rebuild(self, games):
+        """ Rebuilds the index from GameRecords. """
+        self._counts.clear()
+        for game in games:
+            self.add(game.key)
+
+    def add(self, key):
+        directory, file_name = key
+        names = self._counts.setdefault(directory, {})
+        names[file_name] = names.get(file_name, 0) + 1
+
+    def remove(self, key):
+        directory, file_name = key
+        names = self._counts.get(directory, {})
+        count = names.get(file_name, 0)
+        if count > 1:
+            names[file_name] = count - 1
+        elif count:
+            del names[file_name]
+            if not names:
+                del self._counts[directory]
+
+    def contains(self, key):
+        names = self._counts.get(key[0])
+        return names is not None and key[1] in names
+
+    def which_are_duplicates(self, keys):
+        """ Bulk check: returns one bool per key, in the same order. """
+        counts = self._counts
+        empty = {}
+        return [file_name in counts.get(directory, empty) for directory, file_name in keys]
+
+    def __len__(self):
+        return sum(len(names) for names in self._counts.values())
+
+
+class PendingChanges:
+    """ Games staged for addition and removal, kept in insertion-ordered dicts.
+
+    Both dicts are keyed by key(game), (name, file key, console), and map to
+    the GameRecord. Games already in the collection have no console, so theirs
+    is None.
+    """
+
+    def __init__(self):
+        self.additions = {}
+        self.removals = {}
+
+    @staticmethod
+    def key(game):
+        return game.game, game.key, game.console
+
+    def is_added(self, key):
+        return key in self.additions
+
+    def is_removed(self, key):
+        return key in self.removals
+
+    def toggle_addition(self, key, game):
+        """ Stages or unstages one addition; returns True when it is now staged. """
+        if self.additions.pop(key, None) is not None:
+            return False
+        self.additions[key] = game
+        return True
+
+    def toggle_removal(self, key, game):
+        """ Stages or unstages one removal; returns True when it is now staged. """
+        if self.removals.pop(key, None) is not None:
+            return False
+        self.removals[key] = game
+        return True
+
+    def stage_additions(self, items):
+        """ Stages many (key, game) additions at once; returns the keys that were not staged before. """
+        staged = []
+        for key, game in items:
+            if key not in self.additions:
+                self.additions[key] = game
+                staged.append(key)
+        return staged
+
+    def unstage_additions(self, keys):
+        return [key for key in keys if self.additions.pop(key, None) is not None]
+
+    def stage_removals(self, items):
+        staged = []
+        for key, game in items:
+            if key not in self.removals:
+                self.removals[key] = game
+                staged.append(key)
+        return staged
+
+    def unstage_removals(self, keys):
+        return [key for key in keys if self.removals.pop(key, None) is not None]
+
+    def clear(self):
+        self.additions.clear()
+        self.removals.clear()
+
+    def __len__(self):
+        return len(self.additions) + len(self.removals)
+
+
+class SaveResult:
+    """ What save_collection_file changed: the records it dropped and the games it wrote. """
+
+    def __init__(self):
+        self.removed = []  # Parsed fields of the records left out
+        self.added = []    # GameRecords written as new records
+
+
+def format_game(game, newline="\n"):
+    """ Text of a new custom collection entry. """
+    return f"# {game.game}{newline}file: {game.abs_path}{newline}launch: {game.launch}{newline}{newline}"
+
+
+def new_header(collection_name, shortname, newline="\n"):
+    return DEFAULT_HEADER.replace("collection:", f"collection: {collection_name}", 1) \
+        .replace("shortname:", f"shortname: {shortname}", 1).replace("\n", newline)
+
+
+_HEADER_KEY = re.compile(r"^(collection|shortname)\s*:", re.IGNORECASE)
+
+
+def patch_header(raw_header, collection_name, shortname, newline="\n"):
+    """ Rewrites the collection/shortname lines of a header block and keeps every other line. """
+    values = {"collection": collection_name, "shortname": shortname}
+    lines = []
+    replacing = False
+    for line in raw_header.splitlines(True):
+        match = _HEADER_KEY.match(line)
+        if match and match.group(1).lower() in values:
+            key = match.group(1).lower()
+            lines.append(f"{key}: {values.pop(key)}{newline}")
+            replacing = True
+        elif replacing and line[:1].isspace() and line.strip():
+            continue  # Continuation of a value that was replaced
+        else:
+            replacing = False
+            lines.append(line)
+    if "shortname" in values:
+        # A missing shortname goes right after the collection line
+        position = next((number + 1 for number, line in enumerate(lines) if _HEADER_KEY.match(line)), 0)
+        lines.insert(position, f"shortname: {values.pop('shortname')}{newline}")
+    if "collection" in values:
+        lines.insert(0, f"collection: {values.pop('collection')}{newline}")
+    return "".join(lines).rstrip("\r\n") + newline + newline
+
+
+def save_collection_file(file_name, collection_name, shortname, additions, removal_keys, resolve_path, byte_range=None):
+    """ Streams the collection to a temporary file and renames it over file_name.
+
+    Records whose (name, normalized absolute path) is in removal_keys are left
+    out, every other record is copied verbatim, and additions (GameRecords) are
+    merged in by case-insensitive name, so a sorted file stays sorted.
+    resolve_path turns a record's file value into an absolute path. With
+    byte_range (start, end), only that section of the file is the collection:
+    the bytes around it are copied unparsed. Returns a SaveResult.
+    """
+    result = SaveResult()
+    pending = sorted(additions, key=lambda game: game.game.lower(), reverse=True)  # Popped in name order
+    directory = os.path.dirname(os.path.abspath(file_name))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".pegasus-", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, 'wb') as binary_output:
+            # Unbuffered, so text and copied bytes reach the file in order
+            output = io.TextIOWrapper(binary_output, encoding='utf-8', newline='', write_through=True)
+            writer = _RecordWriter(output)
+            merge = functools.partial(_merge_records, writer=writer, pending=pending, result=result,
+                                      collection_name=collection_name, shortname=shortname,
+                                      removal_keys=removal_keys, resolve_path=resolve_path)
+            if not os.path.exists(file_name):
+                merge(())
+            elif byte_range is None:
+                with open(file_name, 'r', encoding='utf-8', newline='') as source:
+                    merge(source)
+            else:
+                from pegasus_sections import section_lines
+
+                start, end = byte_range
+                with open(file_name, 'rb') as source:
+                    _copy_bytes(source, binary_output, start)
+                    merge(line.decode('utf-8') for line in section_lines(source, end - start))
+                    if source.peek(1):
+                        writer.end_record()  # The next collection starts after a blank line
+                    shutil.copyfileobj(source, binary_output)
+
+            output.detach()
+            binary_output.flush()
+            os.fsync(binary_output.fileno())
+
+        if os.path.exists(file_name):
+            shutil.copymode(file_name, temp_path)
+        os.replace(temp_path, file_name)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return result
+
+
+def _merge_records(lines, writer, pending, result, collection_name, shortname, removal_keys, resolve_path):
+    """ Writes the records of one collection from lines with the changes of save_collection_file applied. """
+    # The parser is imported by the first save, not when the editor starts
+    from pegasus_metadata import COLLECTION, GAME, iter_metadata_blocks
+
+    for kind, fields, raw_text in iter_metadata_blocks(lines):
+        if not writer.header_written:
+            if raw_text.endswith("\r\n"):
+                writer.newline = "\r\n"
+            if kind == COLLECTION:
+                writer.write(patch_header(raw_text, collection_name, shortname, writer.newline))
+                writer.header_written = True
+                continue
+            writer.write(new_header(collection_name, shortname, writer.newline))
+            writer.header_written = True
+
+        if kind != GAME:
+            writer.write(raw_text)
+            continue
+        if 'file' in fields and (fields['game'], normalize_path(resolve_path(fields['file']))) in removal_keys:
+            result.removed.append(fields)
+            continue
+        while pending and pending[-1].game.lower() < fields['game'].lower():
+            result.added.append(writer.write_game(pending.pop()))
+        writer.write_record(raw_text)
+
+    if not writer.header_written:
+        writer.write(new_header(collection_name, shortname, writer.newline))
+    while pending:
+        result.added.append(writer.write_game(pending.pop()))
+
+
+def _copy_bytes(source, output, length, chunk_size=1 << 20):
+    while length > 0:
+        chunk = source.read(min(length, chunk_size))
+        if not chunk:
+            return
+        output.write(chunk)
+        length -= len(chunk)
+
+
+class _RecordWriter:
+    """ Writes records keeping exactly one blank line in front of every record that starts after another. """
+
+    def __init__(self, output):
+        self.output = output
+        self.newline = "\n"
+        self.header_written = False
+        self._tail = ""
+
+    def write(self, text):
+        if text:
+            self.output.write(text)
+            self._tail = (self._tail + text)[-4:]
+
+    def _separate(self):
+        if self._tail and not self._tail.endswith(self.newline + self.newline):
+            self.write(self.newline if self._tail.endswith("\n") else self.newline + self.newline)
+
+    def write_record(self, raw_text):
+        self._separate()
+        self.write(raw_text)
+
+    def end_record(self):
+        """ Ends what was written with a blank line, before text copied from elsewhere. """
+        self._separate()
+
+    def write_game(self, game):
+        self.write_record(format_game(game, self.newline))
+        return game
@@ -0,0 +1,194 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Undo/redo of the edits to a collection, as a log of operations.
+
+An operation is (kind, payload): staging or unstaging games for addition or
+removal, with the GameRecords concerned as payload, or renaming a header field,
+with (field, old value, new value). Undoing applies the inverse operations, so
+only the games an edit touched are kept, never a copy of the collection.
+
+The operations applied since the last save are appended to a JSON-lines file
+next to the collection, one line per edit, so the edits of a session that ended
+without saving can be replayed.
+"""
+
+import json
+import os
+
+from pegasus_collection import GameRecord
+
+STAGE_ADDITIONS = "stage_additions"
+UNSTAGE_ADDITIONS = "unstage_additions"
+STAGE_REMOVALS = "stage_removals"
+UNSTAGE_REMOVALS = "unstage_removals"
+RENAME = "rename"
+
+HISTORY_SUFFIX = ".history.jsonl"
+MAX_UNDO = 1000  # Edits kept for undo; the oldest are dropped first
+
+_INVERSE = {
+    STAGE_ADDITIONS: UNSTAGE_ADDITIONS,
+    UNSTAGE_ADDITIONS: STAGE_ADDITIONS,
+    STAGE_REMOVALS: UNSTAGE_REMOVALS,
+    UNSTAGE_REMOVALS: STAGE_REMOVALS,
+}
+
+
+def history_path(collection_file, section=None):
+    """ Where the command log of collection_file, or of its section number section, is written. """
+    if section is not None:
+        return f"{collection_file}.{section}{HISTORY_SUFFIX}"
+    return collection_file + HISTORY_SUFFIX
+
+
+def inverse(operations):
+    """ The operations that undo operations, in the order to apply them. """
+    undone = []
+    for kind, payload in reversed(operations):
+        if kind == RENAME:
+            field, old, new = payload
+            undone.append((RENAME, (field, new, old)))
+        else:
+            undone.append((_INVERSE[kind], payload))
+    return undone
+
+
+def _encode(operations):
+    encoded = []
+    for kind, payload in operations:
+        if kind == RENAME:
+            encoded.append([kind, list(payload)])
+        else:
+            encoded.append([kind, [[game.game, game.abs_path, game.launch, game.console] for game in payload]])
+    return encoded
+
+
+def _decode(encoded):
+    operations = []
+    for kind, payload in encoded:
+        if kind == RENAME:
+            operations.append((kind, tuple(payload)))
+        elif kind in _INVERSE:
+            operations.append((kind, [GameRecord(*fields) for fields in payload]))
+        else:
+            raise ValueError(f"unknown operation {kind!r}")
+    return operations
+
+
+class CommandLog:
+    """ Undo and redo stacks of edits (lists of operations), written to path as they happen when path is set. """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def record(self, operations):
+        """ Adds an edit that was just applied; empty edits are ignored. """
+        operations = [(kind, payload) for kind, payload in operations if payload]
+        if not operations:
+            return
+        self.undo_stack.append(operations)
+        del self.undo_stack[:-MAX_UNDO]
+        self.redo_stack.clear()
+        self._write("do", operations)
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self):
+        """ The operations that undo the last edit, to be applied by the caller; None if there is none. """
+        if not self.undo_stack:
+            return None
+        operations = self.undo_stack.pop()
+        self.redo_stack.append(operations)
+        undone = inverse(operations)
+        self._write("undo", undone)
+        return undone
+
+    def redo(self):
+        """ The operations of the last undone edit, to be applied again; None if there is none. """
+        if not self.redo_stack:
+            return None
+        operations = self.redo_stack.pop()
+        self.undo_stack.append(operations)
+        self._write("redo", operations)
+        return operations
+
+    def mark_saved(self):
+        """ The collection file now holds every edit: undo, redo and the log on disk start over.
+
+        Edits from before the save are not undone through it, since the games
+        they staged are now part of the file.
+        """
+        self.clear()
+        self.discard()
+
+    def discard(self):
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def _write(self, action, operations):
+        if not self.path:
+            return
+        line = json.dumps({"action": action, "operations": _encode(operations)}, ensure_ascii=False)
+        try:
+            with open(self.path, 'a', encoding='utf-8') as log:
+                log.write(line + "\n")
+        except OSError:
+            return  # The log only helps to recover a session; editing goes on without it
+
+    @classmethod
+    def replay(cls, path):
+        """ (CommandLog continuing the log at path, operations to apply in order to get back to its state).
+
+        A truncated last line, as left by a crash, is ignored and cut from the
+        file, so the entries logged next do not end up on the same line.
+        """
+        log = cls(path)
+        applied = []
+        try:
+            with open(path, encoding='utf-8', newline='') as entries:
+                lines = entries.readlines()
+        except FileNotFoundError:
+            return log, applied
+        if lines and not lines[-1].endswith("\n"):
+            lines.pop()
+            try:
+                with open(path, 'r+b') as entries:
+                    entries.truncate(sum(len(line.encode('utf-8')) for line in lines))
+            except OSError:
+                pass
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                operations = _decode(entry["operations"])
+                action = entry["action"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            applied.extend(operations)
+            # The stacks are rebuilt as far as the log goes; edits from before the last save are not in it
+            if action == "do":
+                log.undo_stack.append(operations)
+                log.redo_stack.clear()
+            elif action == "undo" and log.undo_stack:
+                log.redo_stack.append(log.undo_stack.pop())
+            elif action == "redo" and log.redo_stack:
+                log.undo_stack.append(log.redo_stack.pop())
+        return log, applied
+
+    def __len__(self):
+        return len(self.undo_stack)
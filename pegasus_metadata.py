@@ -0,0 +1,387 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Single-pass reader for metadata.pegasus.txt files. """
+
+import io
+import os
+import re
+import sys
+from collections.abc import Mapping
+
+COLLECTION = "collection"
+GAME = "game"
+TEXT = "text"  # Leftover comments/blank lines, only yielded by iter_metadata_blocks
+
+# "key: value" at the start of a line. Anything else is a continuation or comment.
+_KEY_LINE = re.compile(r"^([A-Za-z0-9][A-Za-z0-9_.\-]*)\s*:(.*)$")
+_KEY_BYTES = re.compile(rb"([A-Za-z0-9][A-Za-z0-9_.\-]*)\s*:")
+
+EAGER_FIELDS = ("game", "file")  # The only fields a lazily read file decodes while loading
+
+
+class MetadataDocument:
+    """ Header and game records of one metadata file, parsed in a single pass. """
+
+    def __init__(self, header=None, games=None):
+        self.header = header if header is not None else {}
+        self.games = games if games is not None else []
+
+    def launch_command(self, default="none"):
+        return self.header.get("launch") or default
+
+    def collection_name(self):
+        return self.header.get("collection", "")
+
+
+def iter_metadata(file_name):
+    """ Walks the file once and yields (kind, fields) for every collection header and game. """
+    with open(file_name, 'r', encoding='utf-8') as file:
+        yield from iter_metadata_lines(file)
+
+
+def iter_metadata_lines(lines):
+    """ Same as iter_metadata, but over any iterable of text lines. """
+    return _iter_records(lines, keep_raw=False)
+
+
+def iter_metadata_blocks(lines):
+    """ Yields (kind, fields, raw_text): every record with the exact text it was parsed from.
+
+    Joining all raw_text values gives back the input unchanged, so a writer can
+    copy records it does not modify verbatim.
+    """
+    return _iter_records(lines, keep_raw=True)
+
+
+def _iter_records(lines, keep_raw):
+    kind = None
+    fields = {}
+    opened_by_comment = False
+    current_key = None
+    value_lines = []
+
+    def close_value():
+        if current_key is not None:
+            fields[current_key] = _join_value(value_lines)
+
+    def flush():
+        if kind == COLLECTION:
+            return (COLLECTION, fields)
+        # A "# Title" comment alone is not a game until it gets some keys
+        if kind == GAME and (not opened_by_comment or len(fields) > 1):
+            return (GAME, fields)
+        return None
+
+    raw = []
+
+    def emit(record, at_end=False):
+        nonlocal raw
+        if not keep_raw:
+            yield record
+        elif at_end:
+            yield record + ("".join(raw),)
+            raw = []
+        else:
+            # The line that started the next record is not part of this one
+            yield record + ("".join(raw[:-1]),)
+            raw = raw[-1:]
+
+    for raw_line in lines:
+        if keep_raw:
+            raw.append(raw_line)
+        line = raw_line.rstrip("\r\n")
+        stripped = line.strip()
+
+        if not stripped:
+            close_value()
+            current_key = None
+            continue
+
+        if line.startswith("#"):
+            close_value()
+            current_key = None
+            title = line.strip("# ").strip()
+            if line.startswith("# ") and title:
+                record = flush()
+                if record:
+                    yield from emit(record)
+                kind, fields, opened_by_comment = GAME, {"game": title}, True
+            continue
+
+        match = None if line[0].isspace() else _KEY_LINE.match(line)
+        if match is None:
+            # Indented (or free) text continues the previous value
+            if current_key is not None:
+                value_lines.append(stripped)
+            continue
+
+        close_value()
+        key = sys.intern(match.group(1).lower())  # Few distinct keys, shared by every record
+        value = match.group(2).strip()
+
+        if key == COLLECTION:
+            record = flush()
+            if record:
+                yield from emit(record)
+            kind, fields, opened_by_comment = COLLECTION, {}, False
+        elif key == GAME and not (opened_by_comment and "game" in fields and len(fields) == 1):
+            record = flush()
+            if record:
+                yield from emit(record)
+            kind, fields, opened_by_comment = GAME, {}, False
+        elif kind is None:
+            # Keys before any "collection:" still describe the file header
+            kind, fields, opened_by_comment = COLLECTION, {}, False
+
+        current_key = key
+        value_lines = [value] if value else []
+
+    close_value()
+    record = flush()
+    if record:
+        yield from emit(record, at_end=True)
+    elif keep_raw and raw:
+        yield from emit((TEXT, {}), at_end=True)
+
+
+def _join_value(value_lines):
+    """ Joins continuation lines the way Pegasus does: spaces, with "." as a paragraph break. """
+    paragraphs = [[]]
+    for part in value_lines:
+        if part == ".":
+            paragraphs.append([])
+        else:
+            paragraphs[-1].append(part)
+    return "\n".join(" ".join(paragraph) for paragraph in paragraphs)
+
+
+def parse_metadata(file_name):
+    """ Parses the whole file into a MetadataDocument (first header + all games). """
+    document = MetadataDocument()
+    seen_header = False
+    for kind, fields in iter_metadata(file_name):
+        if kind == COLLECTION:
+            if not seen_header:
+                document.header = fields
+                seen_header = True
+        else:
+            document.games.append(fields)
+    return document
+
+
+def read_header(file_name):
+    """ Reads only the first collection header, stopping at the first game. """
+    for kind, fields in iter_metadata(file_name):
+        if kind == COLLECTION:
+            return fields
+        break
+    return {}
+
+
+def _fingerprint(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+class StaleMetadataError(ValueError):
+    """ The file is not the version its records were scanned from: it has to be read again. """
+
+
+class MetadataBuffer:
+    """ The bytes of a metadata file as read once, which LazyRecords decode their fields from.
+
+    The bytes are a copy, not a memory map: a file rewritten or truncated on
+    disk (e.g. by a scraper) cannot change what records already read or crash
+    the reader, and no handle stays open to keep the file from being replaced.
+    fingerprint is the (size, mtime_ns) of the version read.
+
+    Pickling keeps only the file name and fingerprint; unpickling reads the file
+    again and raises StaleMetadataError when it is no longer that version.
+    """
+
+    READ_ATTEMPTS = 3  # Reads of a file that keeps changing under the reader before giving up
+
+    def __init__(self, file_name, fingerprint=None):
+        self.file_name = os.path.abspath(file_name)
+        self._read(fingerprint)
+
+    def _read(self, expected):
+        for _ in range(self.READ_ATTEMPTS):
+            with open(self.file_name, 'rb') as file:
+                before = _fingerprint(os.fstat(file.fileno()))
+                if expected is not None and before != tuple(expected):
+                    raise StaleMetadataError(f"{self.file_name} changed since it was scanned")
+                data = file.read()
+                if _fingerprint(os.fstat(file.fileno())) == before and len(data) == before[0]:
+                    self.data = data
+                    self.fingerprint = before
+                    return
+        raise StaleMetadataError(f"{self.file_name} kept changing while it was read")
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getstate__(self):
+        return {"file_name": self.file_name, "fingerprint": self.fingerprint}
+
+    def __setstate__(self, state):
+        self.file_name = state["file_name"]
+        self._read(state["fingerprint"])
+
+    def fields(self, start, end):
+        """ Fully parsed fields of the record stored at data[start:end]. """
+        text = self.data[start:end].decode('utf-8', errors='replace')
+        for _, fields in iter_metadata_lines(io.StringIO(text)):
+            return fields
+        return {}
+
+    def records(self):
+        """ Yields (kind, record, end offset): header dicts and LazyRecords, in file order. """
+        for kind, values, start, end in _scan_records(self.data):
+            if kind == COLLECTION:
+                yield kind, self.fields(start, end), end
+            else:
+                yield kind, LazyRecord(values.get("game"), values.get("file"), self, start, end), end
+
+
+class LazyRecord(Mapping):
+    """ Read-only game record keeping only game and file in memory.
+
+    Any other field is decoded from the MetadataBuffer on access and not kept,
+    so loading a source costs a few strings per game instead of a full dict.
+    """
+
+    __slots__ = ("game", "file", "source", "start", "end")
+
+    def __init__(self, game, file, source, start, end):
+        self.game = game
+        self.file = file
+        self.source = source
+        self.start = start
+        self.end = end
+
+    def materialize(self):
+        """ All fields as a new dict. """
+        return self.source.fields(self.start, self.end)
+
+    def __getitem__(self, key):
+        if key == "game" and self.game is not None:
+            return self.game
+        if key == "file" and self.file is not None:
+            return self.file
+        return self.materialize()[key]
+
+    def __contains__(self, key):
+        if key == "game":
+            return self.game is not None
+        if key == "file":
+            return self.file is not None
+        return key in self.materialize()
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __repr__(self):
+        return f"LazyRecord(game={self.game!r}, file={self.file!r}, bytes {self.start}-{self.end})"
+
+
+def record_fields(record):
+    """ The fields of a record as a mapping that is cheap to read repeatedly. """
+    return record.materialize() if isinstance(record, LazyRecord) else record
+
+
+def map_metadata(file_name):
+    """ Lazy equivalent of parse_metadata: games are LazyRecords over a MetadataBuffer of the file. """
+    document = MetadataDocument()
+    seen_header = False
+    for kind, record, _ in MetadataBuffer(file_name).records():
+        if kind == COLLECTION:
+            if not seen_header:
+                document.header = record
+                seen_header = True
+        else:
+            document.games.append(record)
+    return document
+
+
+def _scan_records(data):
+    """ Byte-level version of _iter_records: yields (kind, eager values, start, end) for every record.
+
+    Follows the same rules, but only decodes the lines holding EAGER_FIELDS.
+    """
+    kind = None
+    keys = set()
+    values = {}
+    opened_by_comment = False
+    current_key = None  # Eager key whose value lines are being collected
+    value_lines = []
+    start = position = 0
+    size = len(data)
+
+    def is_record():
+        return kind == COLLECTION or (kind == GAME and (not opened_by_comment or len(keys) > 1))
+
+    while position < size:
+        line_start = position
+        newline = data.find(b"\n", position)
+        position = size if newline == -1 else newline + 1
+        line = data[line_start:position].rstrip(b"\r\n")
+        stripped = line.strip()
+
+        if not stripped or (stripped[0] > 127 and not stripped.decode('utf-8', errors='replace').strip()):
+            if current_key is not None:
+                values[current_key] = _join_value(value_lines)
+                current_key = None
+            continue
+
+        if line.startswith(b"#"):
+            if current_key is not None:
+                values[current_key] = _join_value(value_lines)
+                current_key = None
+            if line.startswith(b"# "):
+                title = line.decode('utf-8', errors='replace').strip("# ").strip()
+                if title:
+                    if is_record():
+                        yield kind, values, start, line_start
+                    kind, keys, values, opened_by_comment = GAME, {"game"}, {"game": title}, True
+                    start = line_start
+            continue
+
+        match = None if line[:1].isspace() else _KEY_BYTES.match(line)
+        if match is None:
+            if current_key is not None:
+                value_lines.append(stripped.decode('utf-8', errors='replace').strip())
+            continue
+
+        if current_key is not None:
+            values[current_key] = _join_value(value_lines)
+            current_key = None
+        key = match.group(1).decode('ascii').lower()
+
+        if key == COLLECTION:
+            if is_record():
+                yield kind, values, start, line_start
+            kind, keys, values, opened_by_comment = COLLECTION, set(), {}, False
+            start = line_start
+        elif key == GAME and not (opened_by_comment and keys == {"game"}):
+            if is_record():
+                yield kind, values, start, line_start
+            kind, keys, values, opened_by_comment = GAME, set(), {}, False
+            start = line_start
+        elif kind is None:
+            kind, keys, values, opened_by_comment = COLLECTION, set(), {}, False
+            start = line_start
+
+        keys.add(key)
+        if kind == GAME and key in EAGER_FIELDS:
+            current_key = key
+            value = line[match.end():].decode('utf-8', errors='replace').strip()
+            value_lines = [value] if value else []
+
+    if current_key is not None:
+        values[current_key] = _join_value(value_lines)
+    if is_record():
+        yield kind, values, start, size
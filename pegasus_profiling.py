@@ -0,0 +1,131 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Optional timing and memory instrumentation of the editor's operations.
+
+Set PEGASUS_EDITOR_PROFILE=1 to record, for every instrumented stage, its wall
+time, record count and peak allocations (tracemalloc). Records are written as
+JSON lines to a rotating log (PEGASUS_EDITOR_PROFILE_LOG, by default
+profile.jsonl in the cache directory) and shown in a debug status bar.
+PEGASUS_EDITOR_PROFILE=time skips memory tracing, which slows Python down.
+
+When the variable is not set, PROFILER is None and instrumented() returns the
+functions unchanged, so the layer costs nothing.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+from pegasus_cache import default_cache_dir
+
+PROFILE_ENV = "PEGASUS_EDITOR_PROFILE"
+PROFILE_LOG_ENV = "PEGASUS_EDITOR_PROFILE_LOG"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+
+class Profiler:
+    """ Measures stages and hands each finished record to the log and to listeners.
+
+    Stages may nest or overlap (background loads): tracemalloc keeps a single
+    peak, so it is folded into every open stage before being reset.
+    """
+
+    def __init__(self, log_file=None, trace_memory=True):
+        import logging  # Only needed when profiling, and slow to import
+        from logging.handlers import RotatingFileHandler
+
+        self.trace_memory = trace_memory
+        self.listeners = []
+        self._open = []
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger("pegasus.profile")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if log_file:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+                handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding='utf-8')
+            except OSError:
+                handler = None  # Without a log, the status bar still works
+            if handler is not None:
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self._logger.addHandler(handler)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self, stage, started=None):
+        """ Opens a stage, which began at perf_counter() value started if given; pass the returned token to finish(). """
+        token = {"stage": stage, "start": time.perf_counter() if started is None else started, "memory": 0, "peak": 0}
+        if self.trace_memory:
+            with self._lock:
+                self._fold_peak()
+                token["memory"] = token["peak"] = tracemalloc.get_traced_memory()[0]
+                self._open.append(token)
+        return token
+
+    def finish(self, token, count=None, **extra):
+        """ Closes a stage and publishes its record. """
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "stage": token["stage"],
+            "seconds": round(time.perf_counter() - token["start"], 6),
+        }
+        if count is not None:
+            record["count"] = count
+        if self.trace_memory:
+            with self._lock:
+                self._fold_peak()
+                if token in self._open:
+                    self._open.remove(token)
+            record["peak_kb"] = max(token["peak"] - token["memory"], 0) // 1024
+        record.update(extra)
+        self._logger.info(json.dumps(record, ensure_ascii=False))
+        for listener in self.listeners:
+            listener(record)
+        return record
+
+    def _fold_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        for token in self._open:
+            token["peak"] = max(token["peak"], peak)
+        if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+; before that the peak is since start
+            tracemalloc.reset_peak()
+
+
+def create_profiler():
+    mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if mode in ("", "0", "false", "off"):
+        return None
+    log_file = os.environ.get(PROFILE_LOG_ENV) or os.path.join(default_cache_dir(), "profile.jsonl")
+    return Profiler(log_file, trace_memory=(mode != "time"))
+
+
+PROFILER = create_profiler()
+
+
+def instrumented(stage, count=None):
+    """ Decorator recording stage for every call; count(instance, result) gives the record count.
+
+    With profiling disabled the function is returned as it is.
+    """
+    def decorate(function):
+        if PROFILER is None:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            token = PROFILER.start(stage)
+            try:
+                result = function(self, *args, **kwargs)
+            except BaseException as error:
+                PROFILER.finish(token, error=type(error).__name__)
+                raise
+            PROFILER.finish(token, count(self, result) if count else None)
+            return result
+        return wrapper
+    return decorate
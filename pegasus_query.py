@@ -0,0 +1,414 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Field query language over a column-per-field store of game records.
+
+    genre:shooter AND players:2 AND release>=1995 NOT publisher:capcom
+    (developer:konami OR developer:"irem corp") -genre:puzzle x-rating>=4
+
+field:text   the field contains text          field=text   the field is text
+field!=text  the field is not text            field>=1995  comparison (also >, <, <=)
+word         any of the default fields contains word
+
+AND is implied between terms; OR binds looser than AND; NOT and a leading "-"
+negate the next term. Matching is case-insensitive. Comparisons are numeric
+when the value is a number (using the number the field starts with, so
+release>=1995 matches "1995-03-01"), otherwise they compare text.
+"""
+
+import functools
+import re
+import threading
+from bisect import bisect_left, bisect_right
+
+from pegasus_metadata import EAGER_FIELDS, record_fields
+from pegasus_search import SEARCH_FIELDS
+
+
+class QueryError(ValueError):
+    """ The query text could not be compiled. """
+
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<open>\() | (?P<close>\)) |
+        (?P<negate>-)?(?P<field>[A-Za-z][\w.\-]*)\s*(?P<op>>=|<=|!=|:|=|>|<)\s*(?P<value>"(?:[^"\\]|\\.)*"|[^\s()]*) |
+        (?P<quoted>"(?:[^"\\]|\\.)*") |
+        (?P<word>[^\s()]+)
+    )""", re.VERBOSE)
+# Operators are uppercase only, as in _tokenize: "Sonic and Knuckles" is a keyword
+_LOOKS_LIKE_QUERY = re.compile(
+    r"(?:^|[\s(])-?(?:" + "|".join(SEARCH_FIELDS) + r"|x-[\w.\-]+)\s*(?:>=|<=|!=|:|=|>|<)|(?-i:\b(?:AND|OR|NOT)\b)|^\s*\(",
+    re.IGNORECASE)
+_LEADING_NUMBER = re.compile(r"\s*(-?\d+(?:\.\d+)?)")
+_SEPARATOR = "\0"  # Between column values in a blob; cannot occur in a query value
+# Short fields decoded together, so a query on one of them makes the others cheap too
+_SHORT_FIELDS = {"developer", "publisher", "genre", "release", "players"}
+
+
+def looks_like_query(text):
+    """ True when text uses query syntax (field operators, AND/OR/NOT, parentheses) rather than being a keyword. """
+    return bool(_LOOKS_LIKE_QUERY.search(text))
+
+
+def is_known_field(field):
+    return field in SEARCH_FIELDS or field.startswith("x-")
+
+
+def leading_number(text):
+    match = _LEADING_NUMBER.match(text)
+    return float(match.group(1)) if match else None
+
+
+def _is_number(text):
+    return _LEADING_NUMBER.fullmatch(text) is not None
+
+
+_COMPARISONS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+class ColumnStore:
+    """ Casefolded field values of a list of records, one column per field, plus indexes over them.
+
+    Columns are built the first time a query uses their field and extended when
+    records are appended; the indexes are rebuilt after the records change.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self.columns = {}
+        self._indexes = {}  # (kind, field) -> (record count, index)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def prepare(self, fields):
+        """ Builds or extends the columns of fields, decoding each new record once. """
+        fields = set(fields)
+        if fields & _SHORT_FIELDS:
+            fields |= _SHORT_FIELDS
+        with self.lock:
+            end = len(self.records)
+            targets = [(field, self.columns.setdefault(field, [])) for field in fields]
+            targets = [(field, column) for field, column in targets if len(column) < end]
+            if not targets:
+                return
+            # Mapped records keep game/file in memory; other fields are decoded once per record here
+            materialize = not {field for field, _ in targets} <= set(EAGER_FIELDS)
+            for record_id in range(min(len(column) for _, column in targets), end):
+                record = record_fields(self.records[record_id]) if materialize else self.records[record_id]
+                for field, column in targets:
+                    if len(column) == record_id:
+                        value = record.get(field)
+                        column.append(value.casefold() if value else "")
+
+    def column(self, field):
+        self.prepare([field])
+        return self.columns[field]
+
+    def _index(self, kind, field, build):
+        with self.lock:
+            column = self.column(field)
+            cached = self._indexes.get((kind, field))
+            if cached is None or cached[0] != len(column):
+                cached = (len(column), build(column))
+                self._indexes[(kind, field)] = cached
+            return cached[1]
+
+    def contains(self, field, text):
+        """ Ids of the records whose field contains text. """
+        groups = self._index("equal", field, _grouped)
+        if len(groups) <= len(self.records) // 8:
+            # Few distinct values (genre, players...): only those need checking
+            found = set()
+            for value, ids in groups.items():
+                if text in value:
+                    found.update(ids)
+            return found
+        starts, blob = self._index("blob", field, _joined)
+        if blob.count(text) > len(starts) // 8:
+            # Common text: one pass over the column beats a find per match
+            return {record_id for record_id, value in enumerate(self.column(field)) if text in value}
+        found = set()
+        position = blob.find(text)
+        while position != -1:
+            record_id = bisect_right(starts, position) - 1
+            found.add(record_id)
+            if record_id + 1 == len(starts):
+                break
+            position = blob.find(text, starts[record_id + 1])
+        return found
+
+    def equal(self, field, text):
+        return set(self._index("equal", field, _grouped).get(text, ()))
+
+    def matches(self, field, op, value, ids):
+        """ The ids (from a small candidate set) whose field satisfies op value, checked one by one. """
+        if op in (":", "=", "!="):
+            column = self.column(field)
+            if op == ":":
+                return {record_id for record_id in ids if value in column[record_id]}
+            if op == "=":
+                return {record_id for record_id in ids if column[record_id] == value}
+            return {record_id for record_id in ids if column[record_id] != value}
+        test = _COMPARISONS[op]
+        if _is_number(value):
+            numbers = self._index("number_column", field, lambda column: [leading_number(text) for text in column])
+            value = float(value)
+            return {record_id for record_id in ids if numbers[record_id] is not None and test(numbers[record_id], value)}
+        column = self.column(field)
+        return {record_id for record_id in ids if column[record_id] and test(column[record_id], value)}
+
+    def compare(self, field, op, value):
+        """ Ids of the records whose field is op (">", ">=", "<", "<=") value. """
+        if _is_number(value):
+            keys, ids = self._index("numbers", field, _sorted_numbers)
+            value = float(value)
+        else:
+            keys, ids = self._index("texts", field, _sorted_texts)
+        if op == ">":
+            return set(ids[bisect_right(keys, value):])
+        if op == ">=":
+            return set(ids[bisect_left(keys, value):])
+        if op == "<":
+            return set(ids[:bisect_left(keys, value)])
+        return set(ids[:bisect_right(keys, value)])
+
+
+def _joined(column):
+    starts = []
+    position = 0
+    for value in column:
+        starts.append(position)
+        position += len(value) + 1
+    return starts, _SEPARATOR.join(value.replace(_SEPARATOR, " ") for value in column)
+
+
+def _grouped(column):
+    groups = {}
+    for record_id, value in enumerate(column):
+        groups.setdefault(value, []).append(record_id)
+    return groups
+
+
+def _sorted_numbers(column):
+    pairs = sorted((number, record_id) for record_id, number in enumerate(map(leading_number, column)) if number is not None)
+    return [number for number, _ in pairs], [record_id for _, record_id in pairs]
+
+
+def _sorted_texts(column):
+    pairs = sorted((value, record_id) for record_id, value in enumerate(column) if value)
+    return [value for value, _ in pairs], [record_id for _, record_id in pairs]
+
+
+class _Term:
+    def __init__(self, fields, op, value):
+        self.fields = fields
+        self.op = op
+        self.value = value
+
+    def refine(self, store, ids):
+        """ The subset of ids matching this term, for when ids is already small. """
+        found = set()
+        for field in self.fields:
+            found |= store.matches(field, self.op, self.value, ids - found)
+        return found
+
+    def evaluate(self, store):
+        ids = set()
+        for field in self.fields:
+            if self.op == ":":
+                ids |= store.contains(field, self.value)
+            elif self.op == "=":
+                ids |= store.equal(field, self.value)
+            elif self.op == "!=":
+                ids |= set(range(len(store))) - store.equal(field, self.value)
+            else:
+                ids |= store.compare(field, self.op, self.value)
+        return ids
+
+
+class _And:
+    def __init__(self, terms, negated):
+        self.terms = terms
+        self.negated = negated
+
+    def evaluate(self, store):
+        ids = None
+        small = len(store) // 16
+        for term in self.terms:
+            if ids is None:
+                ids = term.evaluate(store)
+            elif len(ids) <= small and isinstance(term, _Term):
+                ids = term.refine(store, ids)  # Cheaper than building the term's whole result
+            else:
+                ids &= term.evaluate(store)
+            if not ids:
+                return set()
+        if ids is None:
+            ids = set(range(len(store)))
+        for term in self.negated:
+            if len(ids) <= small and isinstance(term, _Term):
+                ids -= term.refine(store, ids)
+            else:
+                ids -= term.evaluate(store)
+        return ids
+
+
+class _Or:
+    def __init__(self, terms):
+        self.terms = terms
+
+    def evaluate(self, store):
+        ids = set()
+        for term in self.terms:
+            ids |= term.evaluate(store)
+        return ids
+
+
+class Query:
+    """ A compiled query; ids(store) runs it over a ColumnStore. """
+
+    def __init__(self, text, root, fields):
+        self.text = text
+        self.root = root
+        self.fields = fields  # Every field the query reads
+
+    def ids(self, store):
+        """ Matching record ids, in source order. """
+        with store.lock:  # The columns are not extended while a query reads them
+            store.prepare(self.fields)
+            return sorted(self.root.evaluate(store))
+
+
+def compile_query(text, default_fields=("game",)):
+    """ Compiles text into a Query; bare words search default_fields. Raises QueryError. """
+    return _compile(text, tuple(default_fields))
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(text, default_fields):
+    parser = _Parser(_tokenize(text), default_fields)
+    root = parser.parse()
+    return Query(text, root, sorted(parser.fields))
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        if text[position:].isspace():
+            break
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise QueryError(f"Unexpected text at position {position + 1}: {text[position:position + 10]!r}")
+        position = match.end()
+        if match.group("open"):
+            tokens.append(("(", None))
+        elif match.group("close"):
+            tokens.append((")", None))
+        elif match.group("field"):
+            field = match.group("field").lower()
+            if not is_known_field(field):
+                raise QueryError(f"Unknown field: {field}")
+            value = _unquote(match.group("value"))
+            if not value:
+                raise QueryError(f"Missing value after {field}{match.group('op')}")
+            if match.group("negate"):
+                tokens.append(("NOT", None))
+            tokens.append(("term", (field, match.group("op"), value)))
+        elif match.group("quoted"):
+            tokens.append(("term", (None, ":", _unquote(match.group("quoted")))))
+        else:
+            word = match.group("word")
+            if word in ("AND", "OR", "NOT"):
+                tokens.append((word, None))
+            elif word.startswith("-") and len(word) > 1:
+                tokens.append(("NOT", None))
+                tokens.append(("term", (None, ":", word[1:])))
+            else:
+                tokens.append(("term", (None, ":", word)))
+    return tokens
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value.casefold()
+
+
+class _Parser:
+    """ Recursive descent: or := and ("OR" and)* ; and := unary (["AND"] unary | "NOT" unary)* """
+
+    def __init__(self, tokens, default_fields):
+        self.tokens = tokens
+        self.position = 0
+        self.default_fields = default_fields
+        self.fields = set()
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("Empty query")
+        root = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError(f"Unexpected {self.peek()!r}")
+        return root
+
+    def parse_or(self):
+        terms = [self.parse_and()]
+        while self.peek() == "OR":
+            self.take()
+            terms.append(self.parse_and())
+        return terms[0] if len(terms) == 1 else _Or(terms)
+
+    def parse_and(self):
+        terms = []
+        negated = []
+        while self.peek() not in (None, "OR", ")"):
+            if self.peek() == "AND":
+                self.take()
+            elif self.peek() == "NOT":
+                self.take()
+                negated.append(self.parse_operand())
+            else:
+                terms.append(self.parse_operand())
+        if not terms and not negated:
+            raise QueryError("Expected a term")
+        if len(terms) == 1 and not negated:
+            return terms[0]
+        return _And(terms, negated)
+
+    def parse_operand(self):
+        kind = self.peek()
+        if kind is None:
+            raise QueryError("Query ends too early")
+        if kind == "(":
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise QueryError("Missing )")
+            self.take()
+            return node
+        if kind == "NOT":
+            self.take()
+            return _And([], [self.parse_operand()])
+        if kind != "term":
+            raise QueryError(f"Unexpected {kind!r}")
+        field, op, value = self.take()[1]
+        fields = (field,) if field else self.default_fields
+        self.fields.update(fields)
+        return _Term(fields, op, value)
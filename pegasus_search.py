@@ -0,0 +1,318 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Keyword search over parsed game records. """
+
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from pegasus_metadata import EAGER_FIELDS, record_fields
+
+SEARCH_FIELDS = ("game", "file", "description", "developer", "publisher", "genre", "release", "players")
+
+_TOKEN = re.compile(r"\w+")
+
+# Sequel numbers are written both ways ("Street Fighter II" / "street fighter 2")
+_ROMAN_NUMERALS = {"ii": "2", "iii": "3", "iv": "4", "vi": "6", "vii": "7", "viii": "8", "ix": "9",
+                   "xi": "11", "xii": "12", "xiii": "13"}
+
+
+def tokenize(text):
+    """ Splits text into casefolded word tokens. """
+    return _TOKEN.findall(text.casefold())
+
+
+class SearchIndex:
+    """ Per-field inverted index (token -> record ids) over a list of game records.
+
+    A search first narrows the candidates with the posting lists and then runs
+    the exact substring check only on those, so results match a full scan.
+    A field's postings are built the first time it is searched.
+
+    Searches may run in a worker thread while records are still being
+    appended: lock guards the postings, which both sides update. Postings are
+    built without it and only merged in under it, so a long first build in the
+    worker does not hold up index_new() in the thread that appends records.
+    """
+
+    def __init__(self, records, fields=SEARCH_FIELDS):
+        self.records = records
+        self.fields = tuple(fields)
+        self.postings = {}  # Built for a field on its first search
+        self._indexed = {}  # field -> number of records already in its postings
+        self._vocabularies = {}
+        self.lock = threading.RLock()
+
+    def index_new(self):
+        """ Indexes the records appended since the last call for the fields searched so far. """
+        with self.lock:
+            fields = list(self.postings)
+        self._index(fields)
+
+    def _index(self, fields):
+        """ Adds the records not yet indexed for fields, decoding each record once for all of them. """
+        records = self.records
+        end = len(records)
+        with self.lock:
+            starts = {field: self._indexed.get(field, 0) for field in fields}
+        fields = [field for field in fields if starts[field] < end]
+        if not fields:
+            return
+        # Mapped records only keep game/file in memory; other fields are decoded once per record here
+        materialize = not set(fields) <= set(EAGER_FIELDS)
+        built = {field: {} for field in fields}
+        targets = [(field, built[field], starts[field]) for field in fields]
+        findall = _TOKEN.findall
+        for record_id in range(min(start for _, _, start in targets), end):
+            record = records[record_id]
+            if materialize:
+                record = record_fields(record)
+            for field, postings, start in targets:
+                if record_id < start:
+                    continue
+                value = record.get(field)
+                if not value:
+                    continue
+                for token in set(findall(value.casefold())):
+                    ids = postings.get(token)
+                    if ids is None:
+                        postings[token] = [record_id]
+                    else:
+                        ids.append(record_id)
+        with self.lock:
+            for field in fields:
+                self._merge(field, built[field], starts[field], end)
+
+    def _merge(self, field, built, start, end):
+        """ Adds the postings built for records[start:end] of field, minus those another thread added meanwhile. """
+        indexed = self._indexed.get(field, 0)
+        if indexed >= end:
+            return
+        postings = self.postings.get(field)
+        if postings is None:
+            self.postings[field] = built  # First build of the field: swapped in whole
+        else:
+            for token, ids in built.items():
+                if indexed > start:
+                    ids = ids[bisect_left(ids, indexed):]
+                    if not ids:
+                        continue
+                known = postings.get(token)
+                if known is None:
+                    postings[token] = ids
+                else:
+                    known.extend(ids)
+        self._indexed[field] = end
+        self._vocabularies.pop(field, None)
+
+    def _vocabulary(self, field):
+        """ Tokens of a field joined into one string, so substring lookups run in str.find. """
+        vocabulary = self._vocabularies.get(field)
+        if vocabulary is None:
+            tokens = sorted(self.postings[field])
+            starts = []
+            position = 0
+            for token in tokens:
+                starts.append(position)
+                position += len(token) + 1
+            vocabulary = (tokens, starts, "\n".join(tokens))
+            self._vocabularies[field] = vocabulary
+        return vocabulary
+
+    def tokens_containing(self, field, query_token):
+        """ Indexed tokens of field that contain query_token. """
+        tokens, starts, blob = self._vocabulary(field)
+        found = []
+        position = blob.find(query_token)
+        while position != -1:
+            token_number = bisect_right(starts, position) - 1
+            found.append(tokens[token_number])
+            if token_number + 1 == len(starts):
+                break
+            position = blob.find(query_token, starts[token_number + 1])
+        return found
+
+    def _field_candidates(self, field, query_tokens):
+        """ Ids of records whose field has, for every query token, a token containing it. """
+        if field not in self.fields:
+            return None  # Field not indexed: caller must scan
+        postings = self.postings.get(field, {})
+        candidates = None
+        for query_token in query_tokens:
+            ids = set()
+            # The keyword may start or end in the middle of a word, so match inside tokens
+            for token in self.tokens_containing(field, query_token):
+                ids.update(postings[token])
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return candidates
+
+    def candidates(self, keyword, fields):
+        """ Superset of the ids matching keyword in any of fields, or None when a full scan is needed. """
+        query_tokens = sorted(set(tokenize(keyword)), key=len, reverse=True)
+        if not query_tokens:
+            return None
+        self._index([field for field in fields if field in self.fields])
+        with self.lock:
+            result = set()
+            for field in fields:
+                ids = self._field_candidates(field, query_tokens)
+                if ids is None:
+                    return None
+                result |= ids
+            # Records appended since the postings were brought up to date are checked by the caller
+            indexed = min((self._indexed.get(field, 0) for field in fields), default=len(self.records))
+            result.update(range(indexed, len(self.records)))
+        return result
+
+    def search_ids(self, keyword, fields, within=None, cancelled=None):
+        """ Ids (in source order) of the records where keyword is a substring of any of fields.
+
+        within restricts the search to earlier results (sorted ids), e.g. those
+        of a keyword the new one contains. cancelled is polled while checking
+        candidates; once it returns True the search stops and returns None.
+        """
+        keyword = keyword.casefold()
+        fields = list(fields)
+        if within is not None:
+            candidate_ids = within
+        else:
+            candidate_ids = self.candidates(keyword, fields)
+            if candidate_ids is None:
+                candidate_ids = range(len(self.records))
+            if not isinstance(candidate_ids, range):
+                candidate_ids = sorted(candidate_ids)
+        records = self.records
+        materialize = not set(fields) <= set(EAGER_FIELDS)
+        found = []
+        for number, record_id in enumerate(candidate_ids):
+            if cancelled is not None and number % 1024 == 0 and cancelled():
+                return None
+            record = record_fields(records[record_id]) if materialize else records[record_id]
+            if any(keyword in record.get(field, "").casefold() for field in fields):
+                found.append(record_id)
+        return found
+
+    def search(self, keyword, fields):
+        """ Records (in source order) where keyword is a substring of any of fields. """
+        return [self.records[record_id] for record_id in self.search_ids(keyword, fields)]
+
+
+def fuzzy_tokens(text):
+    """ Casefolded word tokens with roman numerals written as digits. """
+    return [_ROMAN_NUMERALS.get(token, token) for token in tokenize(text)]
+
+
+def trigrams(text):
+    """ Set of the 3-character grams of every token, padded like pg_trgm ("  s", " st", ..., "et "). """
+    grams = set()
+    for token in fuzzy_tokens(text):
+        padded = "  " + token + " "
+        grams.update(padded[position:position + 3] for position in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """ Trigram postings over a set of fields, for ranked fuzzy matching of game records.
+
+    A record's trigrams are those of all its indexed fields together. search()
+    only counts the postings of the query's rarest trigrams (up to
+    count_budget ids), so it does not touch the whole source, and then rescores
+    the best candidates exactly.
+
+    Pickling keeps the postings but not the records: a cached copy is loaded
+    into an index over the same records with restore().
+    """
+
+    VERSION = 1  # Part of cache_name(); bumped when trigrams() changes
+
+    def __init__(self, records, fields, count_budget=200000):
+        self.records = records
+        self.fields = tuple(fields)
+        self.count_budget = count_budget
+        self.postings = {}
+        self.sizes = array('I')  # Number of trigrams of each indexed record
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        return {"fields": self.fields, "count_budget": self.count_budget, "postings": self.postings, "sizes": self.sizes}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.records = []
+        self.lock = threading.RLock()
+
+    def cache_name(self):
+        return f"trigrams{self.VERSION}:{','.join(self.fields)}"
+
+    def restore(self, cached):
+        """ Takes the postings of an unpickled index that was built over the same records. """
+        with self.lock:
+            self.postings = cached.postings
+            self.sizes = cached.sizes
+
+    @property
+    def indexed(self):
+        return len(self.sizes)
+
+    def record_trigrams(self, record):
+        record = record_fields(record) if not set(self.fields) <= set(EAGER_FIELDS) else record
+        grams = set()
+        for field in self.fields:
+            value = record.get(field)
+            if value:
+                grams |= trigrams(value)
+        return grams
+
+    def update(self):
+        """ Indexes the records appended since the last call; returns True if there were any. """
+        with self.lock:
+            records = self.records
+            first_id = len(self.sizes)
+            if first_id >= len(records):
+                return False
+            postings = self.postings
+            for record_id in range(first_id, len(records)):
+                grams = self.record_trigrams(records[record_id])
+                self.sizes.append(len(grams))
+                for gram in grams:
+                    ids = postings.get(gram)
+                    if ids is None:
+                        postings[gram] = array('I', (record_id,))
+                    else:
+                        ids.append(record_id)
+            return True
+
+    def search(self, query, limit=50, min_score=0.4):
+        """ Up to limit (record id, score) pairs, best first. score is the share of the query's trigrams found. """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        with self.lock:
+            lists = sorted((self.postings.get(gram, ()) for gram in query_grams), key=len)
+            hits = {}
+            counted = 0
+            for ids in lists:
+                # Common trigrams say little about a match; the rarest ones always count
+                if counted and counted + len(ids) > self.count_budget:
+                    break
+                counted += len(ids)
+                for record_id in ids:
+                    hits[record_id] = hits.get(record_id, 0) + 1
+            shortlist = heapq.nlargest(limit * 4, hits, key=hits.__getitem__)
+            sizes = self.sizes
+
+        results = []
+        for record_id in shortlist:
+            common = len(query_grams & self.record_trigrams(self.records[record_id]))
+            score = common / len(query_grams)
+            if score >= min_score:
+                # Ties go to the closer match (fewer trigrams that are not in the query)
+                similarity = common / (len(query_grams) + sizes[record_id] - common)
+                results.append((score, similarity, record_id))
+        results.sort(key=lambda result: (-result[0], -result[1], result[2]))
+        return [(record_id, round(score, 3)) for score, _, record_id in results[:limit]]
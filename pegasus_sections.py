@@ -0,0 +1,85 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Metadata files holding several collections, one section per `collection:` block.
+
+index_sections finds the byte range and game count of every section with two
+regular expression passes over the raw bytes, without parsing any record, so a
+file with many collections opens at once and only the section being edited is
+parsed. Anything before the first collection belongs to the first section.
+"""
+
+import re
+
+from pegasus_metadata import COLLECTION, iter_metadata_lines
+
+# Same rule as the parser: a key starts at the first column of its line, in any case
+_COLLECTION_LINE = re.compile(rb"^collection[ \t]*:[ \t]*([^\r\n]*)", re.M | re.I)
+_FILE_LINE = re.compile(rb"^file[ \t]*:", re.M | re.I)  # One per game; collections use "files:"
+
+
+class Section:
+    """ One collection of a metadata file: data[start:end], whose `collection:` line is at header_start. """
+
+    __slots__ = ("number", "name", "start", "header_start", "end", "game_count")
+
+    def __init__(self, number, name, start, header_start, end, game_count):
+        self.number = number
+        self.name = name
+        self.start = start
+        self.header_start = header_start
+        self.end = end
+        self.game_count = game_count
+
+    @property
+    def byte_range(self):
+        return self.start, self.end
+
+    def label(self):
+        return f"{self.name or 'Untitled'} ({self.game_count} games)"
+
+    def __repr__(self):
+        return f"Section({self.number}, {self.name!r}, bytes {self.start}-{self.end}, {self.game_count} games)"
+
+
+def index_sections(data):
+    """ Sections of the bytes of a metadata file, in file order; a file with no collection is one section. """
+    matches = list(_COLLECTION_LINE.finditer(data))
+    if not matches:
+        return [Section(0, "", 0, 0, len(data), len(_FILE_LINE.findall(data)))]
+    starts = [0] + [match.start() for match in matches[1:]]
+    ends = starts[1:] + [len(data)]
+    sections = []
+    for number, (match, start, end) in enumerate(zip(matches, starts, ends)):
+        name = match.group(1).decode('utf-8', errors='replace').strip()
+        game_count = sum(1 for _ in _FILE_LINE.finditer(data, start, end))
+        sections.append(Section(number, name, start, match.start(), end, game_count))
+    return sections
+
+
+def read_sections(file_name):
+    """ index_sections of a file. """
+    with open(file_name, 'rb') as file:
+        return index_sections(file.read())
+
+
+def section_lines(binary_file, length):
+    """ Yields the lines of binary_file from its current position, until length bytes were read. """
+    while length > 0:
+        line = binary_file.readline()
+        if not line:
+            return
+        length -= len(line)
+        yield line
+
+
+def section_header(file_name, section):
+    """ Header fields of one section of a file. """
+    with open(file_name, 'rb') as file:
+        file.seek(section.header_start)
+        lines = section_lines(file, section.end - section.header_start)
+        for kind, fields in iter_metadata_lines(line.decode('utf-8', errors='replace') for line in lines):
+            if kind == COLLECTION:
+                return fields
+            break
+    return {}
@@ -0,0 +1,80 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" The editor's session: open files, layout, search settings and unsaved changes, kept between runs.
+
+The session is a small JSON file in the cache directory (or SESSION_ENV),
+written when the editor closes. The files it names are opened again at the
+next start, through the parse cache, so a restored session costs no parsing
+while the files are unchanged.
+"""
+
+import json
+import os
+import tempfile
+
+from pegasus_cache import default_cache_dir
+from pegasus_collection import GameRecord
+
+SESSION_ENV = "PEGASUS_EDITOR_SESSION"
+SESSION_VERSION = 1
+
+
+def default_session_path():
+    return os.environ.get(SESSION_ENV) or os.path.join(default_cache_dir(), "session.json")
+
+
+def encode_games(games):
+    return [[game.game, game.abs_path, game.launch, game.console] for game in games]
+
+
+def decode_games(encoded):
+    return [GameRecord(*fields) for fields in encoded]
+
+
+def _is_games(encoded):
+    """ True when encoded is what encode_games writes. """
+    return isinstance(encoded, list) and all(
+        isinstance(fields, list) and len(fields) == 4 and all(isinstance(value, str) for value in fields[:3])
+        and (fields[3] is None or isinstance(fields[3], str))
+        for fields in encoded
+    )
+
+
+def _is_strings(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _is_valid(session):
+    return (_is_games(session.get("additions", [])) and _is_games(session.get("removals", []))
+            and _is_strings(session.get("source_files", [])) and _is_strings(session.get("fields", []))
+            and isinstance(session.get("collection_file") or "", str) and isinstance(session.get("keyword", ""), str)
+            and isinstance(session.get("names", {}), dict) and _is_strings(list(session.get("names", {}).values()))
+            and isinstance(session.get("splitter_sizes", []), list)
+            and all(isinstance(size, int) for size in session.get("splitter_sizes", [])))
+
+
+def load_session(path=None):
+    """ The saved session as a dict; empty when there is none or it cannot be read, e.g. truncated or from another version. """
+    try:
+        with open(path or default_session_path(), encoding='utf-8') as file:
+            session = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(session, dict) or session.get("version") != SESSION_VERSION or not _is_valid(session):
+        return {}
+    return session
+
+
+def save_session(session, path=None):
+    """ Writes session (a JSON-serializable dict); failures are ignored, the session is only a convenience. """
+    path = path or default_session_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            json.dump(dict(session, version=SESSION_VERSION), file, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError:
+        return
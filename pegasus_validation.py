@@ -0,0 +1,176 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Checks that the files of the games exist, with many stat calls in flight at once.
+
+On network shares each stat is a round trip, so paths are checked from a
+thread pool. Every file is stat'ed, and its size and modification time are
+remembered by path, so a file rewritten in place is reported as changed. The
+folder's modification time is remembered too: while it is unchanged no file
+was added or renamed in it, so the files missing from it are not looked up again.
+"""
+
+import os
+import pickle
+import stat
+import tempfile
+import zlib
+
+from pegasus_cache import default_cache_dir
+
+OK = "ok"
+MISSING = "missing"          # No file at the path (or the folder is gone)
+CHANGED = "changed"          # Size or modification time differ from the last check
+UNREADABLE = "unreadable"    # stat failed for another reason, e.g. a share that is offline or denied
+
+DEFAULT_WORKERS = 32
+BATCH_SIZE = 256  # Paths stat'ed by one task
+
+STATE_FILE = "file_checks.state"  # Not ".cache": ParseCache evicts and clears every file with that suffix
+_MAGIC = b"PCEF2\n"
+
+
+def _stat_file(path):
+    """ (status, (size, mtime_ns)) of one path, before comparing with the cache. """
+    try:
+        result = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return MISSING, None
+    except OSError:
+        return UNREADABLE, None
+    if not stat.S_ISREG(result.st_mode):
+        return MISSING, None
+    return OK, (result.st_size, result.st_mtime_ns)
+
+
+def _stat_batch(items):
+    return [_stat_file(os.path.join(directory, name)) for directory, name in items]
+
+
+def _directory_mtime(directory):
+    try:
+        return os.stat(directory).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    except OSError:
+        return UNREADABLE
+
+
+class FileChecker:
+    """ Status (OK, MISSING, CHANGED or UNREADABLE) of game files, remembered between runs in cache_file.
+
+    CHANGED is reported when the size or modification time of a file differ
+    from the last check. Only missing files in unchanged folders are not stat'ed.
+    """
+
+    def __init__(self, cache_file=None, workers=DEFAULT_WORKERS):
+        self.cache_file = cache_file or os.path.join(default_cache_dir(), STATE_FILE)
+        self.workers = workers
+        self._folders = None  # directory -> (mtime_ns, {file name: (size, mtime_ns)}, {missing file names})
+
+    def folders(self):
+        if self._folders is None:
+            self._folders = self._read()
+        return self._folders
+
+    def check(self, paths, progress=None, cancelled=None):
+        """ {path: status} for absolute paths; None if cancelled() became True.
+
+        progress(done, total) is called as batches of paths finish.
+        """
+        by_directory = {}
+        for path in set(paths):
+            directory, file_name = os.path.split(path)
+            by_directory.setdefault(directory, []).append(file_name)
+        folders = self.folders()
+        total = len(by_directory) + sum(len(names) for names in by_directory.values())
+        done = 0
+
+        from concurrent.futures import ThreadPoolExecutor  # Imported on first use: slow to import
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            directories = list(by_directory)
+            mtimes = dict(zip(directories, executor.map(_directory_mtime, directories)))
+            done += len(directories)
+
+            statuses = {}
+            to_stat = []
+            for directory, names in by_directory.items():
+                mtime = mtimes[directory]
+                if mtime is None or mtime == UNREADABLE:
+                    status = MISSING if mtime is None else UNREADABLE
+                    statuses.update((os.path.join(directory, name), status) for name in names)
+                    if mtime is None:
+                        folders.pop(directory, None)
+                    done += len(names)
+                    continue
+                cached_mtime, _, missing = folders.get(directory, (None, {}, set()))
+                for name in names:
+                    if cached_mtime == mtime and name in missing:
+                        # Folder unchanged: no file was added to it since it was found missing
+                        statuses[os.path.join(directory, name)] = MISSING
+                        done += 1
+                    else:
+                        to_stat.append((directory, name))
+
+            batches = [to_stat[start:start + BATCH_SIZE] for start in range(0, len(to_stat), BATCH_SIZE)]
+            futures = [executor.submit(_stat_batch, batch) for batch in batches]
+            if progress is not None:
+                progress(done, total)
+            seen = {}  # directory -> ({file name: signature}, {missing file names})
+            for batch, future in zip(batches, futures):
+                if cancelled is not None and cancelled():
+                    for pending in futures:
+                        pending.cancel()
+                    return None
+                for (directory, name), (status, signature) in zip(batch, future.result()):
+                    found, missing = seen.setdefault(directory, ({}, set()))
+                    if status == OK:
+                        previous = folders.get(directory, (None, {}, set()))[1].get(name)
+                        if previous is not None and previous != signature:
+                            status = CHANGED
+                        found[name] = signature
+                    elif status == MISSING:
+                        missing.add(name)
+                    statuses[os.path.join(directory, name)] = status
+                done += len(batch)
+                if progress is not None:
+                    progress(done, total)
+
+        for directory, (found, missing) in seen.items():
+            cached_mtime, cached_files, cached_missing = folders.get(directory, (None, {}, set()))
+            if cached_mtime != mtimes[directory]:
+                # Files added to a changed folder may be among the ones missing before
+                cached_missing = set()
+            cached_files.update(found)
+            for name in missing:
+                cached_files.pop(name, None)
+            cached_missing.difference_update(found)
+            cached_missing.update(missing)
+            folders[directory] = (mtimes[directory], cached_files, cached_missing)
+        return statuses
+
+    def save(self):
+        """ Writes what was seen to cache_file; failures are ignored, the cache is only an optimization. """
+        if self._folders is None:
+            return
+        directory = os.path.dirname(self.cache_file)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            payload = zlib.compress(pickle.dumps(self._folders, protocol=pickle.HIGHEST_PROTOCOL), 1)
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(descriptor, 'wb') as entry:
+                entry.write(_MAGIC)
+                entry.write(payload)
+            os.replace(temp_path, self.cache_file)
+        except OSError:
+            return
+
+    def _read(self):
+        try:
+            with open(self.cache_file, 'rb') as entry:
+                if entry.read(len(_MAGIC)) != _MAGIC:
+                    return {}
+                return pickle.loads(zlib.decompress(entry.read()))
+        except (OSError, EOFError, zlib.error, pickle.UnpicklingError, ValueError):
+            return {}
@@ -0,0 +1,336 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Model/view game lists: one model row per game, painted by a delegate instead of per-row widgets. """
+
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from PyQt5.QtGui import QColor, QPen, QPainter
+from PyQt5.QtCore import Qt, QAbstractListModel, QItemSelection, QItemSelectionModel, QModelIndex, QRect, QSize, QEvent, pyqtSignal
+
+from pegasus_validation import CHANGED, MISSING, UNREADABLE
+
+# Row states
+NORMAL = "normal"
+DUPLICATE = "duplicate"  # Already in the custom collection, no button
+ADDED = "added"          # Staged to be added on save
+REMOVED = "removed"      # Staged to be removed on save
+
+GameRole = Qt.UserRole + 1
+StateRole = Qt.UserRole + 2
+FileStatusRole = Qt.UserRole + 3
+
+INSERT_BATCH_SIZE = 5000
+# Above this many separate places to insert at (or ranges to remove), the rows are rebuilt in one pass and the
+# views reset, instead of shifting the lists once per place
+MAX_ROW_BLOCKS = 32
+
+_TEXT_COLORS = {
+    NORMAL: QColor("#f0f0f0"),
+    DUPLICATE: QColor("gray"),
+    ADDED: QColor("#62c471"),  # light green
+    REMOVED: QColor("gray"),
+}
+
+# Names of games whose file failed the last check
+_FILE_STATUS_COLORS = {
+    MISSING: QColor("#e06c6c"),  # red
+    UNREADABLE: QColor("#e06c6c"),
+    CHANGED: QColor("#e5c07b"),  # amber
+}
+
+_FILE_STATUS_TIPS = {
+    MISSING: "File not found",
+    UNREADABLE: "File could not be checked",
+    CHANGED: "File changed since the last check",
+}
+
+
+class GameListModel(QAbstractListModel):
+    """ Flat list of (name, game, state) rows, stored as one list per column.
+
+    key(game) gives any hashable the caller uses to find rows again
+    (rows_for), so a change to one game only touches the rows that show it.
+    The lookup table is built on the first rows_for call. file_statuses maps
+    the same keys to the result of the last file check, for games that failed it.
+    """
+
+    def __init__(self, key=None, parent=None):
+        super().__init__(parent)
+        self.key_of = key or (lambda game: game)
+        self._names = []
+        self._games = []
+        self._states = []
+        self._rows_by_key = None  # key -> row number, or a list of them when several rows share it
+        self.file_statuses = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._games)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self._names[row]
+        if role == StateRole:
+            return self._states[row]
+        if role == GameRole:
+            return self._games[row]
+        if role == FileStatusRole:
+            return self.file_statuses.get(self.key_of(self._games[row])) if self.file_statuses else None
+        if role == Qt.ToolTipRole:
+            status = self.data(index, FileStatusRole)
+            if status is not None:
+                return f"{_FILE_STATUS_TIPS[status]}: {self._games[row].abs_path}"
+            if self._states[row] == DUPLICATE:
+                return "Already exists in the custom collection"
+        return None
+
+    def clear(self):
+        self.beginResetModel()
+        self._names = []
+        self._games = []
+        self._states = []
+        self._rows_by_key = None
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        """ Replaces the contents with (name, game, state) rows, inserted in batches. """
+        self.clear()
+        self.append_rows(rows)
+
+    def append_rows(self, rows):
+        rows = list(rows)
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+            first = len(self._games)
+            self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+            for name, game, state in batch:
+                self._names.append(name)
+                self._games.append(game)
+                self._states.append(state)
+            if self._rows_by_key is not None:
+                for number, row in enumerate(batch, first):
+                    self._index_row(self.key_of(row[1]), number)
+            self.endInsertRows()
+
+    def _position(self, key, sort_key, low):
+        """ bisect_left of key among the rows from low on, comparing sort_key(game); no list of keys is built. """
+        games = self._games
+        high = len(games)
+        while low < high:
+            middle = (low + high) // 2
+            if sort_key(games[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def insert_sorted(self, rows, sort_key):
+        """ Inserts rows at their place in a list already ordered by sort_key(game).
+
+        Rows going to the same place are inserted together, with one insert
+        signal; many separate places are merged into the lists in one pass.
+        """
+        blocks = []  # [position, [rows]], in order
+        position = 0
+        for row in sorted(rows, key=lambda row: sort_key(row[1])):
+            position = self._position(sort_key(row[1]), sort_key, position)
+            if blocks and blocks[-1][0] == position:
+                blocks[-1][1].append(row)
+            else:
+                blocks.append([position, [row]])
+        if not blocks:
+            return
+        if len(blocks) > MAX_ROW_BLOCKS:
+            self.beginResetModel()
+            merged = []
+            for number, column in enumerate(self._columns()):
+                values = []
+                start = 0
+                for position, block in blocks:
+                    values.extend(column[start:position])
+                    values.extend(row[number] for row in block)
+                    start = position
+                values.extend(column[start:])
+                merged.append(values)
+            self._names, self._games, self._states = merged
+            self._rows_by_key = None
+            self.endResetModel()
+            return
+        # From the bottom up, so the positions of the blocks above stay valid
+        for position, block in reversed(blocks):
+            self.beginInsertRows(QModelIndex(), position, position + len(block) - 1)
+            for column, new in zip(self._columns(), zip(*block)):
+                column[position:position] = new
+            self.endInsertRows()
+        self._rows_by_key = None
+
+    def remove_rows(self, row_numbers):
+        """ Removes rows, one contiguous range at a time from the bottom up, or in one pass when there are many ranges. """
+        row_numbers = set(row_numbers)
+        ranges = []  # [first, last], from the bottom up
+        for number in sorted(row_numbers, reverse=True):
+            if ranges and ranges[-1][0] == number + 1:
+                ranges[-1][0] = number
+            else:
+                ranges.append([number, number])
+        if len(ranges) > MAX_ROW_BLOCKS:
+            self.beginResetModel()
+            for column in self._columns():
+                column[:] = [value for number, value in enumerate(column) if number not in row_numbers]
+            self._rows_by_key = None
+            self.endResetModel()
+            return
+        for first, last in ranges:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for column in self._columns():
+                del column[first:last + 1]
+            self.endRemoveRows()
+        self._rows_by_key = None
+
+    def _columns(self):
+        return self._names, self._games, self._states
+
+    def _index_row(self, key, number):
+        rows = self._rows_by_key.get(key)
+        if rows is None:
+            self._rows_by_key[key] = number
+        elif isinstance(rows, list):
+            rows.append(number)
+        else:
+            self._rows_by_key[key] = [rows, number]
+
+    def rows_for(self, key):
+        """ Numbers of the rows added with key. """
+        if self._rows_by_key is None:
+            self._rows_by_key = {}
+            for number, game in enumerate(self._games):
+                self._index_row(self.key_of(game), number)
+        rows = self._rows_by_key.get(key)
+        if rows is None:
+            return []
+        return rows if isinstance(rows, list) else [rows]
+
+    def game(self, row):
+        return self._games[row]
+
+    def state(self, row):
+        return self._states[row]
+
+    def set_file_statuses(self, statuses):
+        """ Shows the result of a file check: {key: status} of the games that failed it. """
+        self.file_statuses = statuses
+        if self._games:
+            self.dataChanged.emit(self.index(0), self.index(len(self._games) - 1), [FileStatusRole])
+
+    def set_state(self, row, state):
+        if self._states[row] != state:
+            self._states[row] = state
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [StateRole])
+
+    def set_states(self, states):
+        """ Sets many {row: state} at once, with a single dataChanged over the rows that changed. """
+        changed = [row for row, state in states.items() if self._states[row] != state]
+        if not changed:
+            return
+        for row in changed:
+            self._states[row] = states[row]
+        self.dataChanged.emit(self.index(min(changed)), self.index(max(changed)), [StateRole])
+
+
+class GameItemDelegate(QStyledItemDelegate):
+    """ Paints the game name, its state and the toggle button; emits button_clicked(row). """
+
+    button_clicked = pyqtSignal(int)
+
+    ROW_HEIGHT = 34
+    BUTTON_SIZE = 30
+    SPACING = 10
+
+    def __init__(self, button_text="+", button_side="left", parent=None):
+        super().__init__(parent)
+        self.button_texts = {NORMAL: button_text, ADDED: "-", REMOVED: "+"}
+        self.button_side = button_side
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def button_rect(self, rect):
+        top = rect.top() + (rect.height() - self.BUTTON_SIZE) // 2
+        if self.button_side == "left":
+            left = rect.left()
+        else:
+            left = rect.right() - self.BUTTON_SIZE
+        return QRect(left, top, self.BUTTON_SIZE, self.BUTTON_SIZE)
+
+    def paint(self, painter, option, index):
+        state = index.data(StateRole)
+        style = option.widget.style() if option.widget else None
+        if style is not None:
+            style.drawPrimitive(QStyle.PE_PanelItemViewItem, option, painter, option.widget)
+
+        painter.save()
+        rect = option.rect
+        button = self.button_rect(rect)
+        text_rect = QRect(rect)
+        if self.button_side == "left":
+            text_rect.setLeft(button.right() + self.SPACING)
+        else:
+            text_rect.setRight(button.left() - self.SPACING)
+
+        if state != DUPLICATE:
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setPen(QPen(QColor("#555")))
+            painter.setBrush(QColor("#3a3a3a"))
+            painter.drawRoundedRect(button.adjusted(0, 0, -1, -1), 5, 5)
+            painter.setPen(QColor("#f0f0f0"))
+            painter.drawText(button, Qt.AlignCenter, self.button_texts.get(state, "+"))
+
+        font = option.font
+        font.setStrikeOut(state == REMOVED)
+        painter.setFont(font)
+        color = _TEXT_COLORS.get(state, _TEXT_COLORS[NORMAL])
+        if state != REMOVED:
+            color = _FILE_STATUS_COLORS.get(index.data(FileStatusRole), color)
+        painter.setPen(color)
+        name = option.fontMetrics.elidedText(index.data(Qt.DisplayRole), Qt.ElideRight, text_rect.width())
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, name)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+                and index.data(StateRole) != DUPLICATE
+                and self.button_rect(option.rect).contains(event.pos())):
+            self.button_clicked.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class GameListView(QListView):
+    """ QListView wired to its own GameListModel (see there for key) and GameItemDelegate. """
+
+    def __init__(self, button_text="+", button_side="left", key=None, parent=None):
+        super().__init__(parent)
+        self.setModel(GameListModel(key, self))
+        self.delegate = GameItemDelegate(button_text, button_side, self)
+        self.setItemDelegate(self.delegate)
+        self.button_clicked = self.delegate.button_clicked
+        self.setUniformItemSizes(True)  # Lets the view lay out only the visible rows
+        # Ctrl+click picks rows, Shift+click a range, Ctrl+A all; the bulk actions work on the selection
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setMouseTracking(True)
+
+    def selected_rows(self):
+        """ Numbers of the selected rows, in order; read from the selection ranges, not one index per row. """
+        rows = []
+        for selection_range in self.selectionModel().selection():
+            rows.extend(range(selection_range.top(), selection_range.bottom() + 1))
+        return sorted(rows)
+
+    def invert_selection(self):
+        rows = self.model().rowCount()
+        if rows:
+            everything = QItemSelection(self.model().index(0), self.model().index(rows - 1))
+            self.selectionModel().select(everything, QItemSelectionModel.Toggle)
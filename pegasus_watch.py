@@ -0,0 +1,120 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Finding which game records changed when a metadata file is edited on disk.
+
+A FileSnapshot keeps a hash of the bytes of every game record of a file. When
+the file changes, a new snapshot is scanned and compared with the old one:
+records whose bytes are the same are matched by hash wherever they moved, so
+only the records that were really added or edited have to be parsed.
+Snapshots keep no records and no handle on the file, which can be replaced
+(e.g. by a save) while it is watched.
+"""
+
+import hashlib
+
+from pegasus_metadata import COLLECTION, MetadataBuffer
+from pegasus_sections import index_sections
+
+
+def block_hash(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class SnapshotDiff:
+    """ What changed between two snapshots of a file.
+
+    removed are indexes of records of the old snapshot, added indexes of records
+    of the new one, and kept (old index, new index) pairs of identical records.
+    header_changed is True when anything before the first game changed.
+    """
+
+    __slots__ = ("header_changed", "removed", "added", "kept")
+
+    def __init__(self, header_changed, removed, added, kept):
+        self.header_changed = header_changed
+        self.removed = removed
+        self.added = added
+        self.kept = kept
+
+    def __bool__(self):
+        return self.header_changed or bool(self.removed) or bool(self.added)
+
+    def __repr__(self):
+        return (f"SnapshotDiff(header_changed={self.header_changed}, removed={len(self.removed)}, "
+                f"added={len(self.added)}, kept={len(self.kept)})")
+
+
+class FileSnapshot:
+    """ The game and file of every game record of a metadata file, with a hash of the bytes of each.
+
+    ids optionally holds, for every record, the id its owner gave it (e.g. its
+    index in the editor's source records).
+    """
+
+    __slots__ = ("file_name", "header_hash", "games", "files", "hashes", "ids")
+
+    def __init__(self, file_name, header_hash, games, files, hashes, ids=None):
+        self.file_name = file_name
+        self.header_hash = header_hash
+        self.games = games
+        self.files = files
+        self.hashes = hashes
+        self.ids = ids
+
+    @classmethod
+    def scan(cls, file_name, section=None):
+        """ (snapshot, records) of the file as it is now on disk, or of its section number section (see pegasus_sections).
+
+        records are the LazyRecords read, for applying the changes; the snapshot
+        does not keep them.
+        """
+        source = MetadataBuffer(file_name)
+        records = [record for kind, record, _ in source.records() if kind != COLLECTION]
+        start, end = 0, len(source.data)
+        if section is not None:
+            sections = index_sections(source.data)
+            if section >= len(sections):
+                records = []
+                start = end
+            else:
+                start, end = sections[section].byte_range
+                records = [record for record in records if start <= record.start < end]
+        return cls._build(file_name, source.data, records, None, start, end), records
+
+    @classmethod
+    def from_records(cls, file_name, records, ids=None):
+        """ Snapshot of LazyRecords already read from file_name, without reading it again. """
+        data = records[0].source.data if records else MetadataBuffer(file_name).data
+        return cls._build(file_name, data, records, ids)
+
+    @classmethod
+    def _build(cls, file_name, data, records, ids, start=0, end=None):
+        header_end = records[0].start if records else (len(data) if end is None else end)
+        hashes = [block_hash(record.source.data[record.start:record.end]) for record in records]
+        return cls(file_name, block_hash(data[start:header_end]), [record.game for record in records],
+                   [record.file for record in records], hashes, ids)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def pairs(self):
+        """ (game, file) of every record, to tell whether a removed record is still listed by another one. """
+        return set(zip(self.games, self.files))
+
+    def diff(self, new):
+        """ SnapshotDiff from this snapshot to new, a later snapshot of the same file. """
+        positions = {}
+        for index in range(len(self.hashes) - 1, -1, -1):
+            positions.setdefault(self.hashes[index], []).append(index)
+        added = []
+        kept = []
+        for new_index, digest in enumerate(new.hashes):
+            old = positions.get(digest)
+            if old:
+                # Identical copies are paired in file order
+                kept.append((old.pop(), new_index))
+            else:
+                added.append(new_index)
+        removed = sorted(index for indexes in positions.values() for index in indexes)
+        return SnapshotDiff(self.header_hash != new.header_hash, removed, added, kept)
@@ -0,0 +1,391 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+""" Background workers, so that file I/O and parsing stay off the GUI thread. """
+
+import os
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from pegasus_metadata import (COLLECTION, MetadataBuffer, MetadataDocument, StaleMetadataError, iter_metadata_lines,
+                              map_metadata)
+from pegasus_profiling import instrumented
+from pegasus_sections import section_lines
+from pegasus_sources import default_workers, scan_source
+from pegasus_watch import FileSnapshot
+
+CHUNK_SIZE = 2000
+
+
+def _decoded_lines(binary_file, on_progress):
+    """ Yields text lines from a binary file, reporting the bytes consumed so far. """
+    position = 0
+    for raw_line in binary_file:
+        position += len(raw_line)
+        on_progress(position)
+        yield raw_line.decode('utf-8')
+
+
+def _buffered_records(buffer, on_progress):
+    """ Yields (kind, record) from a MetadataBuffer, reporting the bytes scanned so far. """
+    for kind, record, end in buffer.records():
+        on_progress(end)
+        yield kind, record
+
+
+class MetadataLoader(QThread):
+    """ Parses a metadata file in a worker thread and streams the records back in chunks.
+
+    header_loaded(dict) comes first, then games_loaded(list) for every chunk,
+    then loading_finished(bool), with False when the load was cancelled.
+    With lazy=True the file is read into a MetadataBuffer and games come as LazyRecords.
+    byte_range (start, end) limits a non-lazy load to one section of the file;
+    such loads bypass the parse cache, which holds whole files.
+    """
+
+    header_loaded = pyqtSignal(dict)
+    games_loaded = pyqtSignal(list)
+    progress = pyqtSignal(int, int)  # (bytes read, total bytes)
+    loading_finished = pyqtSignal(bool)
+    loading_failed = pyqtSignal(str)
+
+    def __init__(self, file_name, parse_cache=None, chunk_size=CHUNK_SIZE, lazy=False, byte_range=None, parent=None):
+        super().__init__(parent)
+        self.file_name = file_name
+        self.parse_cache = parse_cache if byte_range is None else None
+        self.lazy = lazy
+        self.byte_range = byte_range
+        self.chunk_size = chunk_size
+        self.total_bytes = 0
+        self.bytes_done = 0
+        self.records_loaded = 0
+        self._last_reported = 0
+        self.version = None  # ParseCache.version of the file when the parse started
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def run(self):
+        try:
+            completed = self._load()
+        except (OSError, UnicodeDecodeError, StaleMetadataError) as error:
+            self.loading_failed.emit(str(error))
+            return
+        self.loading_finished.emit(completed)
+
+    @instrumented("parse_file", count=lambda loader, _: loader.records_loaded)
+    def _load(self):
+        cached = self.parse_cache.load(self.file_name, self.lazy) if self.parse_cache else None
+        if cached is not None:
+            self.header_loaded.emit(cached.header)
+            return self._emit_chunks(cached.games)
+        # Taken before reading, so a file rewritten during the parse is not cached as the new version
+        self.version = self.parse_cache.version(self.file_name) if self.parse_cache else None
+
+        if self.lazy:
+            buffer = MetadataBuffer(self.file_name)
+            self.total_bytes = len(buffer)
+            return self._read_records(_buffered_records(buffer, self._report_progress))
+        with open(self.file_name, 'rb') as binary_file:
+            if self.byte_range is not None:
+                start, end = self.byte_range
+                self.total_bytes = end - start
+                binary_file.seek(start)
+                lines = _decoded_lines(section_lines(binary_file, end - start), self._report_progress)
+                return self._read_records(iter_metadata_lines(lines))
+            binary_file.seek(0, 2)
+            self.total_bytes = binary_file.tell()
+            binary_file.seek(0)
+            return self._read_records(iter_metadata_lines(_decoded_lines(binary_file, self._report_progress)))
+
+    def _read_records(self, records):
+        header = None
+        games = []
+        chunk = []
+        for kind, fields in records:
+            if self.isInterruptionRequested():
+                self._flush(chunk)
+                return False
+            if kind == COLLECTION:
+                if header is None:
+                    header = fields
+                    self.header_loaded.emit(header)
+                continue
+            if header is None:
+                header = {}
+                self.header_loaded.emit(header)
+            games.append(fields)
+            chunk.append(fields)
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+
+        if header is None:
+            self.header_loaded.emit({})
+        self._flush(chunk)
+        self.bytes_done = self.total_bytes
+        self.progress.emit(self.total_bytes, self.total_bytes)
+        if self.parse_cache:
+            self.parse_cache.store(self.file_name, self.version, MetadataDocument(header or {}, games), self.lazy)
+        return True
+
+    def _emit_chunks(self, games):
+        # From the cache, progress is counted in games instead of bytes
+        total = len(games)
+        self.total_bytes = total
+        for start in range(0, total, self.chunk_size):
+            if self.isInterruptionRequested():
+                return False
+            self._flush(games[start:start + self.chunk_size])
+            self.bytes_done = min(start + self.chunk_size, total)
+            self.progress.emit(self.bytes_done, total)
+        return True
+
+    def _flush(self, chunk):
+        if chunk:
+            self.records_loaded += len(chunk)
+            self.games_loaded.emit(chunk)
+
+    def _report_progress(self, position):
+        self.bytes_done = position
+        # Throttled to roughly one signal per percent
+        if position - self._last_reported >= max(self.total_bytes // 100, 1):
+            self._last_reported = position
+            self.progress.emit(position, self.total_bytes)
+
+
+class SourcesLoader(QThread):
+    """ Loads several source files, each scanned in a process of a pool, and streams their records back.
+
+    For every file, in the order they finish: header_loaded(file_name, dict)
+    and then games_loaded(file_name, list) for every chunk. Files that cannot
+    be read are listed in failed; loading_finished(bool) ends the load, with
+    False when it was cancelled.
+    """
+
+    header_loaded = pyqtSignal(str, dict)
+    games_loaded = pyqtSignal(str, list)
+    progress = pyqtSignal(int, int)  # (bytes of the files scanned, total bytes)
+    loading_finished = pyqtSignal(bool)
+    loading_failed = pyqtSignal(str)
+
+    def __init__(self, file_names, parse_cache=None, workers=None, chunk_size=CHUNK_SIZE, parent=None):
+        super().__init__(parent)
+        self.file_names = list(file_names)
+        self.file_name = ", ".join(self.file_names)
+        self.cache_directory = parse_cache.directory if parse_cache else None
+        self.workers = workers or default_workers(len(self.file_names))
+        self.chunk_size = chunk_size
+        self.total_bytes = 0
+        self.bytes_done = 0
+        self.records_loaded = 0
+        self.failed = []  # "file: error" of the files that could not be read
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def run(self):
+        try:
+            completed = self._load()
+        except OSError as error:  # The pool itself could not start
+            self.loading_failed.emit(str(error))
+            return
+        self.loading_finished.emit(completed)
+
+    @instrumented("parse_files", count=lambda loader, _: loader.records_loaded)
+    def _load(self):
+        sizes = {}
+        for file_name in self.file_names:
+            try:
+                sizes[file_name] = os.path.getsize(file_name)
+            except OSError as error:
+                self.failed.append(f"{file_name}: {error}")
+        self.total_bytes = sum(sizes.values())
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed  # Imported on first use: slow to import
+
+        # Not forked: a child of this process would inherit Qt and the locks held by its other threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+            futures = {executor.submit(scan_source, file_name, self.cache_directory): file_name for file_name in sizes}
+            for future in as_completed(futures):
+                if self.isInterruptionRequested():
+                    for pending in futures:
+                        pending.cancel()
+                    return False
+                file_name = futures[future]
+                try:
+                    header, records = self._records(future.result(), file_name)
+                except (OSError, UnicodeDecodeError, StaleMetadataError) as error:
+                    self.failed.append(f"{file_name}: {error}")
+                else:
+                    self.header_loaded.emit(file_name, header)
+                    for start in range(0, len(records), self.chunk_size):
+                        chunk = records[start:start + self.chunk_size]
+                        self.records_loaded += len(chunk)
+                        self.games_loaded.emit(file_name, chunk)
+                self.bytes_done += sizes[file_name]
+                self.progress.emit(self.bytes_done, self.total_bytes)
+        return True
+
+    @staticmethod
+    def _records(batch, file_name):
+        """ Header and LazyRecords of a scanned file; scanned again here if it changed after the worker read it. """
+        try:
+            return batch.header, batch.records()
+        except StaleMetadataError:
+            document = map_metadata(file_name)
+            return document.header, document.games
+
+
+class CatalogUpdater(QThread):
+    """ Brings the library catalog up to date with the metadata files under roots in a worker thread.
+
+    Reports progress in files through the same signals as MetadataLoader;
+    summary holds the result of Catalog.update once loading_finished(True) is
+    emitted.
+    """
+
+    progress = pyqtSignal(int, int)  # (files checked, total files)
+    loading_finished = pyqtSignal(bool)
+    loading_failed = pyqtSignal(str)
+
+    def __init__(self, catalog, roots, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.roots = roots
+        self.file_name = catalog.path
+        self.total_bytes = 0
+        self.bytes_done = 0
+        self.records_loaded = 0
+        self.summary = None
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def run(self):
+        from pegasus_catalog import CatalogError  # Loaded with the catalog; not needed before
+
+        try:
+            self.summary = self.catalog.update(self.roots, self._report_progress, self.isInterruptionRequested)
+        except CatalogError as error:
+            self.loading_failed.emit(str(error))
+            return
+        if self.summary is not None:
+            self.records_loaded = self.summary["games"]
+        self.loading_finished.emit(self.summary is not None)
+
+    def _report_progress(self, done, total):
+        self.bytes_done = done
+        self.total_bytes = total
+        self.progress.emit(done, total)
+
+
+class FileCheckWorker(QThread):
+    """ Checks the files at paths with a FileChecker in a worker thread and saves what it saw.
+
+    Reports progress through the same signals as MetadataLoader; statuses
+    ({path: status}) is set once loading_finished(True) is emitted.
+    """
+
+    progress = pyqtSignal(int, int)  # (paths and folders checked, total)
+    loading_finished = pyqtSignal(bool)
+    loading_failed = pyqtSignal(str)
+
+    def __init__(self, checker, paths, parent=None):
+        super().__init__(parent)
+        self.checker = checker
+        self.paths = paths
+        self.file_name = checker.cache_file
+        self.total_bytes = 0
+        self.bytes_done = 0
+        self.records_loaded = 0
+        self.statuses = None
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def run(self):
+        self.statuses = self.checker.check(self.paths, self._report_progress, self.isInterruptionRequested)
+        if self.statuses is not None:
+            self.records_loaded = len(self.statuses)
+            self.checker.save()
+        self.loading_finished.emit(self.statuses is not None)
+
+    def _report_progress(self, done, total):
+        self.bytes_done = done
+        self.total_bytes = total
+        self.progress.emit(done, total)
+
+
+class SnapshotWorker(QThread):
+    """ Takes a FileSnapshot of a watched file in a worker thread, and compares it with the previous one.
+
+    The snapshot is built from records (LazyRecords with their ids) when they
+    are given, else by scanning the file, or only its section number section.
+    snapshot_ready(snapshot, diff, records) gives the new snapshot, its
+    SnapshotDiff from previous, or None without a previous snapshot, and the
+    LazyRecords scanned (None when they were given); snapshot is None when the
+    file could not be read, e.g. while it is being replaced.
+    """
+
+    snapshot_ready = pyqtSignal(object, object, object)
+
+    def __init__(self, file_name, previous=None, records=None, ids=None, section=None, parent=None):
+        super().__init__(parent)
+        self.file_name = file_name
+        self.previous = previous
+        self.records = records
+        self.ids = ids
+        self.section = section
+
+    def run(self):
+        records = None
+        try:
+            if self.records is not None:
+                snapshot = FileSnapshot.from_records(self.file_name, self.records, self.ids)
+            else:
+                snapshot, records = FileSnapshot.scan(self.file_name, self.section)
+        except (OSError, ValueError):  # ValueError includes StaleMetadataError
+            self.snapshot_ready.emit(None, None, None)
+            return
+        diff = self.previous.diff(snapshot) if self.previous is not None else None
+        if not self.isInterruptionRequested():
+            self.snapshot_ready.emit(snapshot, diff, records)
+
+
+class SearchWorker(QThread):
+    """ Runs one search in a worker thread.
+
+    search(cancelled) returns the matching record ids in display order, or
+    None once cancelled() is True. results_ready(generation, ids, games) is
+    only emitted for searches that were not cancelled; games are build(id)
+    for every result that build does not turn into None. generation lets the
+    receiver drop stale results.
+    """
+
+    results_ready = pyqtSignal(int, object, object)
+
+    def __init__(self, search, generation, build=None, parent=None):
+        super().__init__(parent)
+        self.search = search
+        self.generation = generation
+        self.build = build
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def run(self):
+        ids = self.search(self.isInterruptionRequested)
+        if ids is None:
+            return
+        games = []
+        if self.build is not None:
+            for number, record_id in enumerate(ids):
+                if number % 1024 == 0 and self.isInterruptionRequested():
+                    return
+                game = self.build(record_id)
+                if game is not None:
+                    games.append(game)
+        if not self.isInterruptionRequested():
+            self.results_ready.emit(self.generation, ids, games)
@@ -0,0 +1,8 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+import sys
+
+# The modules live at the repository root, next to the editor script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,65 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+import threading
+
+from pegasus_cache import ParseCache
+from pegasus_metadata import parse_metadata
+
+
+def write_source(path, games):
+    path.write_text("collection: Test\n\n" + "".join(f"game: {game}\nfile: {game}.zip\n\n" for game in games),
+                    encoding='utf-8')
+
+
+def test_entries_follow_the_file(tmp_path):
+    source = tmp_path / "metadata.pegasus.txt"
+    write_source(source, ["Alpha"])
+    cache = ParseCache(str(tmp_path / "cache"))
+    assert [game["game"] for game in cache.parse(str(source)).games] == ["Alpha"]
+    assert cache.load(str(source)) is not None
+
+    write_source(source, ["Alpha", "Beta"])
+    assert cache.load(str(source)) is None
+    assert [game["game"] for game in cache.parse(str(source)).games] == ["Alpha", "Beta"]
+
+
+def test_file_changed_while_parsing_is_not_cached(tmp_path):
+    source = tmp_path / "metadata.pegasus.txt"
+    write_source(source, ["Alpha"])
+    cache = ParseCache(str(tmp_path / "cache"))
+    version = cache.version(str(source))
+    document = parse_metadata(str(source))
+    write_source(source, ["Alpha", "Beta"])
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    cache.store(str(source), version, document)
+    cache.store_extra(str(source), version, "index", [1, 2, 3])
+    assert cache.load(str(source)) is None
+    assert cache.load_extra(str(source), "index") is None
+
+
+def test_unpicklable_values_are_skipped(tmp_path):
+    source = tmp_path / "metadata.pegasus.txt"
+    write_source(source, ["Alpha"])
+    cache = ParseCache(str(tmp_path / "cache"))
+    cache.store_extra(str(source), cache.version(str(source)), "lock", threading.Lock())
+    assert cache.load_extra(str(source), "lock") is None
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    source = tmp_path / "metadata.pegasus.txt"
+    write_source(source, ["Alpha"])
+    cache = ParseCache(str(tmp_path / "cache"))
+
+    def replace(source, destination):
+        raise PermissionError("entry in use")
+
+    monkeypatch.setattr(os, "replace", replace)
+    cache.store_extra(str(source), cache.version(str(source)), "index", [1, 2, 3])
+    monkeypatch.undo()
+
+    assert cache.load_extra(str(source), "index") is None
+    assert os.listdir(cache.directory) == []
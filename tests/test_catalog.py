@@ -0,0 +1,29 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+from pegasus_catalog import Catalog
+from pegasus_query import looks_like_query
+
+
+def write_system(root, name, games):
+    folder = root / name
+    folder.mkdir()
+    text = f"collection: {name}\nlaunch: run {{file.path}}\n\n"
+    text += "".join(f"game: {game}\nfile: {game}.zip\n\n" for game in games)
+    (folder / "metadata.pegasus.txt").write_text(text, encoding="utf-8")
+
+
+def test_library_search_accepts_titles_with_connectives(tmp_path):
+    library = tmp_path / "library"
+    library.mkdir()
+    write_system(library, "genesis", ["Sonic and Knuckles", "Streets of Rage"])
+    write_system(library, "snes", ["Do or Die", "Super Metroid"])
+    catalog = Catalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.update([str(library)])
+
+    # The editor sends a library keyword to the catalog only when it is not a query
+    for keyword, expected in (("sonic and knuckles", "Sonic and Knuckles"), ("do or die", "Do or Die")):
+        assert not looks_like_query(keyword)
+        games = catalog.search(keyword, ["game"])
+        assert [game.game for game in games] == [expected]
+        assert games[0].console in ("genesis", "snes")
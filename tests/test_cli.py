@@ -0,0 +1,27 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import pytest
+
+from pegasus_cli import parse_query, select_records
+from pegasus_metadata import MetadataDocument
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("metroid", (["game"], "metroid")),
+    ("genre:shooter", (["genre"], "shooter")),
+    ("game, Description: space pirates", (["game", "description"], "space pirates")),
+    ("x-rating:5", (["x-rating"], "5")),
+    (":shooter", (["game"], "shooter")),
+    ("Zelda: Link's Awakening", (["game"], "Zelda: Link's Awakening")),
+    ("Castlevania: Symphony of the Night", (["game"], "Castlevania: Symphony of the Night")),
+])
+def test_parse_query(text, expected):
+    assert parse_query(text) == expected
+
+
+def test_title_with_colon_is_found():
+    document = MetadataDocument({}, [{"game": "Zelda: Link's Awakening", "file": "zelda.gb"},
+                                     {"game": "Tetris", "file": "tetris.gb"}])
+    selected = select_records(document, [parse_query("Zelda: Link's Awakening")])
+    assert [record["game"] for record in selected] == ["Zelda: Link's Awakening"]
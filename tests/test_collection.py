@@ -0,0 +1,117 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+import stat
+import sys
+
+import pytest
+
+from pegasus_collection import GameRecord, normalize_path, save_collection_file
+from pegasus_sections import read_sections
+
+COLLECTION = (
+    "collection: Old name\r\n"
+    "shortname: old\r\n"
+    "extensions: zip\r\n"
+    "\r\n"
+    "# Alpha\r\n"
+    "file: roms/alpha.zip\r\n"
+    "launch: emu {file.path}\r\n"
+    "description: First line\r\n"
+    "  second line.\r\n"
+    "\r\n"
+    "# Gamma\r\n"
+    "file: roms/gamma.zip\r\n"
+    "launch: emu {file.path}\r\n"
+    "\r\n"
+    "# Zeta\r\n"
+    "file: roms/zeta.zip\r\n"
+    "launch: emu {file.path}\r\n"
+    "\r\n"
+)
+
+
+def _save(path, additions=(), removal_keys=(), byte_range=None):
+    base_dir = os.path.dirname(path)
+    return save_collection_file(str(path), "New name", "new", list(additions), set(removal_keys),
+                                lambda file_path: os.path.join(base_dir, file_path), byte_range)
+
+
+def test_unchanged_records_are_copied_verbatim(tmp_path):
+    path = tmp_path / "collection.metadata.pegasus.txt"
+    path.write_bytes(COLLECTION.encode('utf-8'))
+    beta = GameRecord("Beta", str(tmp_path / "roms" / "beta.zip"), "emu {file.path}")
+    gone = ("Gamma", normalize_path(str(tmp_path / "roms" / "gamma.zip")))
+
+    result = _save(path, [beta], [gone])
+
+    text = path.read_bytes().decode('utf-8')
+    assert text == (
+        "collection: New name\r\n"
+        "shortname: new\r\n"
+        "extensions: zip\r\n"
+        "\r\n"
+        "# Alpha\r\n"
+        "file: roms/alpha.zip\r\n"
+        "launch: emu {file.path}\r\n"
+        "description: First line\r\n"
+        "  second line.\r\n"
+        "\r\n"
+        "# Beta\r\n"
+        f"file: {beta.abs_path}\r\n"
+        "launch: emu {file.path}\r\n"
+        "\r\n"
+        "# Zeta\r\n"
+        "file: roms/zeta.zip\r\n"
+        "launch: emu {file.path}\r\n"
+        "\r\n"
+    )
+    assert [fields["game"] for fields in result.removed] == ["Gamma"]
+    assert result.added == [beta]
+
+
+def test_new_file_uses_unix_line_endings(tmp_path):
+    path = tmp_path / "new.metadata.pegasus.txt"
+    _save(path, [GameRecord("Alpha", str(tmp_path / "alpha.zip"))])
+    text = path.read_bytes().decode('utf-8')
+    assert "\r" not in text
+    assert text.startswith("collection: New name\n")
+    assert f"# Alpha\nfile: {tmp_path / 'alpha.zip'}\nlaunch: none\n\n" in text
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+def test_permissions_are_kept(tmp_path):
+    path = tmp_path / "collection.metadata.pegasus.txt"
+    path.write_bytes(COLLECTION.encode('utf-8'))
+    os.chmod(path, 0o640)
+    _save(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+def test_failed_save_leaves_the_file_alone(tmp_path):
+    path = tmp_path / "collection.metadata.pegasus.txt"
+    path.write_bytes(COLLECTION.encode('utf-8'))
+
+    def resolve_path(file_path):
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        save_collection_file(str(path), "New name", "new", [], {("Alpha", "x")}, resolve_path)
+    assert path.read_bytes() == COLLECTION.encode('utf-8')
+    assert os.listdir(tmp_path) == [path.name]
+
+
+def test_only_the_section_is_rewritten(tmp_path):
+    other = "collection: Other\nshortname: other\n\ngame: Omega\nfile: omega.zip\n\n"
+    path = tmp_path / "metadata.pegasus.txt"
+    path.write_bytes((COLLECTION.replace("\r\n", "\n") + other).encode('utf-8'))
+    first, _ = read_sections(str(path))
+    gone = ("Alpha", normalize_path(str(tmp_path / "roms" / "alpha.zip")))
+
+    _save(path, removal_keys=[gone], byte_range=first.byte_range)
+
+    text = path.read_bytes().decode('utf-8')
+    assert text.endswith("\n\n" + other)
+    assert text.startswith("collection: New name\nshortname: new\nextensions: zip\n\n# Gamma\n")
+    assert "Alpha" not in text
@@ -0,0 +1,214 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import gc
+import importlib.util
+import os
+import time
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QEventLoop, QItemSelection, QItemSelectionModel  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+from pegasus_history import STAGE_ADDITIONS, STAGE_REMOVALS, UNSTAGE_ADDITIONS  # noqa: E402
+from pegasus_views import DUPLICATE  # noqa: E402
+
+EDITOR_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "Pegasus Collection Editor v0.50.py")
+
+
+@pytest.fixture(scope="module")
+def editor_module():
+    application = QApplication.instance() or QApplication([])
+    spec = importlib.util.spec_from_file_location("pegasus_collection_editor", EDITOR_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.application = application  # Kept alive for the module's windows
+    return module
+
+
+@pytest.fixture
+def editor(editor_module, tmp_path, monkeypatch):
+    monkeypatch.setenv("PEGASUS_EDITOR_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("PEGASUS_EDITOR_CATALOG", str(tmp_path / "catalog.sqlite3"))
+    for name in ("information", "warning", "critical"):
+        monkeypatch.setattr(QMessageBox, name, staticmethod(lambda *arguments, **keywords: QMessageBox.Ok))
+    monkeypatch.setattr(QMessageBox, "question", staticmethod(lambda *arguments, **keywords: QMessageBox.No))
+    window = editor_module.PegasusCustomCollectionEditor()
+    yield window
+    window.close()
+    window.deleteLater()
+    # Deleted here, not while the next test's window is loading
+    QApplication.instance().processEvents()
+    gc.collect()
+
+
+def settle(window, timeout=60):
+    """ Processes events until the window's loaders and snapshots of watched files are done. """
+    deadline = time.monotonic() + timeout
+    application = QApplication.instance()
+    while (window.loaders or window.snapshot_workers) and time.monotonic() < deadline:
+        application.processEvents(QEventLoop.AllEvents, 50)
+    application.processEvents()
+    assert not window.loaders and not window.snapshot_workers
+
+
+@pytest.fixture
+def loaded(editor, tmp_path):
+    """ The editor with a source of 20 games, two of which are already in the opened collection. """
+    roms = tmp_path / "roms"
+    source = tmp_path / "metadata.pegasus.txt"
+    source.write_text("collection: Arcade\nlaunch: emu {file.path}\n\n" + "".join(
+        f"game: Game {number:02}\nfile: roms/game{number:02}.zip\n\n" for number in range(20)), encoding='utf-8')
+    collection = tmp_path / "favorites.metadata.pegasus.txt"
+    collection.write_text("collection: Favorites\n\n" + "".join(
+        f"game: Game {number:02}\nfile: {roms / f'game{number:02}.zip'}\n\n" for number in (3, 8)), encoding='utf-8')
+    editor.load_sources([str(source)])
+    settle(editor)
+    editor.load_collection(str(collection), None)
+    settle(editor)
+    editor.test_files = source, collection
+    return editor
+
+
+def select(game_list, *row_ranges):
+    selection = QItemSelection()
+    model = game_list.model()
+    for first, last in row_ranges:
+        selection.select(model.index(first), model.index(last))
+    game_list.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+
+
+def games_at(game_list, rows):
+    model = game_list.model()
+    return {model.game(row).game for row in rows if model.state(row) != DUPLICATE}
+
+
+def added(window):
+    return {game.game for game in window.pending.additions.values()}
+
+
+def removed(window):
+    return {game.game for game in window.pending.removals.values()}
+
+
+def test_bulk_actions_stage_exactly_the_selected_games(loaded):
+    source_list = loaded.source_games_list
+    assert source_list.model().rowCount() == 20
+
+    select(source_list, (1, 4), (7, 9), (15, 15))
+    rows = source_list.selected_rows()
+    assert rows == [1, 2, 3, 4, 7, 8, 9, 15]
+    expected = games_at(source_list, rows)
+    assert "Game 03" not in expected  # Already in the collection
+
+    loaded.bulk_edit([(STAGE_ADDITIONS, loaded.list_games(source_list, selected_only=True))])
+    assert added(loaded) == expected
+
+    select(source_list, (2, 4))
+    loaded.bulk_edit([(UNSTAGE_ADDITIONS, loaded.list_games(source_list, selected_only=True))])
+    assert added(loaded) == expected - games_at(source_list, range(2, 5))
+
+    source_list.invert_selection()
+    assert source_list.selected_rows() == [0, 1] + list(range(5, 20))
+
+    existing_list = loaded.existing_games_list
+    select(existing_list, (1, 1))
+    loaded.bulk_edit([(STAGE_REMOVALS, loaded.list_games(existing_list, selected_only=True))])
+    assert removed(loaded) == {existing_list.model().game(1).game}
+
+
+def test_nothing_selected_stages_nothing(loaded):
+    source_list = loaded.source_games_list
+    source_list.clearSelection()
+    assert loaded.bulk_edit([(STAGE_ADDITIONS, loaded.list_games(source_list, selected_only=True))]) == []
+    assert not loaded.pending.additions
+    assert not loaded.command_log.can_undo()
+
+
+def test_bulk_edit_is_one_undo_step(loaded):
+    source_list = loaded.source_games_list
+    select(source_list, (0, 19))
+    loaded.bulk_edit([(STAGE_ADDITIONS, loaded.list_games(source_list, selected_only=True))])
+    assert len(added(loaded)) == 18
+    loaded.undo()
+    assert not loaded.pending.additions
+    loaded.redo()
+    assert len(added(loaded)) == 18
+
+
+def test_adding_search_results_takes_the_selected_ones(loaded):
+    loaded.field_checkboxes["game"].setChecked(True)
+    loaded.keyword_input.setText("Game 1")
+    loaded.filter_games()
+    results = loaded.selected_games_list
+    assert results.model().rowCount() == 10
+
+    select(results, (0, 0), (5, 6))
+    expected = games_at(results, results.selected_rows())
+    loaded.add_filtered_games()
+    assert added(loaded) == expected
+
+    results.clearSelection()
+    loaded.add_filtered_games()  # Nothing selected: every result
+    assert added(loaded) == games_at(results, range(10))
+
+
+def edited_on_disk(window, path, text):
+    """ Rewrites a watched file as another program would, and lets the window apply the change. """
+    stat = os.stat(path) if path.exists() else None
+    path.write_text(text, encoding='utf-8')
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    window.on_watched_file_changed(str(path))
+    window.process_changed_files()
+    settle(window)
+
+
+def source_games(window):
+    model = window.source_games_model
+    return [model.game(row).game for row in range(model.rowCount())]
+
+
+def test_source_edits_on_disk_are_applied(loaded):
+    source, _ = loaded.test_files
+    text = source.read_text(encoding='utf-8')
+    # Game 05 is rewritten to the same size, everything after Game 09 is cut
+    text = text.replace("file: roms/game05.zip", "file: roms/GAME05.zip")
+    edited_on_disk(loaded, source, text[:text.index("game: Game 10")] + "game: Bonus\nfile: roms/bonus.zip\n\n")
+
+    assert source_games(loaded) == ["Bonus"] + [f"Game {number:02}" for number in range(10)]
+    live = [record for record in loaded.source_records if record]  # Removed records are left empty
+    assert len(live) == 11
+    assert {record["game"]: record["file"] for record in live}["Game 05"] == "roms/GAME05.zip"
+    assert len({id(record.source) for record in live}) == 1  # None still reads the old copy of the file
+    assert loaded.search_index.search_ids("bonus", ["game"]) != []
+
+
+def test_collection_edits_on_disk_are_applied(loaded):
+    _, collection = loaded.test_files
+    roms = collection.parent / "roms"
+    edited_on_disk(loaded, collection, "collection: Favorites\n\n" + "".join(
+        f"game: Game {number:02}\nfile: {roms / f'game{number:02}.zip'}\n\n" for number in (8, 12)))
+
+    assert sorted(game.game for game in loaded.existing_games) == ["Game 08", "Game 12"]
+    states = dict(zip(source_games(loaded), (loaded.source_games_model.state(row) for row in range(20))))
+    assert states["Game 12"] == DUPLICATE and states["Game 03"] != DUPLICATE
+
+
+def test_deleted_file_is_read_again_once_recreated(loaded):
+    _, collection = loaded.test_files
+    text = collection.read_text(encoding='utf-8')
+    collection.unlink()
+    loaded.on_watched_file_changed(str(collection))
+    loaded.process_changed_files()
+    settle(loaded)
+    assert len(loaded.existing_games) == 2
+
+    edited_on_disk(loaded, collection, text.split("game: Game 08")[0])
+    assert sorted(game.game for game in loaded.existing_games) == ["Game 03"]
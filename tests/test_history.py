@@ -0,0 +1,63 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+from pegasus_collection import GameRecord
+from pegasus_history import (RENAME, STAGE_ADDITIONS, STAGE_REMOVALS, UNSTAGE_ADDITIONS, UNSTAGE_REMOVALS,
+                             CommandLog, history_path, inverse)
+
+ALPHA = GameRecord("Alpha", "/roms/alpha.zip", "emu {file.path}", "Arcade")
+BETA = GameRecord("Beta", "/roms/beta.zip")
+
+
+def test_inverse():
+    operations = [(STAGE_ADDITIONS, [ALPHA]), (RENAME, ("collection", "Old", "New")), (STAGE_REMOVALS, [BETA])]
+    assert inverse(operations) == [(UNSTAGE_REMOVALS, [BETA]), (RENAME, ("collection", "New", "Old")),
+                                   (UNSTAGE_ADDITIONS, [ALPHA])]
+    assert inverse(inverse(operations)) == operations
+
+
+def test_undo_and_redo():
+    log = CommandLog()
+    log.record([(STAGE_ADDITIONS, [ALPHA]), (STAGE_REMOVALS, [])])
+    log.record([])
+    assert len(log) == 1
+    assert log.undo() == [(UNSTAGE_ADDITIONS, [ALPHA])]
+    assert log.undo() is None
+    assert log.redo() == [(STAGE_ADDITIONS, [ALPHA])]
+    assert log.redo() is None
+    log.undo()
+    log.record([(STAGE_REMOVALS, [BETA])])
+    assert not log.can_redo()
+
+
+def test_replay(tmp_path):
+    path = history_path(str(tmp_path / "games.metadata.pegasus.txt"))
+    log = CommandLog(path)
+    log.record([(STAGE_ADDITIONS, [ALPHA])])
+    log.record([(STAGE_REMOVALS, [BETA])])
+    log.undo()
+    log.record([(RENAME, ("shortname", "old", "new"))])
+    log.undo()
+    with open(path, 'a', encoding='utf-8') as history:
+        history.write('{"action": "do", "operations": [["stage_add')  # Cut short by a crash
+
+    replayed, applied = CommandLog.replay(path)
+
+    assert applied == [(STAGE_ADDITIONS, [ALPHA]), (STAGE_REMOVALS, [BETA]), (UNSTAGE_REMOVALS, [BETA]),
+                       (RENAME, ("shortname", "old", "new")), (RENAME, ("shortname", "new", "old"))]
+    assert applied[0][1][0].console == "Arcade"
+    assert replayed.undo_stack == log.undo_stack
+    assert replayed.redo_stack == log.redo_stack
+    # Replayed edits are logged again on top of the same file
+    replayed.redo()
+    assert CommandLog.replay(path)[0].undo_stack == replayed.undo_stack
+
+
+def test_saving_starts_a_new_log(tmp_path):
+    path = history_path(str(tmp_path / "games.metadata.pegasus.txt"), section=2)
+    assert path.endswith(".2.history.jsonl")
+    log = CommandLog(path)
+    log.record([(STAGE_ADDITIONS, [ALPHA])])
+    log.mark_saved()
+    assert not log.can_undo() and not log.can_redo()
+    assert CommandLog.replay(path)[1] == []
@@ -0,0 +1,71 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+from pegasus_metadata import (COLLECTION, GAME, TEXT, iter_metadata_blocks, iter_metadata_lines, map_metadata,
+                              parse_metadata, record_fields)
+
+SAMPLE = (
+    "collection: Arcade\r\n"
+    "shortname: arcade\r\n"
+    "launch: retroarch {file.path}\r\n"
+    "\r\n"
+    "# Metal Slug\r\n"
+    "file: roms/mslug.zip\r\n"
+    "description: Run and gun.\r\n"
+    "  Second line.\r\n"
+    "  .\r\n"
+    "  New paragraph.\r\n"
+    "\r\n"
+    "# Only a comment\r\n"
+    "\r\n"
+    "game: Pac-Man\r\n"
+    "File: roms/pacman.zip\r\n"
+    "\r\n"
+    "# trailing note\r\n"
+)
+
+
+def test_records_and_values():
+    records = list(iter_metadata_lines(SAMPLE.splitlines(True)))
+    assert [kind for kind, _ in records] == [COLLECTION, GAME, GAME]
+    header, slug, pacman = (fields for _, fields in records)
+    assert header == {"collection": "Arcade", "shortname": "arcade", "launch": "retroarch {file.path}"}
+    assert slug == {"game": "Metal Slug", "file": "roms/mslug.zip",
+                    "description": "Run and gun. Second line.\nNew paragraph."}
+    assert pacman == {"game": "Pac-Man", "file": "roms/pacman.zip"}
+
+
+def test_blocks_give_back_the_input():
+    blocks = list(iter_metadata_blocks(SAMPLE.splitlines(True)))
+    assert "".join(raw_text for _, _, raw_text in blocks) == SAMPLE
+    assert [kind for kind, _, _ in blocks] == [COLLECTION, GAME, GAME, TEXT]
+    assert blocks[-1][2] == "# trailing note\r\n"
+    assert blocks[1][2].startswith("# Metal Slug\r\n")
+    # A comment without keys is copied with the record after it
+    assert blocks[2][2].startswith("# Only a comment\r\n\r\ngame: Pac-Man\r\n")
+
+
+def test_blocks_keep_text_without_records():
+    assert list(iter_metadata_blocks(["# notes\n", "\n"])) == [(TEXT, {}, "# notes\n\n")]
+
+
+def test_blocks_are_streamed():
+    def lines():
+        yield "game: First\n"
+        yield "file: a.zip\n"
+        yield "\n"
+        yield "game: Second\n"
+        raise AssertionError("read past the record that was asked for")
+
+    blocks = iter_metadata_blocks(lines())
+    assert next(blocks) == (GAME, {"game": "First", "file": "a.zip"}, "game: First\nfile: a.zip\n\n")
+
+
+def test_mapped_records_match_parsed_ones(tmp_path):
+    path = tmp_path / "metadata.pegasus.txt"
+    path.write_bytes(SAMPLE.encode('utf-8'))
+    parsed = parse_metadata(str(path))
+    mapped = map_metadata(str(path))
+    assert dict(mapped.header) == parsed.header
+    assert [dict(record_fields(game)) for game in mapped.games] == parsed.games
+    assert [game["file"] for game in mapped.games] == ["roms/mslug.zip", "roms/pacman.zip"]
@@ -0,0 +1,98 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import random
+
+import pytest
+
+from pegasus_query import ColumnStore, QueryError, compile_query, looks_like_query
+
+
+@pytest.mark.parametrize("keyword", ["Sonic and Knuckles", "do or die", "Not Guilty", "Lord of the Rings"])
+def test_lowercase_operators_are_keywords(keyword):
+    assert not looks_like_query(keyword)
+
+
+@pytest.mark.parametrize("query", ["Sonic AND Tails", "NOT puzzle", "genre:shooter", "Genre:shooter",
+                                   "release>=1995", "-publisher:capcom", "x-rating>=4", "(a OR b)"])
+def test_query_syntax(query):
+    assert looks_like_query(query)
+
+
+GAMES = [
+    {"game": "Street Fighter II", "file": "sf2.zip", "genre": "Fighting", "release": "1991", "developer": "Capcom"},
+    {"game": "Sonic the Hedgehog", "file": "sonic.md", "genre": "Platform", "release": "1991-06-23"},
+    {"game": "Mega Man X", "file": "mmx.sfc", "genre": "Platform, Shooter", "release": "1993", "developer": "Capcom"},
+    {"game": "R-Type", "file": "rtype.zip", "genre": "Shooter", "release": "1987", "developer": "Irem"},
+]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("sonic", [1]),
+    ("genre:platform", [1, 2]),
+    ("genre=shooter", [3]),
+    ("genre!=shooter", [0, 1, 2]),
+    ("release>=1991", [0, 1, 2]),
+    ("release<1991", [3]),
+    ("developer:capcom genre:platform", [2]),
+    ("developer:capcom AND genre:platform", [2]),
+    ("sonic OR r-type", [1, 3]),
+    ("developer:capcom NOT genre:platform", [0]),
+    ("-developer:capcom", [1, 3]),
+    ("(genre:fighting OR genre:shooter) release<1993", [0, 3]),
+    ('"the hedgehog"', [1]),
+    ("x-rating:5", []),
+])
+def test_compiled_queries(query, expected):
+    assert compile_query(query).ids(ColumnStore(GAMES)) == expected
+
+
+def test_bare_words_search_the_default_fields():
+    assert compile_query("zip", default_fields=("game", "file")).ids(ColumnStore(GAMES)) == [0, 3]
+
+
+def test_columns_follow_appended_records():
+    records = list(GAMES)
+    store = ColumnStore(records)
+    query = compile_query("genre:shooter")
+    assert query.ids(store) == [2, 3]
+    records.append({"game": "Gradius", "file": "gradius.zip", "genre": "Shooter"})
+    assert query.ids(store) == [2, 3, 4]
+
+
+@pytest.mark.parametrize("query", ["", "rating:5", "genre:", "(sonic", "sonic)", "OR sonic", "NOT"])
+def test_invalid_queries(query):
+    with pytest.raises(QueryError):
+        compile_query(query)
+
+
+def catalog(count=400, seed=3):
+    rng = random.Random(seed)
+    words = ["street", "fighter", "mario", "sonic", "puyo", "mega", "man", "final", "fantasy"]
+    return [{"game": " ".join(rng.choice(words) for _ in range(rng.randint(1, 3))),
+             "genre": rng.choice(["Fighting", "Platform", "RPG", "Puzzle"]),
+             "developer": rng.choice(["Capcom", "Sega", "Nintendo", "Square", "Compile"]),
+             "release": str(rng.randint(1985, 2000))} for _ in range(count)]
+
+
+def has(record, field, text):
+    return text in record.get(field, "").casefold()
+
+
+# Small results go through the one-by-one refine path, large ones through whole-column evaluation
+@pytest.mark.parametrize("query, matches", [
+    ("fighter AND genre:fighting", lambda r: has(r, "game", "fighter") and has(r, "genre", "fighting")),
+    ("puyo genre:puzzle developer:compile",
+     lambda r: has(r, "game", "puyo") and has(r, "genre", "puzzle") and has(r, "developer", "compile")),
+    ("mario NOT developer:nintendo", lambda r: has(r, "game", "mario") and not has(r, "developer", "nintendo")),
+    ("puyo fighter NOT genre:rpg",
+     lambda r: has(r, "game", "puyo") and has(r, "game", "fighter") and not has(r, "genre", "rpg")),
+    ("NOT genre:rpg NOT release>=1990", lambda r: not has(r, "genre", "rpg") and int(r["release"]) < 1990),
+    ("(sonic OR mega) -developer:sega release<=1992",
+     lambda r: (has(r, "game", "sonic") or has(r, "game", "mega")) and not has(r, "developer", "sega")
+     and int(r["release"]) <= 1992),
+])
+def test_and_not_match_a_linear_scan(query, matches):
+    records = catalog()
+    expected = [record_id for record_id, record in enumerate(records) if matches(record)]
+    assert compile_query(query).ids(ColumnStore(records)) == expected
@@ -0,0 +1,155 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+import random
+import threading
+
+import pytest
+
+from pegasus_cache import ParseCache
+from pegasus_metadata import parse_metadata
+from pegasus_search import SearchIndex, TrigramIndex, trigrams
+
+WORDS = ["street", "fighter", "final", "fantasy", "super", "mario", "sonic", "hedgehog", "puyo", "mega", "man", "x",
+         "ストリート"]
+
+
+def corpus(count=400, seed=7):
+    rng = random.Random(seed)
+    return [{"game": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + f" #{number}",
+             "file": f"{rng.choice(WORDS)}{number}.zip",
+             "developer": rng.choice(["Capcom", "Sega", "Nintendo", "Square"]),
+             "genre": rng.choice(["Fighting", "Platform", "RPG"])} for number in range(count)]
+
+
+def linear(records, keyword, fields):
+    keyword = keyword.casefold()
+    return [record_id for record_id, record in enumerate(records)
+            if any(keyword in record.get(field, "").casefold() for field in fields)]
+
+
+class SlowRecord(dict):
+    """ A record whose fields can only be read once released. """
+
+    def __init__(self, fields, reading, released):
+        super().__init__(fields)
+        self.reading = reading
+        self.released = released
+
+    def get(self, key, default=None):
+        self.reading.set()
+        assert self.released.wait(5)
+        return super().get(key, default)
+
+
+def test_appending_does_not_wait_for_a_build():
+    reading, released = threading.Event(), threading.Event()
+    records = [SlowRecord({"game": "Street Fighter II"}, reading, released)]
+    index = SearchIndex(records)
+    found = []
+    search = threading.Thread(target=lambda: found.extend(index.search_ids("fighter", ["game"])))
+    search.start()
+    assert reading.wait(5)
+
+    # The search thread is building the postings of "game" and waits on its record
+    appender = threading.Thread(target=lambda: (records.append({"game": "Final Fighter"}), index.index_new()))
+    appender.start()
+    appender.join(5)
+    assert not appender.is_alive()
+
+    released.set()
+    search.join(5)
+    assert found == [0, 1]
+    assert index.search_ids("final", ["game"]) == [1]
+
+
+@pytest.mark.parametrize("keyword", ["fighter", "er fi", "ight", "SUPER MARIO", "mario #1", "x", "ストリ", "#12", "sega",
+                                     "zelda", ""])
+@pytest.mark.parametrize("fields", [["game"], ["game", "file"], ["developer", "genre"]])
+def test_candidates_cover_a_linear_scan(keyword, fields):
+    records = corpus()
+    index = SearchIndex(records)
+    expected = linear(records, keyword, fields)
+    candidates = index.candidates(keyword.casefold(), fields)
+    assert candidates is None or set(expected) <= candidates
+    assert index.search_ids(keyword, fields) == expected
+
+
+def test_appended_records_are_indexed():
+    records = corpus(200)
+    index = SearchIndex(records)
+    index.search_ids("mario", ["game", "developer"])
+    for record in corpus(300, seed=8):
+        records.append(record)
+        if len(records) % 50 == 0:
+            index.index_new()
+    records.append({"game": "Mario Kart", "file": "kart.zip"})  # Not indexed yet
+    for keyword in ("mario", "capcom", "kart"):
+        assert index.search_ids(keyword, ["game", "developer"]) == linear(records, keyword, ["game", "developer"])
+
+
+@pytest.mark.parametrize("typed", [["s", "st", "str", "stree", "street", "street f", "street fi"],
+                                   ["m", "ma", "mar", "mario", "mario #", "mario #3"]])
+def test_narrowing_matches_a_full_search(typed):
+    records = corpus()
+    index = SearchIndex(records)
+    previous = None
+    for keyword in typed:
+        # As the editor does while typing: the new keyword contains the last one
+        ids = index.search_ids(keyword, ["game"], within=previous)
+        assert ids == linear(records, keyword, ["game"])
+        previous = ids
+
+
+def test_cancelled_search_stops():
+    assert SearchIndex(corpus()).search_ids("a", ["game"], cancelled=lambda: True) is None
+
+
+@pytest.mark.parametrize("count_budget", [10, 200000])
+def test_fuzzy_search_within_count_budget(count_budget):
+    records = corpus(2000)
+    records.append({"game": "Street Fighter II Turbo", "file": "sf2t.zip"})
+    index = TrigramIndex(records, ["game"], count_budget=count_budget)
+    index.update()
+    query = "stret fightr 2 turbo"
+    results = index.search(query, limit=5)
+    assert results[0][0] == len(records) - 1
+    # Scores are exact, whatever the budget let through
+    grams = trigrams(query)
+    for record_id, score in results:
+        assert score == round(len(grams & index.record_trigrams(records[record_id])) / len(grams), 3)
+        assert score >= 0.4
+
+
+def test_fuzzy_index_follows_appended_records():
+    records = corpus(100)
+    index = TrigramIndex(records, ["game"])
+    index.update()
+    records.append({"game": "Puyo Puyo Tsu", "file": "puyo2.zip"})
+    assert index.update()
+    assert not index.update()
+    assert index.search("puyo puyo tsu", limit=1) == [(100, 1.0)]
+
+
+def test_trigram_cache_is_dropped_when_the_source_changes(tmp_path):
+    source = tmp_path / "metadata.pegasus.txt"
+    source.write_text("".join(f"game: {game['game']}\nfile: {game['file']}\n\n" for game in corpus(50)),
+                      encoding='utf-8')
+    cache = ParseCache(str(tmp_path / "cache"))
+    version = cache.version(str(source))
+    records = parse_metadata(str(source)).games
+    index = TrigramIndex(records, ["game"])
+    index.update()
+    cache.store_extra(str(source), version, index.cache_name(), index)
+
+    restored = TrigramIndex(records, ["game"])
+    restored.restore(cache.load_extra(str(source), index.cache_name()))
+    assert restored.indexed == len(records)
+    assert restored.search("super mario") == index.search("super mario")
+
+    with open(source, 'a', encoding='utf-8') as file:
+        file.write("game: Super Mario Kart\nfile: kart.zip\n\n")
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.load_extra(str(source), index.cache_name()) is None
@@ -0,0 +1,101 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+
+import pytest
+
+from pegasus_collection import GameRecord, normalize_path, save_collection_file
+from pegasus_sections import index_sections, read_sections, section_header
+
+PREAMBLE = "# Library of one system\n\n"
+ARCADE = (
+    "collection: Arcade\n"
+    "shortname: arcade\n"
+    "launch: emu {file.path}\n"
+    "\n"
+    "game: Metal Slug\n"
+    "file: mslug.zip\n"
+    "\n"
+    "game: Pac-Man\n"
+    "file: pacman.zip\n"
+    "\n"
+    "# Fighting games follow\n"
+    "\n"
+)
+FIGHTING = (
+    "Collection: Fighting\r\n"
+    "files:\r\n"
+    "  sf2.zip\r\n"
+    "\r\n"
+    "game: Street Fighter II\r\n"
+    "file: sf2.zip\r\n"
+    "\r\n"
+)
+PUZZLE = (
+    "collection: Puzzle\n"
+    "\n"
+    "game: Tetris\n"
+    "file: tetris.zip\n"
+    "game: Columns\n"
+    "file: columns.zip\n"
+)
+TEXT = PREAMBLE + ARCADE + FIGHTING + PUZZLE
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = tmp_path / "metadata.pegasus.txt"
+    path.write_bytes(TEXT.encode('utf-8'))
+    return path
+
+
+def save_section(path, section, additions=(), removals=()):
+    base_dir = os.path.dirname(path)
+    removal_keys = {(game, normalize_path(os.path.join(base_dir, file_name))) for game, file_name in removals}
+    return save_collection_file(str(path), section.name, "", list(additions), removal_keys,
+                                lambda file_path: os.path.join(base_dir, file_path), section.byte_range)
+
+
+def test_boundaries(library):
+    sections = read_sections(str(library))
+    assert [(section.name, section.game_count) for section in sections] == [("Arcade", 2), ("Fighting", 1),
+                                                                            ("Puzzle", 2)]
+    data = TEXT.encode('utf-8')
+    assert [data[section.start:section.end] for section in sections] == [
+        (PREAMBLE + ARCADE).encode('utf-8'), FIGHTING.encode('utf-8'), PUZZLE.encode('utf-8')]
+    assert data[sections[0].header_start:].startswith(b"collection: Arcade\n")
+    assert section_header(str(library), sections[1])["files"] == "sf2.zip"
+
+
+def test_file_without_collections_is_one_section():
+    data = b"game: Tetris\nfile: tetris.zip\n"
+    assert [(section.byte_range, section.game_count) for section in index_sections(data)] == [((0, len(data)), 1)]
+
+
+@pytest.mark.parametrize("number", [0, 1, 2])
+def test_saving_a_section_copies_the_others(library, number):
+    sections = read_sections(str(library))
+    section = sections[number]
+    data = TEXT.encode('utf-8')
+    removed = {0: ("Pac-Man", "pacman.zip"), 1: ("Street Fighter II", "sf2.zip"), 2: ("Tetris", "tetris.zip")}[number]
+    added = GameRecord("Bubble Bobble", str(library.parent / "bubble.zip"))
+
+    result = save_section(library, section, [added], [removed])
+
+    saved = library.read_bytes()
+    assert saved.startswith(data[:section.start])
+    assert saved.endswith(data[section.end:])
+    middle = saved[section.start:len(saved) - (len(data) - section.end)].decode('utf-8')
+    assert f"game: {removed[0]}" not in middle
+    assert "# Bubble Bobble" in middle
+    assert [fields["game"] for fields in result.removed] == [removed[0]]
+    assert [section.name for section in read_sections(str(library))] == ["Arcade", "Fighting", "Puzzle"]
+
+
+def test_comments_between_sections_are_kept(library):
+    arcade = read_sections(str(library))[0]
+    save_section(library, arcade, removals=[("Metal Slug", "mslug.zip")])
+    saved = library.read_bytes().decode('utf-8')
+    assert saved.startswith(PREAMBLE + "collection: Arcade\n")
+    assert "game: Pac-Man\nfile: pacman.zip\n\n# Fighting games follow\n\n" + FIGHTING + PUZZLE in saved
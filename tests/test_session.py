@@ -0,0 +1,36 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import pytest
+
+from pegasus_collection import GameRecord
+from pegasus_session import decode_games, encode_games, load_session, save_session
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "session.json")
+    games = [GameRecord("Super Metroid", "/roms/snes/super metroid.sfc", "run {file.path}", "snes")]
+    save_session({"collection_file": "/c/metadata.pegasus.txt", "keyword": "metroid",
+                  "additions": encode_games(games), "removals": []}, path)
+    session = load_session(path)
+    assert session["keyword"] == "metroid"
+    assert decode_games(session["additions"]) == games
+
+
+@pytest.mark.parametrize("content", [
+    '{"version": 1, "additions": [["Super Metroid", "/roms/a.sfc"]]',  # Truncated
+    '{"version": 1, "additions": [["Super Metroid", "/roms/a.sfc"]]}',  # Entry from an older layout
+    '{"version": 1, "removals": [[1, 2, 3, 4]]}',
+    '{"version": 1, "source_files": "/roms/metadata.txt"}',
+    '{"version": 1, "collection_file": 5}',
+    '{"version": 99}',
+    '[]',
+])
+def test_unusable_session_starts_clean(tmp_path, content):
+    path = tmp_path / "session.json"
+    path.write_text(content, encoding="utf-8")
+    assert load_session(str(path)) == {}
+
+
+def test_missing_session(tmp_path):
+    assert load_session(str(tmp_path / "none.json")) == {}
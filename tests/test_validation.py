@@ -0,0 +1,50 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+
+from pegasus_cache import ParseCache
+from pegasus_validation import CHANGED, MISSING, OK, STATE_FILE, FileChecker
+
+
+def test_statuses_are_remembered_between_runs(tmp_path):
+    roms = tmp_path / "roms"
+    roms.mkdir()
+    kept = roms / "kept.zip"
+    edited = roms / "edited.zip"
+    kept.write_bytes(b"a")
+    edited.write_bytes(b"b")
+    paths = [str(kept), str(edited), str(roms / "gone.zip"), str(tmp_path / "nowhere" / "x.zip")]
+    cache_file = str(tmp_path / "checks.cache")
+
+    checker = FileChecker(cache_file, workers=4)
+    assert checker.check(paths) == {paths[0]: OK, paths[1]: OK, paths[2]: MISSING, paths[3]: MISSING}
+    checker.save()
+
+    # Rewritten in place: the folder's modification time does not change
+    folder_mtime = os.stat(roms).st_mtime_ns
+    edited.write_bytes(b"longer")
+    os.utime(roms, ns=(folder_mtime, folder_mtime))
+    statuses = FileChecker(cache_file, workers=4).check(paths)
+    assert statuses == {paths[0]: OK, paths[1]: CHANGED, paths[2]: MISSING, paths[3]: MISSING}
+
+
+def test_missing_file_is_found_once_added(tmp_path):
+    roms = tmp_path / "roms"
+    roms.mkdir()
+    path = str(roms / "late.zip")
+    checker = FileChecker(str(tmp_path / "checks.cache"), workers=2)
+    assert checker.check([path]) == {path: MISSING}
+    (roms / "late.zip").write_bytes(b"x")
+    os.utime(roms, ns=(1, 1))  # Any change to the folder's modification time
+    assert checker.check([path]) == {path: OK}
+
+
+def test_state_survives_the_parse_cache(tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"), max_bytes=0)
+    checker = FileChecker(os.path.join(cache.directory, STATE_FILE), workers=2)
+    checker.check([str(tmp_path / "game.zip")])
+    checker.save()
+    cache.evict()
+    cache.clear()
+    assert os.listdir(cache.directory) == [STATE_FILE]
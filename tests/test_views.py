@@ -0,0 +1,66 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import random
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from pegasus_views import MAX_ROW_BLOCKS, NORMAL, GameListModel  # noqa: E402
+
+
+def rows_of(names):
+    return [(name, name, NORMAL) for name in names]
+
+
+def contents(model):
+    return [model.game(row) for row in range(model.rowCount())]
+
+
+def signals(model):
+    emitted = []
+    model.rowsInserted.connect(lambda parent, first, last: emitted.append(("insert", first, last)))
+    model.rowsRemoved.connect(lambda parent, first, last: emitted.append(("remove", first, last)))
+    model.modelReset.connect(lambda: emitted.append(("reset",)))
+    return emitted
+
+
+@pytest.mark.parametrize("count", [3, MAX_ROW_BLOCKS * 4])
+def test_insert_sorted_keeps_order(count):
+    rng = random.Random(count)
+    existing = sorted(f"game {number:05}" for number in rng.sample(range(0, 10000, 2), 500))
+    added = [f"game {number:05}" for number in rng.sample(range(1, 10000, 2), count)]
+    model = GameListModel()
+    model.set_rows(rows_of(existing))
+    emitted = signals(model)
+    model.insert_sorted(rows_of(added), sort_key=str)
+    assert contents(model) == sorted(existing + added)
+    assert model.rows_for(added[0]) == [contents(model).index(added[0])]
+    if count > MAX_ROW_BLOCKS:
+        assert emitted == [("reset",)]
+    else:
+        assert all(signal[0] == "insert" for signal in emitted) and len(emitted) <= count
+
+
+def test_insert_sorted_groups_rows_at_one_place():
+    model = GameListModel()
+    model.set_rows(rows_of(["a", "z"]))
+    emitted = signals(model)
+    model.insert_sorted(rows_of(["m", "c", "k"]), sort_key=str)
+    assert contents(model) == ["a", "c", "k", "m", "z"]
+    assert emitted == [("insert", 1, 3)]
+
+
+@pytest.mark.parametrize("removed", [{0, 1, 2, 7, 9}, set(range(0, 400, 3))])
+def test_remove_rows(removed):
+    names = [f"game {number:03}" for number in range(400)]
+    model = GameListModel()
+    model.set_rows(rows_of(names))
+    emitted = signals(model)
+    model.remove_rows(iter(removed))
+    assert contents(model) == [name for number, name in enumerate(names) if number not in removed]
+    if len(removed) < MAX_ROW_BLOCKS:
+        assert emitted == [("remove", 9, 9), ("remove", 7, 7), ("remove", 0, 2)]
+    else:
+        assert emitted == [("reset",)]
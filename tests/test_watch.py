@@ -0,0 +1,116 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+import pickle
+
+import pytest
+
+from pegasus_metadata import StaleMetadataError, map_metadata
+from pegasus_watch import FileSnapshot
+
+HEADER = "collection: Arcade\nlaunch: emu {file.path}\n\n"
+
+
+def game(title, description="A game."):
+    return f"game: {title}\nfile: {title.lower()}.zip\ndescription: {description}\n\n"
+
+
+def rewrite(path, text):
+    """ Writes text to path with a later mtime, as an edit that lands within the same clock tick would not. """
+    stat = os.stat(path) if os.path.exists(path) else None
+    path.write_bytes(text.encode('utf-8'))
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "metadata.pegasus.txt"
+    rewrite(path, HEADER + game("Alpha") + game("Beta") + game("Gamma"))
+    return path
+
+
+def test_added_removed_and_changed(source):
+    old, _ = FileSnapshot.scan(str(source))
+    rewrite(source, HEADER + game("Gamma") + game("Beta", "Edited.") + game("Delta") + game("Alpha"))
+
+    new, records = FileSnapshot.scan(str(source))
+    diff = old.diff(new)
+
+    assert not diff.header_changed
+    assert diff.removed == [1]
+    assert [records[index]["game"] for index in diff.added] == ["Beta", "Delta"]
+    assert records[diff.added[0]]["description"] == "Edited."
+    assert sorted(diff.kept) == [(0, 3), (2, 0)]
+    assert not new.diff(FileSnapshot.scan(str(source))[0])
+
+
+def test_header_change(source):
+    old, _ = FileSnapshot.scan(str(source))
+    rewrite(source, HEADER.replace("emu", "emu2") + game("Alpha") + game("Beta") + game("Gamma"))
+    diff = old.diff(FileSnapshot.scan(str(source))[0])
+    assert diff.header_changed
+    assert not diff.added and not diff.removed
+
+
+def test_same_size_rewrite(source):
+    old, records = FileSnapshot.scan(str(source))
+    size = os.path.getsize(source)
+    rewrite(source, HEADER + game("Alpha") + game("Beta", "B gone.") + game("Gamma"))
+    assert os.path.getsize(source) == size
+
+    diff = old.diff(FileSnapshot.scan(str(source))[0])
+    assert diff.removed == [1] and diff.added == [1]
+    # Records already read keep the version they were read from
+    assert records[1]["description"] == "A game."
+
+
+def test_truncated_file(source):
+    old, records = FileSnapshot.scan(str(source))
+    rewrite(source, HEADER + game("Alpha"))
+
+    assert [dict(record)["description"] for record in records] == ["A game."] * 3
+    diff = old.diff(FileSnapshot.scan(str(source))[0])
+    assert diff.removed == [1, 2]
+    assert diff.kept == [(0, 0)]
+
+
+def test_deleted_then_recreated(source):
+    old, _ = FileSnapshot.scan(str(source))
+    os.remove(source)
+    with pytest.raises(OSError):
+        FileSnapshot.scan(str(source))
+
+    rewrite(source, HEADER + game("Beta"))
+    diff = old.diff(FileSnapshot.scan(str(source))[0])
+    assert diff.removed == [0, 2]
+    assert diff.kept == [(1, 0)]
+
+
+def test_sections_are_scanned_alone(source):
+    rewrite(source, HEADER + game("Alpha") + "collection: Puzzle\n\n" + game("Tetris"))
+    first, records = FileSnapshot.scan(str(source), section=0)
+    second, _ = FileSnapshot.scan(str(source), section=1)
+    assert [record["game"] for record in records] == ["Alpha"]
+    assert second.games == ["Tetris"]
+    assert FileSnapshot.scan(str(source), section=2)[1] == []
+    assert first.header_hash != second.header_hash
+
+
+def test_snapshot_from_records_matches_a_scan(source):
+    records = map_metadata(str(source)).games
+    snapshot = FileSnapshot.from_records(str(source), records, ids=[10, 11, 12])
+    scanned, _ = FileSnapshot.scan(str(source))
+    assert snapshot.hashes == scanned.hashes
+    assert snapshot.header_hash == scanned.header_hash
+    assert snapshot.pairs() == {("Alpha", "alpha.zip"), ("Beta", "beta.zip"), ("Gamma", "gamma.zip")}
+
+
+def test_unpickled_records_check_the_file(source):
+    data = pickle.dumps(map_metadata(str(source)))
+    assert [record["description"] for record in pickle.loads(data).games] == ["A game."] * 3
+
+    rewrite(source, HEADER + game("Alpha") + game("Beta", "B gone.") + game("Gamma"))
+    with pytest.raises(StaleMetadataError):
+        pickle.loads(data)
@@ -0,0 +1,146 @@
+# Pegasus Collection Editor
+# Copyright (C) 2025 luis0henrique
+
+import os
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtCore import Qt  # noqa: E402
+
+from pegasus_cache import ParseCache  # noqa: E402
+from pegasus_metadata import parse_metadata  # noqa: E402
+from pegasus_sections import read_sections  # noqa: E402
+from pegasus_sources import scan_source  # noqa: E402
+from pegasus_validation import MISSING, OK, FileChecker  # noqa: E402
+from pegasus_workers import FileCheckWorker, MetadataLoader, SourcesLoader  # noqa: E402
+
+HEADER = "collection: Arcade\nlaunch: emu {file.path}\n\n"
+
+
+def write_source(path, count, offset=0):
+    path.write_text(HEADER + "".join(
+        f"game: Game {number}\nfile: roms/game{number}.zip\ndescription: Number {number}\n  of many.\n\n"
+        for number in range(offset, offset + count)), encoding='utf-8')
+    return path
+
+
+def run(worker, *signal_names):
+    """ Runs worker in its thread and returns what each of its signals carried, in order. """
+    emitted = {name: [] for name in signal_names + ("loading_finished", "loading_failed")}
+    for name, values in emitted.items():
+        # Direct: collected in the worker thread, so no event loop is needed here
+        getattr(worker, name).connect(lambda *arguments, values=values: values.append(arguments), Qt.DirectConnection)
+    worker.start()
+    assert worker.wait(60000)
+    return emitted
+
+
+def loaded_games(emitted):
+    return [dict(game) for (chunk,) in emitted["games_loaded"] for game in chunk]
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.parametrize("cached", [False, True])
+def test_metadata_loader_streams_the_parsed_records(tmp_path, lazy, cached):
+    source = write_source(tmp_path / "metadata.pegasus.txt", 25)
+    parse_cache = ParseCache(str(tmp_path / "cache")) if cached else None
+    expected = parse_metadata(str(source))
+
+    for _ in range(2 if cached else 1):  # Parsed, then read back from the cache
+        loader = MetadataLoader(str(source), parse_cache, chunk_size=10, lazy=lazy)
+        emitted = run(loader, "header_loaded", "games_loaded", "progress")
+        assert emitted["loading_finished"] == [(True,)]
+        assert emitted["header_loaded"] == [(expected.header,)]
+        assert [len(chunk) for (chunk,) in emitted["games_loaded"]] == [10, 10, 5]
+        assert loaded_games(emitted) == expected.games
+        assert emitted["progress"][-1][0] == emitted["progress"][-1][1]
+    if cached:
+        assert parse_cache.load(str(source), lazy) is not None
+
+
+def test_metadata_loader_reads_one_section(tmp_path):
+    source = tmp_path / "metadata.pegasus.txt"
+    write_source(source, 3)
+    with open(source, 'a', encoding='utf-8') as file:
+        file.write("collection: Puzzle\n\ngame: Tetris\nfile: tetris.zip\n\n")
+    section = read_sections(str(source))[1]
+
+    emitted = run(MetadataLoader(str(source), byte_range=section.byte_range), "header_loaded", "games_loaded")
+    assert emitted["header_loaded"] == [({"collection": "Puzzle"},)]
+    assert loaded_games(emitted) == [{"game": "Tetris", "file": "tetris.zip"}]
+
+
+def test_metadata_loader_reports_unreadable_files(tmp_path):
+    emitted = run(MetadataLoader(str(tmp_path / "missing.pegasus.txt")))
+    assert emitted["loading_finished"] == []
+    assert len(emitted["loading_failed"]) == 1
+
+
+def test_cancelled_metadata_loader(tmp_path):
+    source = write_source(tmp_path / "metadata.pegasus.txt", 50)
+    loader = MetadataLoader(str(source), chunk_size=10)
+    loader.games_loaded.connect(lambda chunk: loader.cancel(), Qt.DirectConnection)
+    emitted = run(loader, "games_loaded")
+    assert emitted["loading_finished"] == [(False,)]
+    assert len(loaded_games(emitted)) < 50
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_sources_loader_matches_a_serial_parse(tmp_path, cached):
+    sources = [str(write_source(tmp_path / f"system{number}.metadata.pegasus.txt", count, offset=number * 100))
+               for number, count in enumerate([30, 0, 7, 12])]
+    missing = str(tmp_path / "missing.metadata.pegasus.txt")
+    parse_cache = ParseCache(str(tmp_path / "cache")) if cached else None
+
+    loader = SourcesLoader(sources + [missing], parse_cache, workers=2, chunk_size=8)
+    emitted = run(loader, "header_loaded", "games_loaded")
+
+    assert emitted["loading_finished"] == [(True,)]
+    assert [failure.split(": ")[0] for failure in loader.failed] == [missing]
+    headers = dict(emitted["header_loaded"])
+    games = {}
+    for file_name, chunk in emitted["games_loaded"]:
+        assert len(chunk) <= 8
+        games.setdefault(file_name, []).extend(dict(game) for game in chunk)
+    for file_name in sources:
+        expected = parse_metadata(file_name)
+        assert headers[file_name] == expected.header
+        assert games.get(file_name, []) == expected.games
+    assert loader.records_loaded == 49
+
+
+def test_sources_loader_rescans_a_file_changed_after_the_worker(tmp_path):
+    source = write_source(tmp_path / "metadata.pegasus.txt", 3)
+    batch = scan_source(str(source))
+    stat = os.stat(source)
+    write_source(source, 4)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    header, records = SourcesLoader._records(batch, str(source))
+    assert header == {"collection": "Arcade", "launch": "emu {file.path}"}
+    assert [dict(record) for record in records] == parse_metadata(str(source)).games
+
+
+def test_file_check_worker_saves_what_it_saw(tmp_path):
+    (tmp_path / "found.zip").write_bytes(b"x")
+    paths = [str(tmp_path / "found.zip"), str(tmp_path / "gone.zip")]
+    state_file = str(tmp_path / "checks.state")
+
+    worker = FileCheckWorker(FileChecker(state_file, workers=2), paths)
+    emitted = run(worker, "progress")
+    assert emitted["loading_finished"] == [(True,)]
+    assert worker.statuses == {paths[0]: OK, paths[1]: MISSING}
+    assert emitted["progress"][-1] == (3, 3)  # The folder and both paths
+    assert set(FileChecker(state_file).folders()[str(tmp_path)][1]) == {"found.zip"}
+
+
+def test_cancelled_file_check_is_not_saved(tmp_path):
+    state_file = str(tmp_path / "checks.state")
+    worker = FileCheckWorker(FileChecker(state_file, workers=2), [str(tmp_path / "game.zip")])
+    worker.progress.connect(lambda done, total: worker.cancel(), Qt.DirectConnection)
+    emitted = run(worker)
+    assert emitted["loading_finished"] == [(False,)]
+    assert worker.statuses is None
+    assert not os.path.exists(state_file)